@@ -0,0 +1,4 @@
+# Loaded with Django, so `shared_task` functions are bound to this app
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
@@ -0,0 +1,10 @@
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
+
+# Run a worker with `celery -A main worker`. Settings prefixed with CELERY_ configure it.
+app = Celery('main')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
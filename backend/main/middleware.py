@@ -0,0 +1,96 @@
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.http import HttpRequest, HttpResponse
+
+from .utils import metrics
+
+
+# The timing of the request being served. Context variables follow a request into the threads
+# `sync_to_async` runs its queries in, unlike the thread-local database connections.
+_request_timing: ContextVar[metrics.RequestTiming | None] = ContextVar('request_timing', default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    timing = _request_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    return timing.time_query(execute, sql, params, many, context)
+
+
+def _wrap_connection(connection: BaseDatabaseWrapper, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def _wrap_connections():
+    for connection in connections.all(initialized_only=True):
+        _wrap_connection(connection)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the SQL query count, SQL time, serialization time and total time of every request.
+
+    They are sent back in a `Server-Timing` header and added to the histograms served at
+    `/api/metrics`, labeled with the URL name of the view. Serialization is timed by the
+    views in `main.utils.view`. Queries run while a streaming response is consumed happen
+    after the middleware returns and are not counted.
+
+    Every connection times its queries for the request in `_request_timing`. Connections are
+    thread-local, so a connection gets the wrapper when it connects, and the connections of
+    the serving thread get it when a request starts. Under ASGI, the queries of a request run
+    in the thread `sync_to_async` keeps for it, where one hop per request wraps them.
+
+    When `REQUEST_METRICS` is off, the middleware removes itself from the stack at startup.
+    It works in both sync and async stacks, so it does not force async views into a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(_wrap_connection, dispatch_uid='request_metrics')
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        request.request_timing = timing = metrics.RequestTiming()
+        started = time.perf_counter()
+        _wrap_connections()
+        token = _request_timing.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_timing.reset(token)
+        return self.record(request, response, timing, started)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        request.request_timing = timing = metrics.RequestTiming()
+        started = time.perf_counter()
+        await sync_to_async(_wrap_connections)()
+        token = _request_timing.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_timing.reset(token)
+        return self.record(request, response, timing, started)
+
+    @staticmethod
+    def record(request: HttpRequest, response: HttpResponse, timing: metrics.RequestTiming, started: float) -> HttpResponse:
+        timing.total = time.perf_counter() - started
+        resolver_match = request.resolver_match
+        metrics.observe(resolver_match.view_name if resolver_match else metrics.UNRESOLVED_VIEW, timing)
+        response['Server-Timing'] = timing.server_timing()
+        return response
@@ -16,9 +16,17 @@ class FieldValidationError(Enum):
     MIN_LENGTH = ('min_length', serializers.CharField.default_error_messages['min_length'])
     MAX_LENGTH = ('max_length', serializers.CharField.default_error_messages['max_length'])
     INVALID_CHOICE = ('invalid_choice', serializers.ChoiceField.default_error_messages['invalid_choice'])
+    MIN_VALUE = ('min_value', serializers.DecimalField.default_error_messages['min_value'])
+    INVALID_DATE = ('invalid', serializers.DateField.default_error_messages['invalid'])
+    INVALID_NUMBER = ('invalid', serializers.DecimalField.default_error_messages['invalid'])
+    MAX_WHOLE_DIGITS = ('max_whole_digits', serializers.DecimalField.default_error_messages['max_whole_digits'])
 
     END_DATE_AFTER_START_DATE = ('end_date_after_start_date', 'End date must be after the start date.')
     PRODUCT_UNIQUE_TOGETHER = ('product_unique_together', 'The combination of product, start date and end date must be unique.')
+    PRODUCT_NOT_FOUND = ('product_not_found', 'Product with this SKU does not exist.')
+    PRODUCT_NAME_TAKEN = ('product_name_taken', 'Another product in this category already has this name.')
+    CATEGORY_NOT_FOUND = ('category_not_found', 'Category with this name does not exist.')
+    BATCH_CONFLICT = ('batch_conflict', 'The batch of this row conflicted with a concurrent write and was not applied.')
 
     def to_validation_error(self) -> ErrorDetail:
         return ErrorDetail(self.value[1], self.value[0])
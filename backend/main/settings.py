@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'rest_framework.authtoken',
@@ -34,6 +35,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +65,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'main.wsgi.application'
+ASGI_APPLICATION = 'main.asgi.application'
 
 CHANNEL_LAYERS = {
     'default': {
@@ -87,9 +90,79 @@ DATABASES = {
     }
 }
 
+REDIS_URL = env.get_str('REDIS_URL', '')
+
+# Redis is shared by every worker. The local memory cache is only good for tests and single-process setups.
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            # Room for a watermark per product, which the default of 300 entries would keep evicting.
+            'OPTIONS': {'MAX_ENTRIES': env.get_int('LOCAL_CACHE_MAX_ENTRIES', 100_000)},
+        }
+    }
+
+# Seconds a watermark is kept. One that expired starts again at the time it is next read,
+# which only makes clients and caches fetch the data again.
+WATERMARK_TIMEOUT = env.get_int('WATERMARK_TIMEOUT', 24 * 60 * 60)
+
+# Seconds the price lookup index trusts a loaded product. With a shared cache (REDIS_URL)
+# writes from other processes are seen at once, without one only after this long.
+PRICE_INDEX_TIMEOUT = env.get_int('PRICE_INDEX_TIMEOUT', 60)
+
+# Background jobs are sent to Celery workers through Redis. Without a broker there is no
+# worker, so `background=true` is ignored and operations run in the request. Eager mode
+# runs jobs in the process that enqueues them instead, which suits tests and development.
+CELERY_BROKER_URL = env.get_str('CELERY_BROKER_URL', REDIS_URL or 'memory://')
+CELERY_TASK_ALWAYS_EAGER = env.get_bool('CELERY_TASK_ALWAYS_EAGER', False)
+CELERY_TASK_IGNORE_RESULT = True
+# A job is acknowledged once it ends, so one lost with its worker is delivered again.
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Seconds after its last progress that a running job counts as lost with its worker, and
+# may be run again. Every chunk of a job must finish within it.
+JOB_LEASE = env.get_int('JOB_LEASE', 10 * 60)
+# Redis delivers an unacknowledged job again after this many seconds. It must be longer than
+# JOB_LEASE, or the delivery of a job lost with its worker comes while it still looks alive.
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': env.get_int('JOB_VISIBILITY_TIMEOUT', 60 * 60)}
+
+# Requests allowed per client. Views pick a scope with `throttle_scope`, otherwise reads
+# and writes are limited separately. A scope without a rate is not throttled.
+THROTTLE_RATES = {
+    'read': env.get_str('THROTTLE_READ_RATE', '120/min'),
+    'write': env.get_str('THROTTLE_WRITE_RATE', '60/min'),
+    'bulk': env.get_str('THROTTLE_BULK_RATE', '10/min'),
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_standardized_errors.openapi.AutoSchema',
     'EXCEPTION_HANDLER': 'drf_standardized_errors.handler.exception_handler',
+    'DEFAULT_RENDERER_CLASSES': [
+        'main.utils.renderers.ORJSONRenderer',
+        'main.utils.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'main.utils.parsers.ORJSONParser',
+        'main.utils.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'TEST_REQUEST_RENDERER_CLASSES': [
+        'rest_framework.renderers.MultiPartRenderer',
+        'main.utils.renderers.ORJSONRenderer',
+        'main.utils.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'main.utils.pagination.KeysetPagination',
+    'PAGE_SIZE': env.get_int('API_PAGE_SIZE', 100),
 }
 
 SPECTACULAR_SETTINGS = {
@@ -175,3 +248,33 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/api/media/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Days after today that `manage.py extend_price_rollup` rolls open-ended prices up through.
+PRICE_ROLLUP_DAYS_AHEAD = env.get_int('PRICE_ROLLUP_DAYS_AHEAD', 366)
+
+# Average prices are cached per category version, so this only bounds how long unused results are kept.
+AVERAGE_PRICE_CACHE_TIMEOUT = env.get_int('AVERAGE_PRICE_CACHE_TIMEOUT', 60 * 60)
+
+# Time every request and serve the histograms at /api/metrics. When off, the middleware is not loaded.
+REQUEST_METRICS = env.get_bool('REQUEST_METRICS', False)
+
+# Months of price history partitions to keep, counting the current one. 0 keeps them all.
+PRICE_HISTORY_RETENTION_MONTHS = env.get_int('PRICE_HISTORY_RETENTION_MONTHS', 0)
+
+# Months of price history partitions to create ahead of the current one.
+PRICE_HISTORY_PARTITIONS_AHEAD = env.get_int('PRICE_HISTORY_PARTITIONS_AHEAD', 3)
+
+# Admin changelists show the planner's estimate instead of an exact count for unfiltered tables this big.
+ADMIN_ESTIMATED_COUNT_THRESHOLD = env.get_int('ADMIN_ESTIMATED_COUNT_THRESHOLD', 100_000)
+
+# Product search ranks at most this many matches of each kind (name, SKU, description).
+PRODUCT_SEARCH_CANDIDATES = env.get_int('PRODUCT_SEARCH_CANDIDATES', 200)
+
+# Background jobs commit their work in chunks of this many products or payload rows.
+JOB_CHUNK_SIZE = env.get_int('JOB_CHUNK_SIZE', 1000)
+
+# Bulk product upserts write this many rows per transaction.
+PRODUCT_BULK_BATCH_SIZE = env.get_int('PRODUCT_BULK_BATCH_SIZE', 1000)
+
+# Exports read this many rows per round trip through a server-side cursor.
+EXPORT_CHUNK_SIZE = env.get_int('EXPORT_CHUNK_SIZE', 2000)
@@ -4,6 +4,7 @@ from django.conf.urls import include
 from django.urls import path
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 
+from main.views import MetricsView
 from storage import urls as storage_urls
 
 
@@ -18,5 +19,7 @@ urlpatterns = [
     path('api/schema/redoc/', staff_member_required(SpectacularRedocView.as_view(url_name='schema')), name='redoc'),
     path('api/schema/swagger-ui/', staff_member_required(SpectacularSwaggerView.as_view(url_name='schema')), name='django-admindocs-docroot'),
 
+    path('api/metrics', MetricsView.as_view(), name='metrics'),
+
     path('api/v1/storage/', include(storage_urls.urlpatterns)),
 ]
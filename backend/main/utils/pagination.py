@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Paginates lists by primary key with an opaque cursor.
+
+    Every page is fetched with `WHERE id > <last id> ORDER BY id LIMIT <page size + 1>`, so deep
+    pages cost the same as the first one, and no `COUNT(*)` is run. The page size defaults to
+    the `PAGE_SIZE` setting and can be lowered or raised per request up to `max_page_size`.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -0,0 +1,69 @@
+import codecs
+
+import msgpack
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class ORJSONParser(BaseParser):
+    """
+    Parses JSON with orjson, which decodes several times faster than the standard library.
+    """
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Parses the incoming bytestream as JSON and returns the resulting data.
+        """
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}') from exc
+
+
+class MessagePackParser(BaseParser):
+    """
+    Parses MessagePack request bodies.
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Parses the incoming bytestream as MessagePack and returns the resulting data.
+        """
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        # Map keys that cannot key a dict fail the strict key check with ValueError, or with
+        # TypeError in msgpack versions whose check lets them through.
+        except (ValueError, TypeError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}') from exc
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON, one document per line.
+
+    The stream is decoded line by line, so a large payload is never held in memory
+    as a single string. Blank lines are ignored.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None) -> list:
+        """
+        Parses the incoming bytestream as NDJSON and returns a list of documents.
+        """
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        data = []
+        for number, line in enumerate(codecs.getreader(encoding)(stream), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data.append(orjson.loads(line))
+            except orjson.JSONDecodeError as exc:
+                raise ParseError(f'NDJSON parse error on line {number} - {exc}') from exc
+        return data
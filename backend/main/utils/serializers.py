@@ -0,0 +1,51 @@
+from typing import Callable, Iterable
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+
+# Fields whose representation of a value read from the database is the value itself
+_PASSTHROUGH = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+    serializers.ReadOnlyField,
+)
+
+
+class ValuesSerializer:
+    """
+    Serializes rows read with `QuerySet.values()` into the same output as a ModelSerializer.
+
+    The serializer's fields are inspected once, so serializing a row is a dict comprehension
+    over precompiled `(name, lookup, convert)` accessors instead of a model instance and a
+    `to_representation` call per field. Only flat fields are supported: foreign keys are read
+    as their ids, and fields like dates and decimals are converted with their own serializer
+    field. Write-only fields are skipped, as `to_representation` skips them.
+    """
+
+    def __init__(self, serializer_class: type[serializers.ModelSerializer]):
+        self.accessors: list[tuple[str, str, Callable | None]] = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField, serializers.SerializerMethodField)):
+                raise ImproperlyConfigured(f'{serializer_class.__name__}.{name} cannot be read from values().')
+            convert = None if isinstance(field, _PASSTHROUGH) else field.to_representation
+            self.accessors.append((name, field.source.replace('.', '__'), convert))
+
+    @property
+    def lookups(self) -> list[str]:
+        return [lookup for _, lookup, _ in self.accessors]
+
+    def to_representation(self, row: dict) -> dict:
+        return {
+            name: row[lookup] if convert is None or row[lookup] is None else convert(row[lookup])
+            for name, lookup, convert in self.accessors
+        }
+
+    def many(self, rows: Iterable[dict]) -> list[dict]:
+        if all(convert is None for _, _, convert in self.accessors):
+            pairs = [(name, lookup) for name, lookup, _ in self.accessors]
+            return [{name: row[lookup] for name, lookup in pairs} for row in rows]
+        return [self.to_representation(row) for row in rows]
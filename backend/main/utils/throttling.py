@@ -0,0 +1,187 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.request import Request
+from rest_framework.throttling import BaseThrottle
+
+CACHE_ALIAS = 'default'
+
+REDIS_BACKEND = 'django_redis.cache.RedisCache'
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Reads and updates both window counters in one round trip, so that concurrent requests
+# from every worker see each other. The request is only counted when it is allowed.
+_SLIDING_WINDOW = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+if previous * (window - elapsed) / window + current < limit then
+    current = redis.call('INCR', KEYS[1])
+    redis.call('PEXPIRE', KEYS[1], window * 2)
+    return {1, current, previous}
+end
+return {0, current, previous}
+"""
+
+_scripts = {}
+
+
+def parse_rate(rate: str) -> tuple[int, int]:
+    """
+    Parses a DRF style rate such as '60/min'.
+
+    Args:
+    - rate (str): The number of requests, a slash and a period starting with s, m, h or d.
+
+    Returns:
+    - tuple[int, int]: The number of requests and the window length in seconds.
+    """
+    requests, period = rate.split('/')
+    return int(requests), DURATIONS[period[0]]
+
+
+def retry_after(limit: int, window: float, elapsed: float, current: int, previous: int) -> float:
+    """
+    Returns the seconds to wait until a denied request would be allowed.
+
+    The previous window's count is weighted by the share of it that still overlaps the
+    sliding window, so it fades out while the current window goes on.
+    """
+    if current < limit:
+        # Wait for enough of the previous window to fade out.
+        return max(0.0, window - elapsed - (limit - current) * window / previous)
+    # The current window is full by itself: wait for it to become the previous one and fade.
+    return window - elapsed + window * (1 - limit / current)
+
+
+class SlidingWindow:
+    """
+    A sliding window counter kept in a Django cache.
+
+    Every key holds two integers, the counts of the current and of the previous fixed
+    window, whatever the rate. This is the fallback used without Redis: a read of both
+    counters and an atomic increment, which is enforced per process with the local
+    memory cache.
+    """
+
+    def __init__(self, alias: str = CACHE_ALIAS):
+        self.cache = caches[alias]
+
+    def counts(self, key: str, limit: int, window: int, index: int, elapsed: float) -> tuple[bool, int, int]:
+        current_key, previous_key = f'{key}:{index}', f'{key}:{index - 1}'
+        counts = self.cache.get_many([current_key, previous_key])
+        current, previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+        if previous * (window - elapsed) / window + current >= limit:
+            return False, current, previous
+
+        if self.cache.add(current_key, 1, window * 2):
+            return True, 1, previous
+        try:
+            return True, self.cache.incr(current_key), previous
+        except ValueError:
+            # The counter expired between the two calls.
+            self.cache.add(current_key, 1, window * 2)
+            return True, 1, previous
+
+    def hit(self, key: str, limit: int, window: int) -> tuple[bool, float]:
+        """
+        Counts a request against a key when it is within the limit.
+
+        Args:
+        - key (str): The key of the client and scope.
+        - limit (int): The number of requests allowed in a window.
+        - window (int): The window length in seconds.
+
+        Returns:
+        - tuple[bool, float]: Whether the request is allowed, and if not, the seconds to wait.
+        """
+        now = time.time()
+        index = math.floor(now / window)
+        elapsed = now - index * window
+        allowed, current, previous = self.counts(key, limit, window, index, elapsed)
+        return allowed, 0.0 if allowed else retry_after(limit, window, elapsed, current, previous)
+
+
+class RedisSlidingWindow(SlidingWindow):
+    """
+    A sliding window counter that runs as one Lua script on Redis, so the check and the
+    increment are atomic and the limit holds across all workers.
+    """
+
+    def __init__(self, alias: str = CACHE_ALIAS):
+        super().__init__(alias)
+        from django_redis import get_redis_connection
+
+        self.client = get_redis_connection(alias)
+
+    def counts(self, key: str, limit: int, window: int, index: int, elapsed: float) -> tuple[bool, int, int]:
+        script = _scripts.get(id(self.client))
+        if script is None:
+            script = _scripts[id(self.client)] = self.client.register_script(_SLIDING_WINDOW)
+        allowed, current, previous = script(
+            keys=[self.cache.make_key(f'{key}:{index}'), self.cache.make_key(f'{key}:{index - 1}')],
+            args=[limit, window * 1000, int(elapsed * 1000)],
+        )
+        return bool(allowed), int(current), int(previous)
+
+
+def get_backend(alias: str = CACHE_ALIAS) -> SlidingWindow:
+    """
+    Returns the Redis counter when the cache is Redis and the cache counter otherwise.
+    """
+    if settings.CACHES[alias]['BACKEND'] == REDIS_BACKEND:
+        return RedisSlidingWindow(alias)
+    return SlidingWindow(alias)
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    A rate limiter with a sliding window counter, which takes constant memory per client.
+
+    The rate comes from the view's `throttle_scope` in `THROTTLE_RATES`, or from the
+    'read' or 'write' scope depending on the request method. Clients are told apart
+    by user, or by address when anonymous.
+    """
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_scope(self, request: Request, view) -> str:
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def get_ident(self, request: Request) -> str:
+        if request.user.is_authenticated:
+            return str(request.user.pk)
+        return super().get_ident(request)
+
+    def allow_request(self, request: Request, view) -> bool:
+        """
+        Returns True if the request is within the rate of its scope.
+
+        Args:
+        - request (rest_framework.request.Request): The request object.
+        - view (rest_framework.views.APIView): The view object.
+
+        Returns:
+        - bool: Whether the request is allowed.
+        """
+        scope = self.get_scope(request, view)
+        rate = settings.THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+
+        limit, window = parse_rate(rate)
+        allowed, self.wait_seconds = get_backend().hit(f'throttle:{scope}:{self.get_ident(request)}', limit, window)
+        return allowed
+
+    def wait(self) -> float | None:
+        return self.wait_seconds
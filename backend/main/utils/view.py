@@ -1,58 +1,123 @@
-from django.db import models
-from django.db.models.aggregates import Max
-from django.utils import timezone as tz
-from rest_framework import viewsets
+import time
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError
+from django.db.models import QuerySet
+from django.http import Http404
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+from rest_framework import status, viewsets
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
-from rest_framework.throttling import SimpleRateThrottle
+from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from . import watermark
+from .serializers import ValuesSerializer
+from .throttling import SlidingWindowThrottle
 
-def get_last_modified(request: Request, model: models.Model, *args, **kwargs):
-    default = tz.now()
-    res = model.objects.aggregate(updated=Max('updated'))
-    return (res['updated'] or default).replace(microsecond=0)
 
-
-class MinuteRateThrottle(SimpleRateThrottle):
+def watermark_condition(scope: str, lookup: str | None = None):
     """
-    A rate limiter that limits the number of requests that can be made in a minute.
-
-    Inherits from SimpleRateThrottle.
+    Returns a decorator that answers conditional GETs from a watermark, with a 304 when
+    the client's copy is current, and sets the Last-Modified and strong ETag headers.
+
+    The ETag holds the format of the response as well, since JSON and MessagePack bodies of
+    the same data differ, and responses vary on Accept. A missing watermark is not started
+    before the view runs, so requests for objects that do not exist leave nothing in the
+    cache. The response then has no validators, and a successful one starts the watermark
+    at the time it was first read and gets its headers from it.
+
+    For async views the watermark is read in a thread before the condition is checked, since
+    the cache client blocks and `condition` calls its header functions on the event loop.
+
+    Args:
+    - scope (str): The watermark scope of the view's data.
+    - lookup (str | None): The URL keyword argument holding the id of the object whose
+      watermark to use, None to use the watermark of the whole scope.
     """
-    rate = '60/min'
-
-    def get_cache_key(self, request: Request, *args) -> str:
-        """
-        Returns a cache key for the given request and view.
-
-        Args:
-        - request (rest_framework.request.Request): The request object.
-        - view (rest_framework.views.APIView): The view object.
-
-        Returns:
-        - str: A cache key for the given request and view.
-        """
-        if request.user.is_authenticated:
-            return self.cache_format % {
-                'scope': self.scope,
-                'ident': request.user.pk
-            }
-
-        return self.cache_format % {
-            'scope': self.scope,
-            'ident': self.get_ident(request)
-        }
+    def get_watermark(request: Request, *args, **kwargs) -> int | None:
+        # Both header functions need it, so it is read from the cache once per request.
+        if not hasattr(request, '_watermark'):
+            request._watermark_read = time.time_ns()
+            key = (scope, kwargs[lookup] if lookup else None)
+            request._watermark = watermark.get_many([key]).get(key)
+        return request._watermark
+
+    def get_etag(request: Request, *args, **kwargs) -> str | None:
+        value = get_watermark(request, *args, **kwargs)
+        return None if value is None else watermark.as_etag(value, request.accepted_renderer.format)
+
+    def get_last_modified(request: Request, *args, **kwargs) -> datetime | None:
+        value = get_watermark(request, *args, **kwargs)
+        return None if value is None else watermark.as_datetime(value)
+
+    def finish(request: Request, response, *args, **kwargs):
+        patch_vary_headers(response, ['Accept'])
+        if request._watermark is not None or not status.is_success(response.status_code):
+            return response
+        key = (scope, kwargs[lookup] if lookup else None)
+        value = watermark.start([key], request._watermark_read)[key]
+        # A later watermark means the data changed while the view read it.
+        if value == request._watermark_read:
+            response.headers.setdefault('ETag', watermark.as_etag(value, request.accepted_renderer.format))
+            response.headers.setdefault('Last-Modified', http_date(value // 10**9))
+        return response
+
+    conditional = condition(etag_func=get_etag, last_modified_func=get_last_modified)
+
+    def decorator(view):
+        view_with_condition = conditional(view)
+        if not iscoroutinefunction(view):
+            @wraps(view)
+            def sync_view(request: Request, *args, **kwargs):
+                return finish(request, view_with_condition(request, *args, **kwargs), *args, **kwargs)
+            return sync_view
+
+        @wraps(view)
+        async def async_view(request: Request, *args, **kwargs):
+            await sync_to_async(get_watermark)(request, *args, **kwargs)
+            response = await view_with_condition(request, *args, **kwargs)
+            return await sync_to_async(finish)(request, response, *args, **kwargs)
+        return async_view
+
+    return decorator
+
+
+async def aget_object_or_404(queryset: QuerySet, **kwargs):
+    """
+    Fetches one object with the async ORM, like DRF's `get_object_or_404`, raising Http404 when
+    there is none or when the lookup value is not valid for the field.
+    """
+    try:
+        return await queryset.aget(**kwargs)
+    except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError) as e:
+        raise Http404 from e
 
 
 class BasicThrottleView(APIView):
     """
-    A basic REST view that limits the number of requests that can be made in a minute.
+    A basic REST view that limits the rate of requests per client and scope.
 
     Inherits from APIView.
     """
-    throttle_classes = [MinuteRateThrottle]
+    throttle_classes = [SlidingWindowThrottle]
+
+    def finalize_response(self, request: Request, response, *args, **kwargs):
+        """
+        Renders the response here instead of in the handler when request metrics are on,
+        so the time spent serializing its body can be told apart from the rest.
+        """
+        response = super().finalize_response(request, response, *args, **kwargs)
+        timing = getattr(request, 'request_timing', None)
+        if timing is not None and isinstance(response, Response):
+            with timing.serializing():
+                response.render()
+        return response
 
 
 class AuthenticatedView(BasicThrottleView):
@@ -79,3 +144,72 @@ class AuthenticatedModelViewSet(AuthenticatedView, viewsets.ModelViewSet):
         'put',
         'delete',
     ]
+
+
+class AsyncAPIViewMixin:
+    """
+    Lets an APIView or a ViewSet implement handlers as coroutines, so under ASGI a request
+    waiting on the database does not hold a worker thread.
+
+    Authentication, permissions and throttling run the same `initial()` as in a sync view,
+    in a thread, since sessions and the throttle cache are synchronous. Handlers that are
+    not coroutines, like the write actions of a ViewSet, run in a thread as well. Under WSGI
+    Django runs the whole view in an event loop of its own.
+    """
+
+    @classmethod
+    def as_view(cls, *args, **initkwargs):
+        return markcoroutinefunction(super().as_view(*args, **initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class ValuesReadMixin(AsyncAPIViewMixin):
+    """
+    Serves `list` and `retrieve` from `QuerySet.values()` rows through a `ValuesSerializer`,
+    with the same output as `serializer_class` and no model instance per row. Both are
+    coroutines that read through the async ORM.
+
+    Object permissions are not checked on `retrieve`, since there is no instance to check them on.
+    """
+    values_serializer: ValuesSerializer
+
+    def get_values_queryset(self):
+        return self.filter_queryset(self.get_queryset()).values(*self.values_serializer.lookups)
+
+    async def list(self, request: Request, *args, **kwargs) -> Response:
+        queryset = self.get_values_queryset()
+        # The paginator slices and reads the queryset itself, so it runs in a thread.
+        page = await sync_to_async(self.paginate_queryset)(queryset) if self.paginator is not None else None
+        if page is not None:
+            return self.get_paginated_response(self.values_serializer.many(page))
+        return Response(self.values_serializer.many([row async for row in queryset]))
+
+    async def retrieve(self, request: Request, *args, **kwargs) -> Response:
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = await aget_object_or_404(self.get_values_queryset(), **{self.lookup_field: kwargs[lookup_url_kwarg]})
+        return Response(self.values_serializer.to_representation(row))
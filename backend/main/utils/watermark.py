@@ -0,0 +1,99 @@
+import time
+from datetime import datetime, timezone
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _key(scope: str, ident=None) -> str:
+    return f'watermark:{scope}' if ident is None else f'watermark:{scope}:{ident}'
+
+
+def get(scope: str, ident=None) -> int:
+    """
+    Returns the watermark of a scope, or of one object in it, as nanoseconds since the epoch.
+
+    A watermark that is not in the cache yet, or expired, is started at the current time,
+    as if the data had just changed. No table is ever scanned to find it. Only call it for
+    objects that exist, since it leaves a key in the cache, see `start`.
+
+    Args:
+    - scope (str): The kind of data, e.g. a model.
+    - ident: The id of one object in the scope, None for the whole scope.
+
+    Returns:
+    - int: The time of the last change.
+    """
+    key = _key(scope, ident)
+    value = cache.get(key)
+    if value is None:
+        value = time.time_ns()
+        if not cache.add(key, value, settings.WATERMARK_TIMEOUT):
+            value = cache.get(key, value)
+    return value
+
+
+def get_many(keys: Iterable[tuple[str, object]]) -> dict[tuple[str, object], int]:
+    """
+    Returns the watermarks of many scopes or objects that are in the cache, with one round trip.
+
+    Unlike `get`, it starts no watermark, so the ids do not need to exist. See `start`.
+
+    Args:
+    - keys (Iterable[tuple[str, object]]): Pairs of scope and object id, or of scope and None.
+
+    Returns:
+    - dict[tuple[str, object], int]: The time of the last change of the pairs that have a watermark.
+    """
+    keys = {_key(scope, ident): (scope, ident) for scope, ident in keys}
+    return {keys[key]: value for key, value in cache.get_many(keys).items()}
+
+
+def start(keys: Iterable[tuple[str, object]], value: int) -> dict[tuple[str, object], int]:
+    """
+    Starts the watermarks of scopes or objects that are not in the cache at `value`.
+
+    Callers pass the time they started reading the data, and only for objects that exist.
+    A watermark later than `value` means the data changed while it was read.
+
+    Args:
+    - keys (Iterable[tuple[str, object]]): Pairs of scope and object id, or of scope and None.
+    - value (int): The watermark to start them at.
+
+    Returns:
+    - dict[tuple[str, object], int]: The watermark of every pair.
+    """
+    values = {}
+    for scope, ident in keys:
+        key = _key(scope, ident)
+        values[scope, ident] = value if cache.add(key, value, settings.WATERMARK_TIMEOUT) else cache.get(key, value)
+    return values
+
+
+def touch(scope: str, idents: Iterable = ()):
+    """
+    Moves the watermark of a scope, and of the given objects in it, to the time of commit.
+
+    Moving it before the commit would let a concurrent request pair the old data with the new watermark.
+
+    Args:
+    - scope (str): The kind of data that changed.
+    - idents (Iterable): The ids of the objects that changed.
+    """
+    keys = [_key(scope)] + [_key(scope, ident) for ident in set(idents) if ident is not None]
+
+    def move():
+        now = time.time_ns()
+        cache.set_many({key: now for key in keys}, settings.WATERMARK_TIMEOUT)
+
+    transaction.on_commit(move)
+
+
+def as_datetime(value: int) -> datetime:
+    return datetime.fromtimestamp(value // 10**9, tz=timezone.utc)
+
+
+def as_etag(value: int, variant: str) -> str:
+    return f'"{value:x}-{variant}"'
@@ -0,0 +1,23 @@
+from django.http import HttpResponse
+from drf_spectacular.utils import OpenApiTypes, extend_schema
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+
+from .utils import metrics
+from .utils.view import AuthenticatedView
+
+
+class MetricsView(AuthenticatedView):
+    """
+    Serves the request histograms of this process in the Prometheus text format. Staff only.
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        tags=['Metrics'],
+        summary='Request Metrics',
+        description='Request duration, SQL and serialization histograms per view, in the Prometheus text format.',
+        responses={(200, 'text/plain'): OpenApiTypes.STR},
+    )
+    def get(self, request: Request) -> HttpResponse:
+        return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
@@ -1,41 +1,53 @@
 from django.contrib import admin
 
-from .models import Category, Product, ProductPrice, ProductPriceHistory
+from main.utils.admin import ScalableModelAdmin
+from .models import Category, Job, Product, ProductPrice, ProductPriceHistory
 
 
+# Searches use lookups served by the unique and `_like` indexes: an exact SKU or a name prefix.
+# The date hierarchy is left out, since listing its years and months reads the whole table.
+
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(ScalableModelAdmin):
     list_display = ('name',)
-    search_fields = ('name',)
+    search_fields = ('name__startswith',)
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ScalableModelAdmin):
     list_display = (
         'name',
         'category',
         'sku',
         'description',
     )
-    search_fields = ('name', 'sku', 'category__name')
+    list_select_related = ('category',)
+    search_fields = ('sku__exact', 'name__startswith')
     list_filter = ('category',)
+    autocomplete_fields = ('category',)
+
+    def get_queryset(self, request):
+        # Products are shown with their category, in the changelist and in the autocomplete of prices.
+        return super().get_queryset(request).select_related('category')
 
 
 @admin.register(ProductPrice)
-class ProductPriceAdmin(admin.ModelAdmin):
+class ProductPriceAdmin(ScalableModelAdmin):
     list_display = (
         'product',
         'start_date',
         'end_date',
         'price',
     )
-    search_fields = ('product__name', 'product__sku')
-    list_filter = ('product__category',)
-    date_hierarchy = 'start_date'
+    list_select_related = ('product__category',)
+    search_fields = ('product__sku__exact',)
+    # The denormalized category filters through the category index, without a join
+    list_filter = ('category', 'start_date')
+    autocomplete_fields = ('product',)
 
 
 @admin.register(ProductPriceHistory)
-class ProductPriceHistoryAdmin(admin.ModelAdmin):
+class ProductPriceHistoryAdmin(ScalableModelAdmin):
     list_display = (
         'product_name',
         'product_sku',
@@ -45,9 +57,8 @@ class ProductPriceHistoryAdmin(admin.ModelAdmin):
         'action',
         'change_date',
     )
-    search_fields = ('product_name', 'product_sku')
+    search_fields = ('product_sku__exact',)
     list_filter = ('action', 'change_date')
-    date_hierarchy = 'change_date'
 
     def has_add_permission(self, request):
         return False
@@ -57,3 +68,27 @@ class ProductPriceHistoryAdmin(admin.ModelAdmin):
 
     def has_delete_permission(self, request, obj=None):
         return False
+
+
+@admin.register(Job)
+class JobAdmin(ScalableModelAdmin):
+    list_display = (
+        'id',
+        'kind',
+        'status',
+        'done',
+        'total',
+        'user',
+        'created',
+        'finished',
+    )
+    list_select_related = ('user',)
+    search_fields = ('id__exact',)
+    list_filter = ('kind', 'status', 'created')
+    exclude = ('payload',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,265 @@
+from datetime import date
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.db.models import Avg, DecimalField, ExpressionWrapper, FloatField, Func, IntegerField, QuerySet, Sum, Value
+from django.db.models.functions import Cast, Coalesce, ExtractMonth, ExtractWeek, Greatest, Least
+
+from . import rollup
+from .enums import AveragePricePeriod
+from .models import Category, CategoryDailyPrice, ProductPrice
+
+
+def _plain_periods(prices: QuerySet, period: str) -> QuerySet:
+    """
+    Averages price rows per week or per month of their start date.
+    """
+    if period == AveragePricePeriod.WEEK.value:
+        key, extract = 'week', ExtractWeek
+    else:
+        key, extract = 'month', ExtractMonth
+    return prices.annotate(**{key: extract('start_date')}).values(key).annotate(avg_price=Avg('price')).order_by(key)
+
+
+def plain_average(category: Category, start_date: date, end_date: date, period: str) -> dict | list[dict] | None:
+    """
+    Computes the plain average of the prices of a category that are in effect in a date range.
+
+    Every price row counts once, however many days it is in effect, and falls in the week or
+    month it starts in.
+
+    Args:
+    - category (Category): The category to average.
+    - start_date (date): The first day of the range.
+    - end_date (date): The last day of the range.
+    - period (str): An `AveragePricePeriod` value.
+
+    Returns:
+    - dict | list[dict] | None: The average of the whole range, or one average per week or
+      month, None if no price is in effect in the range.
+    """
+    prices = ProductPrice.objects.in_category(category.pk, start_date, end_date)
+
+    if not prices.exists():
+        return None
+
+    if period == AveragePricePeriod.WHOLE.value:
+        average_price = prices.aggregate(avg_price=Avg('price'))['avg_price']
+        return {'average_price': round(average_price, 2)}
+
+    return list(_plain_periods(prices, period))
+
+
+async def aplain_average(category: Category, start_date: date, end_date: date, period: str) -> dict | list[dict] | None:
+    """
+    The async variant of `plain_average`, with the same arguments and result, using the async ORM.
+    """
+    prices = ProductPrice.objects.in_category(category.pk, start_date, end_date)
+
+    if not await prices.aexists():
+        return None
+
+    if period == AveragePricePeriod.WHOLE.value:
+        average_price = (await prices.aaggregate(avg_price=Avg('price')))['avg_price']
+        return {'average_price': round(average_price, 2)}
+
+    return [row async for row in _plain_periods(prices, period)]
+
+
+_ROLLUP_AVERAGE = ExpressionWrapper(Sum('price_sum') / Sum('price_count'), output_field=DecimalField())
+
+
+def _rollup_days(category: Category, start_date: date, end_date: date) -> QuerySet:
+    return CategoryDailyPrice.objects.filter(category=category, day__range=(start_date, end_date))
+
+
+def _rollup_periods(days: QuerySet, period: str) -> QuerySet:
+    """
+    Averages rollup days per week or per month.
+    """
+    if period == AveragePricePeriod.WEEK.value:
+        key, extract = 'week', ExtractWeek
+    else:
+        key, extract = 'month', ExtractMonth
+    return days.annotate(**{key: extract('day')}).values(key).annotate(avg_price=_ROLLUP_AVERAGE).order_by(key)
+
+
+def rollup_average(category: Category, start_date: date, end_date: date, period: str) -> dict | list[dict] | None:
+    """
+    Computes the day-weighted average price of a category from the daily rollup.
+
+    The cost depends on the number of days in the range and not on the number of prices
+    in the category. The rollup only covers the days up to its horizon, see `weighted_average`.
+
+    Args:
+    - category (Category): The category to average.
+    - start_date (date): The first day of the range.
+    - end_date (date): The last day of the range.
+    - period (str): An `AveragePricePeriod` value.
+
+    Returns:
+    - dict | list[dict] | None: The average of the whole range, or one average per week or
+      month, None if no price is active in the range.
+    """
+    days = _rollup_days(category, start_date, end_date)
+
+    if not days.exists():
+        return None
+
+    if period == AveragePricePeriod.WHOLE.value:
+        average_price = days.aggregate(avg_price=_ROLLUP_AVERAGE)['avg_price']
+        return {'average_price': round(average_price, 2)}
+
+    return list(_rollup_periods(days, period))
+
+
+async def arollup_average(category: Category, start_date: date, end_date: date, period: str) -> dict | list[dict] | None:
+    """
+    The async variant of `rollup_average`, with the same arguments and result, using the async ORM.
+    """
+    days = _rollup_days(category, start_date, end_date)
+
+    if not await days.aexists():
+        return None
+
+    if period == AveragePricePeriod.WHOLE.value:
+        average_price = (await days.aaggregate(avg_price=_ROLLUP_AVERAGE))['avg_price']
+        return {'average_price': round(average_price, 2)}
+
+    return [row async for row in _rollup_periods(days, period)]
+
+
+def load_intervals(category: Category, start_date: date, end_date: date) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fetches the price intervals of a category clipped to a date range, with one query.
+
+    Days come back from the database as offsets from `start_date`, which are much cheaper to
+    turn into an array than date objects.
+
+    Returns:
+    - tuple[np.ndarray, np.ndarray, np.ndarray]: The offset of the first active day of every
+      interval, the offset of the day after its last active day and its price.
+    """
+    def offset(day: Func) -> Func:
+        return Func(day, Value(start_date), template='(%(expressions)s)', arg_joiner=' - ', output_field=IntegerField())
+
+    rows = ProductPrice.objects.in_category(category.pk, start_date, end_date).values_list(
+        offset(Greatest('start_date', Value(start_date))),
+        offset(Least(Coalesce('end_date', Value(end_date)), Value(end_date))) + 1,
+        Cast('price', FloatField()),
+    )
+    intervals = np.array(list(rows), dtype=np.float64).reshape(-1, 3)
+    return intervals[:, 0].astype(np.int64), intervals[:, 1].astype(np.int64), intervals[:, 2]
+
+
+def iso_weeks(days: np.ndarray) -> np.ndarray:
+    """
+    Returns the ISO 8601 week number of every day, like `ExtractWeek`.
+    """
+    # 1970-01-01 was a Thursday, and a week belongs to the year its Thursday falls in.
+    weekday = (days.astype(np.int64) + 3) % 7
+    thursday = days - weekday + 3
+    first_day = thursday.astype('datetime64[Y]').astype('datetime64[D]')
+    return (thursday - first_day).astype(np.int64) // 7 + 1
+
+
+def time_weighted(
+    opens: np.ndarray,
+    closes: np.ndarray,
+    prices: np.ndarray,
+    start_date: date,
+    end_date: date,
+    period: str,
+) -> dict | list[dict] | None:
+    """
+    Computes the day-weighted average of clipped price intervals with NumPy.
+
+    Every interval adds its price to a difference array on its first day and removes it
+    the day after its last one, so a cumulative sum gives the total and the count of the
+    prices active on every day of the range. Days are then summed per week or month with
+    `bincount`, so the cost is O(intervals + days) with no Python loop over either.
+
+    Args:
+    - opens (np.ndarray): The offset from `start_date` of the first active day of every interval.
+    - closes (np.ndarray): The offset from `start_date` of the day after the last active day of every interval.
+    - prices (np.ndarray): The price of every interval.
+    - start_date (date): The first day of the range.
+    - end_date (date): The last day of the range.
+    - period (str): An `AveragePricePeriod` value.
+
+    Returns:
+    - dict | list[dict] | None: The average of the whole range, or one average per week or
+      month, None if there are no intervals.
+    """
+    if not len(prices):
+        return None
+
+    first_day = np.datetime64(start_date, 'D')
+    length = (np.datetime64(end_date, 'D') - first_day).astype(np.int64) + 1
+
+    if period == AveragePricePeriod.WHOLE.value:
+        weights = closes - opens
+        return {'average_price': round(float(np.dot(prices, weights) / weights.sum()), 2)}
+
+    day_sums = np.cumsum(
+        np.bincount(opens, weights=prices, minlength=length + 1)
+        - np.bincount(closes, weights=prices, minlength=length + 1)
+    )[:length]
+    day_counts = np.cumsum(
+        np.bincount(opens, minlength=length + 1) - np.bincount(closes, minlength=length + 1)
+    )[:length]
+
+    days = first_day + np.arange(length)
+    if period == AveragePricePeriod.WEEK.value:
+        key, buckets = 'week', iso_weeks(days)
+    else:
+        key, buckets = 'month', days.astype('datetime64[M]').astype(np.int64) % 12 + 1
+
+    sums = np.bincount(buckets, weights=day_sums)
+    counts = np.bincount(buckets, weights=day_counts)
+    active = np.flatnonzero(counts)
+    return [
+        {key: int(bucket), 'avg_price': float(average)}
+        for bucket, average in zip(active, sums[active] / counts[active])
+    ]
+
+
+def interval_average(category: Category, start_date: date, end_date: date, period: str) -> dict | list[dict] | None:
+    """
+    Computes the day-weighted average price of a category straight from its price intervals.
+
+    It needs no rollup and has no horizon, at the cost of reading every interval in the range.
+    See `time_weighted` for the arguments and the result.
+    """
+    opens, closes, prices = load_intervals(category, start_date, end_date)
+    return time_weighted(opens, closes, prices, start_date, end_date, period)
+
+
+async def ainterval_average(category: Category, start_date: date, end_date: date, period: str) -> dict | list[dict] | None:
+    """
+    The async variant of `interval_average`. The query and the NumPy work run in a thread, off the event loop.
+    """
+    return await sync_to_async(interval_average)(category, start_date, end_date, period)
+
+
+def weighted_average(category: Category, start_date: date, end_date: date, period: str) -> dict | list[dict] | None:
+    """
+    Computes the day-weighted average price of a category.
+
+    Ranges within the rollup horizon are read from the daily rollup, later ones from the
+    price intervals. See `rollup_average` for the arguments and the result.
+    """
+    horizon = rollup.horizon()
+    if horizon is not None and end_date <= horizon:
+        return rollup_average(category, start_date, end_date, period)
+    return interval_average(category, start_date, end_date, period)
+
+
+async def aweighted_average(category: Category, start_date: date, end_date: date, period: str) -> dict | list[dict] | None:
+    """
+    The async variant of `weighted_average`, with the same arguments and result.
+    """
+    horizon = await rollup.ahorizon()
+    if horizon is not None and end_date <= horizon:
+        return await arollup_average(category, start_date, end_date, period)
+    return await ainterval_average(category, start_date, end_date, period)
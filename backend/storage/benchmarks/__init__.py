@@ -0,0 +1,92 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Callable, Iterator
+
+from django.db import transaction
+
+from ..models import Category, Product, ProductPrice
+
+
+@contextmanager
+def scratch() -> Iterator[None]:
+    """
+    Runs a block in a transaction that is always rolled back, so seeded data never outlives a benchmark.
+    """
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def seed_products(category: Category, count: int) -> list[Product]:
+    """
+    Creates `count` products in a category with bulk inserts.
+    """
+    return Product.objects.bulk_create(
+        (
+            Product(name=f'Product {index}', category=category, sku=f'BENCH-{category.pk}-{index}', description='Benchmark product')
+            for index in range(count)
+        ),
+        batch_size=5000,
+    )
+
+
+def seed_category(intervals: int, per_product: int = 50, first_day: date = date(2020, 1, 1), seed: int = 0) -> Category:
+    """
+    Creates a category whose products hold `intervals` back-to-back price intervals in total.
+
+    Rows are written with bulk inserts, which skip the price history and the rollup.
+
+    Args:
+    - intervals (int): The number of price intervals to create.
+    - per_product (int): The number of price intervals of every product.
+    - first_day (date): The start of the first interval of every product.
+    - seed (int): The seed of the random interval lengths and prices.
+
+    Returns:
+    - Category: The new category.
+    """
+    rng = random.Random(seed)
+    category = Category.objects.create(name=f'Benchmark {intervals}')
+    products = seed_products(category, -(-intervals // per_product))
+
+    prices = []
+    for product in products:
+        start_date = first_day
+        for _ in range(min(per_product, intervals - len(prices))):
+            end_date = start_date + timedelta(days=rng.randint(0, 59))
+            prices.append(ProductPrice(
+                product=product,
+                start_date=start_date,
+                end_date=end_date,
+                price=Decimal(rng.randint(100, 100000)) / 100,
+            ))
+            start_date = end_date + timedelta(days=1)
+    ProductPrice.objects.bulk_create(prices, batch_size=5000)
+    return category
+
+
+def measure(func: Callable[[], object], repeat: int) -> dict[str, float]:
+    """
+    Calls a function `repeat` times and returns its fastest, median and 95th percentile run in milliseconds.
+    """
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        runs.append((time.perf_counter() - started) * 1000)
+    return summarize(runs)
+
+
+def summarize(runs: list[float]) -> dict[str, float]:
+    """
+    Returns the fastest, median and 95th percentile of run times in milliseconds.
+    """
+    runs = sorted(runs)
+    return {
+        'min': runs[0],
+        'p50': runs[len(runs) // 2],
+        'p95': runs[min(len(runs) - 1, round(len(runs) * 0.95))],
+    }
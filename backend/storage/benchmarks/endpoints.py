@@ -0,0 +1,265 @@
+import json
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from main.utils.view import BasicThrottleView
+from . import measure, seed_products
+from .. import rollup
+from ..enums import AveragePricePeriod
+from ..models import Category, CategoryDailyPrice, Product, ProductPrice
+
+BUDGETS = Path(__file__).with_name('budgets.json')
+# The metrics that are the same on every machine. Latency and memory can be left out of the
+# checks where the machine is too noisy or too slow for their budgets.
+QUERY_METRICS = {'queries'}
+
+# Every endpoint sees a cold cache and no throttling, so the numbers are those of the work itself.
+BENCHMARK_SETTINGS = {
+    'ALLOWED_HOSTS': ['testserver'],
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+}
+
+
+@dataclass
+class Catalog:
+    category: Category
+    product: Product
+    categories: int
+    products: int
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    # Build the path, the body of the n-th call and the query string for a seeded catalog
+    path: Callable[[Catalog], str]
+    body: Callable[[Catalog, int], object] | None = None
+    query: Callable[[Catalog], dict] | None = None
+
+
+ENDPOINTS = [
+    Endpoint('category-list', 'get', lambda catalog: reverse('category-list')),
+    Endpoint('category-detail', 'get', lambda catalog: reverse('category-detail', args=[catalog.category.pk])),
+    Endpoint('product-list', 'get', lambda catalog: reverse('product-list')),
+    Endpoint('product-detail', 'get', lambda catalog: reverse('product-detail', args=[catalog.product.pk])),
+    Endpoint(
+        'product-search', 'get',
+        lambda catalog: reverse('product-search'),
+        query=lambda catalog: {'q': f'Prodct {catalog.products // 2}'},
+    ),
+    Endpoint(
+        'product-bulk', 'post',
+        lambda catalog: reverse('product-bulk'),
+        lambda catalog, call: [
+            {'sku': f'BENCH-{catalog.category.pk}-{index}', 'name': f'Product {index} {call % 2}', 'category': catalog.category.name}
+            for index in range(min(500, catalog.products // catalog.categories))
+        ],
+    ),
+    Endpoint('product-price-list', 'get', lambda catalog: reverse('product-price', args=[catalog.product.pk])),
+    Endpoint(
+        'product-price-create', 'post',
+        lambda catalog: reverse('product-price', args=[catalog.product.pk]),
+        lambda catalog, call: {'start_date': '2030-01-01', 'end_date': None, 'price': f'{100 + call % 2}.00'},
+    ),
+    Endpoint(
+        'product-price-bulk', 'post',
+        lambda catalog: reverse('product-price-bulk'),
+        lambda catalog, call: [
+            {'sku': catalog.product.sku, 'start_date': f'2031-{month:02}-01', 'end_date': None, 'price': f'{month + call % 2}.00'}
+            for month in range(1, 13)
+        ],
+    ),
+    Endpoint(
+        'price-lookup', 'post',
+        lambda catalog: reverse('price-lookup'),
+        lambda catalog, call: {
+            'skus': [f'BENCH-{catalog.category.pk}-{index}' for index in range(min(500, catalog.products // catalog.categories))],
+            'date': '2023-06-01',
+        },
+    ),
+    Endpoint(
+        'category-price', 'put',
+        lambda catalog: reverse('category-price', args=[catalog.category.pk]),
+        lambda catalog, call: {'price': f'{200 + call % 2}.00'},
+    ),
+    *(
+        Endpoint(
+            f'average-price-{period}', 'get',
+            lambda catalog: reverse('average-price', args=[catalog.category.pk]),
+            query=lambda catalog, period=period: {'start_date': '2023-01-01', 'end_date': '2023-12-31', 'period': period},
+        )
+        for period in AveragePricePeriod.values()
+    ),
+    *(
+        Endpoint(
+            f'average-price-weighted-{period}', 'get',
+            lambda catalog: reverse('average-price', args=[catalog.category.pk]),
+            query=lambda catalog, period=period: {
+                'start_date': '2023-01-01', 'end_date': '2023-12-31', 'period': period, 'weighted': 'true',
+            },
+        )
+        for period in AveragePricePeriod.values()
+    ),
+    *(
+        Endpoint(name, 'get', lambda catalog, name=name: reverse(name), query=lambda catalog: {'category': catalog.category.pk})
+        for name in ('export-products', 'export-prices', 'export-history')
+    ),
+]
+
+
+def seed_catalog(products: int, categories: int = 10, prices_per_product: int = 4) -> Catalog:
+    """
+    Creates `categories` categories sharing `products` products, each with back-to-back
+    quarterly prices from 2023 on, and rolls them up.
+
+    The tables are analyzed afterwards, as autovacuum would do for a real catalog. It never
+    sees rows that are rolled back, and without statistics the planner picks plans for empty tables.
+    """
+    category_objects = Category.objects.bulk_create(
+        Category(name=f'Benchmark {index}') for index in range(categories)
+    )
+    product_objects = []
+    for index, category in enumerate(category_objects):
+        product_objects += seed_products(category, products // categories + (index < products % categories))
+
+    quarter = timedelta(days=91)
+    ProductPrice.objects.bulk_create(
+        (
+            ProductPrice(
+                product=product,
+                start_date=date(2023, 1, 1) + quarter * index,
+                end_date=date(2023, 1, 1) + quarter * (index + 1) - timedelta(days=1),
+                price=Decimal(100 + index),
+            )
+            for product in product_objects
+            for index in range(prices_per_product)
+        ),
+        batch_size=5000,
+    )
+    rollup.rebuild([category.pk for category in category_objects])
+    with connection.cursor() as cursor:
+        for model in (Category, Product, ProductPrice, CategoryDailyPrice):
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+    return Catalog(category_objects[0], product_objects[0], categories, products)
+
+
+def load_budgets(path: Path = BUDGETS, size: int | None = None) -> dict[str, dict[str, float]]:
+    """
+    Reads the per-endpoint budgets for a catalog size: the most `queries`, `p95_ms` and `peak_kib` a call may take.
+
+    The file maps catalog sizes to budgets. Budgets under `*`, like query counts, hold at every size.
+
+    Args:
+    - path (Path): The JSON budgets file.
+    - size (int | None): The catalog size, None for the budgets of every size only.
+
+    Returns:
+    - dict[str, dict[str, float]]: The limits of every endpoint that has any.
+    """
+    with open(path) as file:
+        budgets = json.load(file)
+
+    limits = {}
+    for key in ('*', str(size)):
+        for name, endpoint_limits in budgets.get(key, {}).items():
+            limits.setdefault(name, {}).update(endpoint_limits)
+    return limits
+
+
+class _QueryCounter:
+    """
+    Counts the queries run on a connection. Unlike the connection's query log,
+    it is not cleared when a request starts.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run(catalog: Catalog, repeat: int) -> dict[str, dict[str, float]]:
+    """
+    Calls every endpoint through the full middleware stack as an authenticated user.
+
+    One call is traced for its SQL query count and peak Python memory. The next `repeat`
+    calls are timed without tracing.
+
+    Returns:
+    - dict[str, dict[str, float]]: The `queries`, `peak_kib`, `min_ms`, `p50_ms` and `p95_ms` of every endpoint.
+    """
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user(username='benchmark'))
+    results = {}
+
+    with override_settings(**BENCHMARK_SETTINGS), mock.patch.object(BasicThrottleView, 'throttle_classes', []):
+        for endpoint in ENDPOINTS:
+            calls = iter(range(repeat + 1))
+
+            def call():
+                index = next(calls)
+                path = endpoint.path(catalog)
+                if endpoint.body is None:
+                    response = getattr(client, endpoint.method)(path, endpoint.query and endpoint.query(catalog))
+                else:
+                    response = getattr(client, endpoint.method)(path, endpoint.body(catalog, index), format='json')
+                if response.status_code >= 400:
+                    raise AssertionError(f'{endpoint.name} answered {response.status_code}: {response.content[:200]!r}')
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+
+            tracemalloc.start()
+            try:
+                queries = _QueryCounter()
+                with connection.execute_wrapper(queries):
+                    call()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            timings = measure(call, repeat)
+            results[endpoint.name] = {
+                'queries': queries.count,
+                'peak_kib': peak / 1024,
+                **{f'{statistic}_ms': value for statistic, value in timings.items()},
+            }
+
+    return results
+
+
+def over_budget(
+    results: dict[str, dict[str, float]], budgets: dict[str, dict[str, float]], metrics: set[str] | None = None,
+) -> list[str]:
+    """
+    Lists every measurement that exceeds its budget. Endpoints or metrics without a budget are not checked.
+
+    Args:
+    - results (dict[str, dict[str, float]]): The measurements of every endpoint, see `run`.
+    - budgets (dict[str, dict[str, float]]): The limits of every endpoint, see `load_budgets`.
+    - metrics (set[str] | None): Only check these metrics, None for all of them.
+
+    Returns:
+    - list[str]: One line per measurement over its budget.
+    """
+    return [
+        f'{name}: {metric} {results[name][metric]:.1f} > {limit}'
+        for name, limits in budgets.items()
+        if name in results
+        for metric, limit in limits.items()
+        if (metrics is None or metric in metrics) and results[name][metric] > limit
+    ]
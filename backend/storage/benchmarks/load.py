@@ -0,0 +1,192 @@
+import asyncio
+import io
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from unittest import mock
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.test import Client
+from django.test.utils import override_settings
+
+from main.utils.view import BasicThrottleView
+from . import summarize
+from .endpoints import BENCHMARK_SETTINGS
+
+
+@contextmanager
+def throwaway_database() -> Iterator[None]:
+    """
+    Runs a block against a new, migrated copy of the database that is dropped afterwards.
+
+    Requests handled concurrently run on connections of their own, which cannot see data
+    in an uncommitted transaction, so the seeded data is committed there instead.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def database_latency(seconds: float) -> Iterator[None]:
+    """
+    Adds a round trip of `seconds` to every query, like a database on another host.
+
+    The wait happens in the thread that runs the query and releases the GIL, as network I/O does.
+    """
+    if not seconds:
+        yield
+        return
+
+    execute = CursorWrapper._execute
+
+    def delayed(self, *args, **kwargs):
+        time.sleep(seconds)
+        return execute(self, *args, **kwargs)
+
+    with mock.patch.object(CursorWrapper, '_execute', delayed):
+        yield
+
+
+def session_cookie() -> str:
+    """
+    Logs in a new user and returns the `Cookie` header of its session.
+    """
+    client = Client()
+    client.force_login(User.objects.create_user(username='loadtest'))
+    return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+
+def wsgi_run(path: str, query: dict, cookie: str, requests: int) -> list[float]:
+    """
+    Sends requests to the WSGI application one after another, as a single sync worker serves them.
+
+    Returns:
+    - list[float]: The latency of every request in milliseconds.
+    """
+    application = get_wsgi_application()
+    latencies = []
+    for _ in range(requests):
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': urlencode(query),
+            'HTTP_HOST': 'testserver',
+            'HTTP_COOKIE': cookie,
+            'wsgi.input': io.BytesIO(),
+        }
+        setup_testing_defaults(environ)
+        started = time.perf_counter()
+        response = application(environ, lambda status, headers: _check(path, int(status.split()[0])))
+        b''.join(response)
+        response.close()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def asgi_run(path: str, query: dict, cookie: str, requests: int, concurrency: int) -> list[float]:
+    """
+    Sends requests to the ASGI application in one event loop, keeping `concurrency` of them in flight.
+
+    Returns:
+    - list[float]: The latency of every request in milliseconds.
+    """
+    application = get_asgi_application()
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': urlencode(query).encode(),
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+    }
+
+    async def request() -> float:
+        sent = False
+        disconnected = asyncio.Event()
+
+        async def receive() -> dict:
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message: dict):
+            if message['type'] == 'http.response.start':
+                _check(path, message['status'])
+
+        started = time.perf_counter()
+        await application(dict(scope), receive, send)
+        disconnected.set()
+        return (time.perf_counter() - started) * 1000
+
+    async def worker(count: int) -> list[float]:
+        return [await request() for _ in range(count)]
+
+    async def main() -> list[float]:
+        counts = [requests // concurrency + (index < requests % concurrency) for index in range(concurrency)]
+        results = await asyncio.gather(*(worker(count) for count in counts))
+        return [latency for latencies in results for latency in latencies]
+
+    return asyncio.run(main())
+
+
+def _check(path: str, status_code: int):
+    if status_code >= 400:
+        raise AssertionError(f'{path} answered {status_code}')
+
+
+def run(path: str, query: dict, requests: int, concurrency: int, latency: float = 0) -> dict[str, dict[str, float]]:
+    """
+    Compares one sync worker serving requests one at a time with one ASGI process
+    serving them serially and `concurrency` at a time.
+
+    Args:
+    - path (str): The path to request.
+    - query (dict): The query string parameters.
+    - requests (int): The number of requests sent in every mode.
+    - concurrency (int): The number of ASGI requests in flight at once.
+    - latency (float): The seconds added to every query, see `database_latency`.
+
+    Returns:
+    - dict[str, dict[str, float]]: The `rps`, `min_ms`, `p50_ms` and `p95_ms` of every mode.
+    """
+    cookie = session_cookie()
+    modes = {
+        'wsgi': lambda: wsgi_run(path, query, cookie, requests),
+        'asgi-1': lambda: asgi_run(path, query, cookie, requests, 1),
+        f'asgi-{concurrency}': lambda: asgi_run(path, query, cookie, requests, concurrency),
+    }
+
+    results = {}
+    with (
+        override_settings(**BENCHMARK_SETTINGS),
+        mock.patch.object(BasicThrottleView, 'throttle_classes', []),
+        database_latency(latency),
+    ):
+        for mode, send in modes.items():
+            started = time.perf_counter()
+            latencies = send()
+            elapsed = time.perf_counter() - started
+            results[mode] = {
+                'rps': len(latencies) / elapsed,
+                **{f'{statistic}_ms': value for statistic, value in summarize(latencies).items()},
+            }
+    return results
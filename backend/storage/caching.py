@@ -0,0 +1,117 @@
+from datetime import date
+from typing import Awaitable, Callable, Iterable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from main.utils import watermark
+from .enums import Watermark
+
+AVERAGE_KEY = 'storage:average:{category_id}:{version}:{start_date}:{end_date}:{period}:{weighting}'
+COUNTER_KEY = 'storage:average:{counter}'
+
+_MISSING = object()
+
+
+def category_version(category_id: int) -> int:
+    """
+    Returns the current version of a category's prices, its prices watermark.
+    """
+    return watermark.get(Watermark.CATEGORY_PRICES.value, category_id)
+
+
+def invalidate_categories(category_ids: Iterable[int]):
+    """
+    Moves the prices watermark of the given categories once the current transaction commits.
+
+    Moving it earlier would let a concurrent request cache the old prices under the new version.
+    """
+    watermark.touch(Watermark.CATEGORY_PRICES.value, category_ids)
+
+
+def _count(counter: str):
+    key = COUNTER_KEY.format(counter=counter)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def _average_key(category_id: int, start_date: date, end_date: date, period: str, weighted: bool) -> str:
+    return AVERAGE_KEY.format(
+        category_id=category_id,
+        version=category_version(category_id),
+        start_date=start_date.isoformat(),
+        end_date=end_date.isoformat(),
+        period=period,
+        weighting='days' if weighted else 'rows',
+    )
+
+
+def cached_average(
+    category_id: int,
+    start_date: date,
+    end_date: date,
+    period: str,
+    weighted: bool,
+    compute: Callable[[], dict | list[dict] | None],
+) -> tuple[dict | list[dict] | None, bool]:
+    """
+    Returns a cached average price, computing and caching it on a miss.
+
+    Results are keyed by the category version, so a price write in the category makes
+    all of its cached results unreachable at once, and they expire on their own.
+
+    Args:
+    - category_id (int): The category of the average.
+    - start_date (date): The first day of the range.
+    - end_date (date): The last day of the range.
+    - period (str): An `AveragePricePeriod` value.
+    - weighted (bool): Whether the average is weighted by days.
+    - compute (Callable): Computes the average on a miss.
+
+    Returns:
+    - tuple[dict | list[dict] | None, bool]: The average and whether it came from the cache.
+    """
+    key = _average_key(category_id, start_date, end_date, period, weighted)
+    average = cache.get(key, _MISSING)
+    if average is not _MISSING:
+        _count('hits')
+        return average, True
+
+    _count('misses')
+    average = compute()
+    cache.set(key, average, settings.AVERAGE_PRICE_CACHE_TIMEOUT)
+    return average, False
+
+
+async def acached_average(
+    category_id: int,
+    start_date: date,
+    end_date: date,
+    period: str,
+    weighted: bool,
+    compute: Callable[[], Awaitable[dict | list[dict] | None]],
+) -> tuple[dict | list[dict] | None, bool]:
+    """
+    The async variant of `cached_average`, for a `compute` coroutine function.
+    """
+    key = await sync_to_async(_average_key)(category_id, start_date, end_date, period, weighted)
+    average = await cache.aget(key, _MISSING)
+    if average is not _MISSING:
+        await sync_to_async(_count)('hits')
+        return average, True
+
+    await sync_to_async(_count)('misses')
+    average = await compute()
+    await cache.aset(key, average, settings.AVERAGE_PRICE_CACHE_TIMEOUT)
+    return average, False
+
+
+def average_cache_stats() -> dict[str, int]:
+    """
+    Returns the number of average price cache hits and misses since the counters were last reset.
+    """
+    counters = cache.get_many([COUNTER_KEY.format(counter=counter) for counter in ('hits', 'misses')])
+    return {counter: counters.get(COUNTER_KEY.format(counter=counter), 0) for counter in ('hits', 'misses')}
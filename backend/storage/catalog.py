@@ -0,0 +1,585 @@
+import csv
+import gzip
+import io
+import time
+from decimal import Decimal
+from itertools import islice
+from pathlib import Path
+from typing import IO, Callable, Iterator
+
+import orjson
+from django.db import connection, transaction
+from django.utils import timezone as tz
+
+from main.openapi import FieldValidationError
+from main.utils import watermark
+from . import caching, rollup
+from .enums import Action, ExportFormat, JobKind, JobStatus, Watermark
+from .models import Category, Job, Product, ProductPrice, ProductPriceHistory
+
+# The columns a catalog file may have. Rows without a start date only upsert their product.
+COLUMNS = ('category', 'sku', 'name', 'description', 'start_date', 'end_date', 'price')
+REQUIRED_COLUMNS = {'category', 'sku', 'name'}
+MIN_PRICE = Decimal('0.01')
+# The prices and the names, SKUs and category names the tables can hold
+MAX_WHOLE_DIGITS = ProductPrice._meta.get_field('price').max_digits - ProductPrice._meta.get_field('price').decimal_places
+MAX_PRICE = Decimal(10) ** MAX_WHOLE_DIGITS
+MAX_LENGTH = Product._meta.get_field('name').max_length
+# The number of rows sent with each COPY of the load phase
+COPY_BATCH_SIZE = 50_000
+# The number of invalid rows whose errors are kept in the result of an import
+INVALID_ROWS_REPORTED = 20
+
+# Values are staged as text and typed by the validate phase, so a value that is not a date
+# or a price only makes its own row invalid. Rows are numbered by the file line they start on.
+_CREATE_STAGING = """
+    DROP TABLE IF EXISTS {staging};
+    CREATE UNLOGGED TABLE {staging} (
+        line bigint NOT NULL,
+        category text,
+        sku text,
+        name text,
+        description text,
+        start_date text,
+        end_date text,
+        price text,
+        error text,
+        previous_category_id bigint
+    );
+"""
+
+# Casts that return NULL for a value they cannot read, rather than failing the statement.
+# Dates take the format of the API, so they read the same whatever the session's DateStyle.
+_CREATE_CASTS = r"""
+    CREATE OR REPLACE FUNCTION pg_temp.import_date(value text) RETURNS date
+    LANGUAGE plpgsql IMMUTABLE STRICT AS $$
+    BEGIN
+        IF value !~ '^\s*\d{4}-\d{2}-\d{2}\s*$' THEN
+            RETURN NULL;
+        END IF;
+        RETURN value::date;
+    EXCEPTION WHEN data_exception THEN
+        RETURN NULL;
+    END $$;
+
+    CREATE OR REPLACE FUNCTION pg_temp.import_price(value text) RETURNS numeric
+    LANGUAGE plpgsql IMMUTABLE STRICT AS $$
+    DECLARE
+        price numeric;
+    BEGIN
+        price := value::numeric;
+        IF price IN ('NaN', 'Infinity', '-Infinity') THEN
+            RETURN NULL;
+        END IF;
+        RETURN price;
+    EXCEPTION WHEN data_exception THEN
+        RETURN NULL;
+    END $$;
+"""
+
+# A row the file could not be read into keeps the error it was staged with.
+_VALIDATE = """
+    UPDATE {staging} SET error = COALESCE(error, CASE
+        WHEN COALESCE(btrim(category), '') = '' THEN 'category: ' || %(required)s
+        WHEN COALESCE(btrim(sku), '') = '' THEN 'sku: ' || %(required)s
+        WHEN COALESCE(btrim(name), '') = '' THEN 'name: ' || %(required)s
+        WHEN char_length(category) > %(max_length)s THEN 'category: ' || %(too_long)s
+        WHEN char_length(sku) > %(max_length)s THEN 'sku: ' || %(too_long)s
+        WHEN char_length(name) > %(max_length)s THEN 'name: ' || %(too_long)s
+        WHEN start_date IS NOT NULL AND pg_temp.import_date(start_date) IS NULL THEN 'start_date: ' || %(invalid_date)s
+        WHEN end_date IS NOT NULL AND pg_temp.import_date(end_date) IS NULL THEN 'end_date: ' || %(invalid_date)s
+        WHEN price IS NOT NULL AND pg_temp.import_price(price) IS NULL THEN 'price: ' || %(invalid_price)s
+        WHEN round(pg_temp.import_price(price), 2) >= %(max_value)s THEN 'price: ' || %(max_whole_digits)s
+        WHEN start_date IS NULL AND (end_date IS NOT NULL OR price IS NOT NULL) THEN 'start_date: ' || %(required)s
+        WHEN start_date IS NOT NULL AND price IS NULL THEN 'price: ' || %(required)s
+        WHEN pg_temp.import_price(price) < %(min_value)s THEN 'price: ' || %(min_price)s
+        WHEN pg_temp.import_date(end_date) < pg_temp.import_date(start_date) THEN 'end_date: ' || %(end_date)s
+    END)
+"""
+
+# A product name is unique in its category. A SKU loses the name to an earlier SKU of the
+# file, or to a product of another SKU that the file does not rename.
+_VALIDATE_NAMES = """
+    WITH final AS (
+        SELECT DISTINCT ON (sku) sku, category, name, line
+        FROM {staging}
+        WHERE error IS NULL
+        ORDER BY sku, line DESC
+    ), taken AS (
+        SELECT sku
+        FROM (
+            SELECT sku, row_number() OVER (PARTITION BY category, name ORDER BY line) AS position FROM final
+        ) ranked
+        WHERE position > 1
+        UNION
+        SELECT final.sku
+        FROM final
+        JOIN {category} category ON category.name = final.category
+        JOIN {product} product ON product.category_id = category.id AND product.name = final.name AND product.sku <> final.sku
+        LEFT JOIN final renamed ON renamed.sku = product.sku
+        WHERE renamed.sku IS NULL
+    )
+    UPDATE {staging} staged SET error = 'name: ' || %(name_taken)s
+    FROM taken
+    WHERE staged.sku = taken.sku AND staged.error IS NULL
+"""
+
+_UPSERT_CATEGORIES = """
+    INSERT INTO {category} (name, created, updated)
+    SELECT DISTINCT category, now(), now() FROM {staging} WHERE error IS NULL
+    ON CONFLICT (name) DO NOTHING
+"""
+
+# Every SKU takes the name and category of its last line, and the last description it has.
+_IMPORT_PRODUCTS = """
+    CREATE TEMP TABLE import_products AS
+    SELECT DISTINCT ON (staged.sku) staged.sku, staged.name, described.description, category.id AS category_id
+    FROM {staging} staged
+    JOIN {category} category ON category.name = staged.category
+    LEFT JOIN (
+        SELECT DISTINCT ON (sku) sku, description
+        FROM {staging}
+        WHERE error IS NULL AND description IS NOT NULL
+        ORDER BY sku, line DESC
+    ) described ON described.sku = staged.sku
+    WHERE staged.error IS NULL
+    ORDER BY staged.sku, staged.line DESC;
+
+    UPDATE {staging} staged SET previous_category_id = product.category_id
+    FROM import_products imported
+    JOIN {product} product ON product.sku = imported.sku
+    WHERE staged.sku = imported.sku AND staged.error IS NULL AND product.category_id <> imported.category_id;
+"""
+
+_UPDATE_PRODUCTS = """
+    UPDATE {product} product
+    SET name = imported.name,
+        description = COALESCE(imported.description, product.description),
+        category_id = imported.category_id,
+        updated = now()
+    FROM import_products imported
+    WHERE product.sku = imported.sku
+        AND (product.name, product.description, product.category_id)
+            IS DISTINCT FROM (imported.name, COALESCE(imported.description, product.description), imported.category_id)
+"""
+
+_INSERT_PRODUCTS = """
+    INSERT INTO {product} (sku, name, description, category_id, created, updated)
+    SELECT sku, name, COALESCE(description, ''), category_id, now(), now() FROM import_products
+    ON CONFLICT (sku) DO NOTHING
+"""
+
+# The denormalized category of the prices follows their product.
+_MOVE_PRICES = """
+    UPDATE {price} price SET category_id = product.category_id
+    FROM {product} product
+    WHERE price.product_id = product.id AND price.category_id <> product.category_id
+        AND product.sku IN (SELECT sku FROM {staging} WHERE previous_category_id IS NOT NULL)
+"""
+
+# Intervals are resolved like the bulk price endpoint does, with multiranges: a line keeps
+# what the later lines of the same product leave of it, and an existing interval keeps what
+# the whole file leaves of it. The first piece of a trimmed interval stays in its row and the
+# other pieces become new rows. An interval the file sets again with the same price is left alone.
+_RESOLVE_PRICES = """
+    LOCK TABLE {price} IN EXCLUSIVE MODE;
+
+    CREATE TEMP TABLE import_prices AS
+    SELECT staged.product_id, staged.category_id, staged.price, staged.period,
+        datemultirange(staged.period) - COALESCE(range_agg(staged.period) OVER later, '{{}}') AS kept
+    FROM (
+        SELECT staged.line, product.id AS product_id, product.category_id, staged.price::numeric(10, 2) AS price,
+            daterange(staged.start_date::date, staged.end_date::date, '[]') AS period
+        FROM {staging} staged
+        JOIN {product} product ON product.sku = staged.sku
+        WHERE staged.error IS NULL AND staged.start_date IS NOT NULL
+    ) staged
+    WINDOW later AS (PARTITION BY staged.product_id ORDER BY staged.line DESC ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING);
+
+    CREATE TEMP TABLE import_pieces AS
+    SELECT imported.product_id, imported.category_id, imported.price, piece AS period
+    FROM import_prices imported, unnest(imported.kept) AS piece;
+
+    CREATE TEMP TABLE import_overlapped AS
+    SELECT price.id, price.product_id, price.category_id, price.start_date, price.end_date, price.price, price.period,
+        datemultirange(price.period) - coverage.covered AS kept
+    FROM {price} price
+    JOIN (
+        SELECT product_id, range_agg(period) AS covered FROM import_prices GROUP BY product_id
+    ) coverage ON coverage.product_id = price.product_id
+    WHERE price.period && coverage.covered;
+
+    CREATE TEMP TABLE import_unchanged AS
+    SELECT existing.id
+    FROM import_overlapped existing
+    JOIN import_pieces piece
+        ON piece.product_id = existing.product_id AND piece.period = existing.period AND piece.price = existing.price;
+
+    DELETE FROM import_pieces piece
+    USING import_overlapped existing
+    WHERE existing.product_id = piece.product_id AND existing.period = piece.period AND existing.price = piece.price;
+
+    DELETE FROM import_overlapped WHERE id IN (SELECT id FROM import_unchanged);
+
+    CREATE TEMP TABLE import_remains AS
+    SELECT existing.id, existing.product_id, existing.category_id, existing.price, piece AS period,
+        row_number() OVER (PARTITION BY existing.id ORDER BY lower(piece)) AS position
+    FROM import_overlapped existing, unnest(existing.kept) AS piece;
+
+    INSERT INTO import_pieces (product_id, category_id, price, period)
+    SELECT product_id, category_id, price, period FROM import_remains WHERE position > 1;
+"""
+
+# The temporary tables of the phases
+_TEMPORARY = (
+    'import_products', 'import_prices', 'import_pieces', 'import_overlapped', 'import_unchanged', 'import_remains',
+)
+
+_END_DATE = 'CASE WHEN upper_inf({period}) THEN NULL ELSE upper({period}) - 1 END'
+
+_DELETE_PRICES = """
+    INSERT INTO {history} (product_name, product_sku, start_date, end_date, price, action, change_date)
+    SELECT product.name, product.sku, existing.start_date, existing.end_date, existing.price, %(deleted)s, now()
+    FROM import_overlapped existing
+    JOIN {product} product ON product.id = existing.product_id
+    WHERE isempty(existing.kept);
+
+    DELETE FROM {price} WHERE id IN (SELECT id FROM import_overlapped WHERE isempty(kept));
+"""
+
+_TRIM_PRICES = """
+    INSERT INTO {history} (
+        product_name, product_sku, start_date, end_date, price, action, change_date,
+        previous_start_date, previous_end_date, previous_price
+    )
+    SELECT product.name, product.sku, lower(remain.period), {remain_end}, remain.price, %(updated)s, now(),
+        existing.start_date, existing.end_date, existing.price
+    FROM import_remains remain
+    JOIN import_overlapped existing ON existing.id = remain.id
+    JOIN {product} product ON product.id = remain.product_id
+    WHERE remain.position = 1;
+
+    UPDATE {price} price SET start_date = lower(remain.period), end_date = {remain_end}, updated = now()
+    FROM import_remains remain
+    WHERE price.id = remain.id AND remain.position = 1;
+"""
+
+_INSERT_PRICES = """
+    INSERT INTO {history} (product_name, product_sku, start_date, end_date, price, action, change_date)
+    SELECT product.name, product.sku, lower(piece.period), {piece_end}, piece.price, %(created)s, now()
+    FROM import_pieces piece
+    JOIN {product} product ON product.id = piece.product_id;
+
+    INSERT INTO {price} (product_id, category_id, start_date, end_date, price, created, updated)
+    SELECT product_id, category_id, lower(period), {piece_end}, price, now(), now()
+    FROM import_pieces piece;
+"""
+
+_COUNT_PRICES = """
+    SELECT
+        (SELECT COUNT(*) FROM import_prices WHERE isempty(kept)),
+        (SELECT COUNT(*) FROM import_overlapped WHERE isempty(kept)),
+        (SELECT COUNT(*) FROM import_remains WHERE position = 1),
+        (SELECT COUNT(*) FROM import_pieces),
+        (SELECT COUNT(*) FROM import_unchanged)
+"""
+
+_CHANGED_CATEGORIES = """
+    SELECT category_id FROM import_pieces
+    UNION
+    SELECT category_id FROM import_overlapped
+"""
+
+# Categories whose products were imported, and the ones moved products left
+_AFFECTED_CATEGORIES = """
+    SELECT category.id FROM {category} category
+    WHERE category.name IN (SELECT category FROM {staging} WHERE error IS NULL)
+    UNION
+    SELECT previous_category_id FROM {staging} WHERE previous_category_id IS NOT NULL
+"""
+
+_MOVED_CATEGORIES = """
+    SELECT previous_category_id FROM {staging} WHERE previous_category_id IS NOT NULL
+    UNION
+    SELECT product.category_id
+    FROM {product} product
+    JOIN {staging} staged ON staged.sku = product.sku
+    WHERE staged.previous_category_id IS NOT NULL
+"""
+
+_AFFECTED_PRODUCTS = """
+    SELECT product.id FROM {product} product
+    WHERE product.sku IN (SELECT sku FROM {staging} WHERE error IS NULL)
+"""
+
+
+class CatalogImportError(Exception):
+    pass
+
+
+def detect_format(path: Path) -> str:
+    """
+    Returns the format of a catalog file from its extension, ignoring a trailing `.gz`.
+    """
+    suffixes = [suffix for suffix in path.suffixes if suffix != '.gz']
+    suffix = suffixes[-1].lstrip('.') if suffixes else ''
+    if suffix in (ExportFormat.NDJSON.value, 'jsonl'):
+        return ExportFormat.NDJSON.value
+    if suffix == ExportFormat.CSV.value:
+        return ExportFormat.CSV.value
+    raise CatalogImportError(f'Cannot tell the format of {path}, pass it explicitly.')
+
+
+def _open(path: Path) -> IO[str]:
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return path.open('r', encoding='utf-8', newline='')
+
+
+def _sql(template: str, staging: str = '') -> str:
+    quote = connection.ops.quote_name
+    return template.format(
+        staging=quote(staging),
+        category=quote(Category._meta.db_table),
+        product=quote(Product._meta.db_table),
+        price=quote(ProductPrice._meta.db_table),
+        history=quote(ProductPriceHistory._meta.db_table),
+        remain_end=_END_DATE.format(period='remain.period'),
+        piece_end=_END_DATE.format(period='period'),
+    )
+
+
+def _csv_records(reader, header: list[str]) -> Iterator[list]:
+    """
+    Yields the staging row of every record of a CSV file: its line, its values and its error.
+    A record may span several lines when a quoted value has line breaks. Blank lines are skipped.
+    """
+    line = reader.line_num + 1
+    for record in reader:
+        if len(record) == len(header):
+            yield [line, *record, None]
+        elif record:
+            yield [line, *[None] * len(header), f'Expected {len(header)} values, found {len(record)}.']
+        line = reader.line_num + 1
+
+
+def _ndjson_records(file: IO[str]) -> Iterator[list]:
+    """
+    Yields the staging row of every line of an NDJSON file that is not blank. A line that is
+    not a JSON object stages no values, only its error.
+    """
+    for line, text in enumerate(file, 1):
+        if not text.strip():
+            continue
+        try:
+            document = orjson.loads(text)
+        except orjson.JSONDecodeError:
+            document = None
+        if not isinstance(document, dict):
+            yield [line, *[None] * len(COLUMNS), 'Not a JSON object.']
+            continue
+        values = (document.get(column) for column in COLUMNS)
+        yield [line, *(None if value is None else str(value) for value in values), None]
+
+
+def _copy(cursor, sql: str, records: Iterator[list]):
+    """
+    Copies rows with one COPY per `COPY_BATCH_SIZE` rows. Empty values are copied as NULL.
+    """
+    while batch := list(islice(records, COPY_BATCH_SIZE)):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerows(batch)
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+
+
+class CatalogImport:
+    """
+    Loads a catalog file of categories, products and prices into the database in phases.
+
+    The file is parsed as it is read, numbering its rows by line, and copied as text into an
+    unlogged staging table with COPY. Every later phase is a few set-based statements over it. Each phase commits on its own and is recorded in the
+    import's `Job` with its counts, so an import that failed resumes at the phase that failed,
+    without reading the file again. The `done` and `total` of the job count phases.
+
+    Writes go around the ORM: the price history is written with one INSERT per kind of change,
+    and the daily rollup, cached averages and watermarks of what changed are refreshed last.
+    """
+    PHASES = ('load', 'validate', 'categories', 'products', 'prices', 'finish')
+
+    def __init__(self, job: Job):
+        self.job = job
+
+    @classmethod
+    def start(cls, path: Path, file_format: str) -> 'CatalogImport':
+        job = Job.objects.create(
+            kind=JobKind.CATALOG_IMPORT,
+            payload={'source': str(path), 'format': file_format, 'phases': []},
+            result={},
+            total=len(cls.PHASES),
+        )
+        return cls(job)
+
+    @classmethod
+    def resume(cls, job_id: str) -> 'CatalogImport':
+        job = Job.objects.filter(pk=job_id, kind=JobKind.CATALOG_IMPORT).first()
+        if job is None:
+            raise CatalogImportError(f'There is no catalog import {job_id}.')
+        if job.status == JobStatus.SUCCEEDED:
+            raise CatalogImportError(f'The catalog import {job_id} is already complete.')
+        return cls(job)
+
+    @property
+    def staging(self) -> str:
+        return f'storage_import_{self.job.pk.hex}'
+
+    def pending(self) -> list[str]:
+        return [phase for phase in self.PHASES if phase not in self.job.payload['phases']]
+
+    def run(self, report: Callable[[str, int, float], None] | None = None):
+        """
+        Runs the phases that are not complete yet, in order.
+
+        Args:
+        - report (Callable | None): Called after every phase with its name, the number of rows
+          it handled and the seconds it took.
+        """
+        Job.objects.filter(pk=self.job.pk).update(status=JobStatus.RUNNING, started=tz.now(), error='')
+        try:
+            if 'load' in self.job.payload['phases']:
+                self._check_staging()
+            for phase in self.pending():
+                started = time.perf_counter()
+                with transaction.atomic(), connection.cursor() as cursor:
+                    rows, counts = getattr(self, f'_{phase}')(cursor)
+                    # Dropped here rather than on commit, which does not come when run in an outer transaction
+                    cursor.execute(f'DROP TABLE IF EXISTS {", ".join(_TEMPORARY)}')
+                    self.job.payload['phases'].append(phase)
+                    self.job.result.update(counts)
+                    Job.objects.filter(pk=self.job.pk).update(
+                        payload=self.job.payload, result=self.job.result, done=len(self.job.payload['phases']),
+                    )
+                if report is not None:
+                    report(phase, rows, time.perf_counter() - started)
+        except Exception as e:
+            Job.objects.filter(pk=self.job.pk).update(status=JobStatus.FAILED, error=str(e), finished=tz.now())
+            raise
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {connection.ops.quote_name(self.staging)}')
+        Job.objects.filter(pk=self.job.pk).update(status=JobStatus.SUCCEEDED, finished=tz.now())
+
+    def _check_staging(self):
+        """
+        Fails a resumed import whose staging table lost rows: the database empties unlogged
+        tables when it restarts after a crash, and the later phases would then import nothing.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s)', [self.staging])
+            if cursor.fetchone()[0] is not None:
+                cursor.execute(_sql('SELECT COUNT(*) FROM {staging}', self.staging))
+                if cursor.fetchone()[0] == self.job.result['rows']:
+                    return
+        raise CatalogImportError(
+            f'The staging table of catalog import {self.job.pk} lost its rows, as unlogged tables do when '
+            f'the database crashes. Import the file again.'
+        )
+
+    def _load(self, cursor) -> tuple[int, dict]:
+        path = Path(self.job.payload['source'])
+        cursor.execute(_sql(_CREATE_STAGING, self.staging))
+        with _open(path) as file:
+            if self.job.payload['format'] == ExportFormat.CSV.value:
+                reader = csv.reader(file)
+                header = next(reader, [])
+                unknown = set(header) - set(COLUMNS)
+                if unknown or not REQUIRED_COLUMNS <= set(header):
+                    raise CatalogImportError(
+                        f'The CSV header must name columns among {", ".join(COLUMNS)}, '
+                        f'including {", ".join(sorted(REQUIRED_COLUMNS))}.'
+                    )
+                records = _csv_records(reader, header)
+            else:
+                header = list(COLUMNS)
+                records = _ndjson_records(file)
+            columns = ', '.join(('line', *header, 'error'))
+            _copy(cursor, _sql(f'COPY {{staging}} ({columns}) FROM STDIN WITH (FORMAT csv)', self.staging), records)
+
+        cursor.execute(_sql('ANALYZE {staging}', self.staging))
+        cursor.execute(_sql('SELECT COUNT(*) FROM {staging}', self.staging))
+        rows = cursor.fetchone()[0]
+        return rows, {'rows': rows}
+
+    def _validate(self, cursor) -> tuple[int, dict]:
+        messages = {
+            'min_value': MIN_PRICE,
+            'max_value': MAX_PRICE,
+            'max_length': MAX_LENGTH,
+            'required': str(FieldValidationError.REQUIRED.value[1]),
+            'too_long': str(FieldValidationError.MAX_LENGTH.value[1]).format(max_length=MAX_LENGTH),
+            'invalid_date': str(FieldValidationError.INVALID_DATE.value[1]).format(format='YYYY-MM-DD'),
+            'invalid_price': str(FieldValidationError.INVALID_NUMBER.value[1]),
+            'max_whole_digits': str(FieldValidationError.MAX_WHOLE_DIGITS.value[1]).format(max_whole_digits=MAX_WHOLE_DIGITS),
+            'min_price': str(FieldValidationError.MIN_VALUE.value[1]).format(min_value=MIN_PRICE),
+            'end_date': FieldValidationError.END_DATE_AFTER_START_DATE.value[1],
+            'name_taken': FieldValidationError.PRODUCT_NAME_TAKEN.value[1],
+        }
+        cursor.execute(_CREATE_CASTS)
+        cursor.execute(_sql(_VALIDATE, self.staging), messages)
+        rows = cursor.rowcount
+        cursor.execute(_sql(_VALIDATE_NAMES, self.staging), messages)
+        cursor.execute(_sql('SELECT COUNT(*) FROM {staging} WHERE error IS NOT NULL', self.staging))
+        invalid = cursor.fetchone()[0]
+        cursor.execute(
+            _sql('SELECT line, error FROM {staging} WHERE error IS NOT NULL ORDER BY line LIMIT %s', self.staging),
+            [INVALID_ROWS_REPORTED],
+        )
+        return rows, {'invalid': invalid, 'errors': [f'Line {line}: {error}' for line, error in cursor.fetchall()]}
+
+    def _categories(self, cursor) -> tuple[int, dict]:
+        cursor.execute(_sql(_UPSERT_CATEGORIES, self.staging))
+        return cursor.rowcount, {'categories_created': cursor.rowcount}
+
+    def _products(self, cursor) -> tuple[int, dict]:
+        cursor.execute(_sql(_IMPORT_PRODUCTS, self.staging))
+        cursor.execute(_sql(_UPDATE_PRODUCTS, self.staging))
+        updated = cursor.rowcount
+        cursor.execute(_sql(_INSERT_PRODUCTS, self.staging))
+        created = cursor.rowcount
+        cursor.execute(_sql(_MOVE_PRICES, self.staging))
+        return created + updated, {'products_created': created, 'products_updated': updated, 'prices_moved': cursor.rowcount}
+
+    def _prices(self, cursor) -> tuple[int, dict]:
+        actions = {'created': Action.CREATED.value, 'updated': Action.UPDATED.value, 'deleted': Action.DELETED.value}
+        cursor.execute(_sql(_RESOLVE_PRICES, self.staging))
+        cursor.execute(_COUNT_PRICES)
+        superseded, deleted, trimmed, created, unchanged = cursor.fetchone()
+        cursor.execute(_CHANGED_CATEGORIES)
+        self.job.payload['prices_changed'] = [category_id for category_id, in cursor.fetchall()]
+        cursor.execute(_sql(_DELETE_PRICES, self.staging), actions)
+        cursor.execute(_sql(_TRIM_PRICES, self.staging), actions)
+        cursor.execute(_sql(_INSERT_PRICES, self.staging), actions)
+        counts = {
+            'prices_created': created,
+            'prices_trimmed': trimmed,
+            'prices_deleted': deleted,
+            'prices_unchanged': unchanged,
+            'prices_superseded': superseded,
+        }
+        return created + trimmed + deleted, counts
+
+    def _finish(self, cursor) -> tuple[int, dict]:
+        # Only the categories whose prices changed, or gained or lost a product with prices, are rebuilt.
+        cursor.execute(_sql(_MOVED_CATEGORIES, self.staging))
+        repriced = set(self.job.payload['prices_changed']).union(category_id for category_id, in cursor.fetchall())
+        days = rollup.rebuild(sorted(repriced)) if repriced else 0
+        caching.invalidate_categories(repriced)
+
+        cursor.execute(_sql(_AFFECTED_CATEGORIES, self.staging))
+        watermark.touch(Watermark.CATEGORY.value, [category_id for category_id, in cursor.fetchall()])
+        # Product watermarks are read by the price index of every process.
+        cursor.execute(_sql(_AFFECTED_PRODUCTS, self.staging))
+        while product_ids := [product_id for product_id, in cursor.fetchmany(10_000)]:
+            watermark.touch(Watermark.PRODUCT.value, product_ids)
+            watermark.touch(Watermark.PRODUCT_PRICES.value, product_ids)
+        return days, {}
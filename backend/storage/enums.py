@@ -11,3 +11,43 @@ class AveragePricePeriod(BaseEnum):
     WHOLE = 'whole'
     WEEK = 'week'
     MONTH = 'month'
+
+
+class ExportFormat(BaseEnum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
+
+class Watermark(BaseEnum):
+    CATEGORY = 'storage.category'
+    PRODUCT = 'storage.product'
+    CATEGORY_PRICES = 'storage.category-prices'
+    PRODUCT_PRICES = 'storage.product-prices'
+
+
+class BulkRowStatus(BaseEnum):
+    CREATED = 'created'
+    SUPERSEDED = 'superseded'
+    INVALID = 'invalid'
+
+
+class BulkProductRowStatus(BaseEnum):
+    CREATED = 'created'
+    UPDATED = 'updated'
+    UNCHANGED = 'unchanged'
+    SUPERSEDED = 'superseded'
+    INVALID = 'invalid'
+
+
+class JobKind(BaseTextChoices):
+    CATEGORY_PRICE = 'category-price'
+    BULK_PRICES = 'bulk-prices'
+    CATEGORY_DELETE = 'category-delete'
+    CATALOG_IMPORT = 'catalog-import'
+
+
+class JobStatus(BaseTextChoices):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
@@ -0,0 +1,172 @@
+import csv
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+from .enums import ExportFormat
+from .models import Product, ProductPrice, ProductPriceHistory
+
+
+@dataclass(frozen=True)
+class Export:
+    """
+    A table that can be exported, as `(column, lookup)` pairs read with `values_list`.
+    """
+    columns: tuple[tuple[str, str], ...]
+
+    @property
+    def header(self) -> list[str]:
+        return [column for column, _ in self.columns]
+
+    @property
+    def lookups(self) -> list[str]:
+        return [lookup for _, lookup in self.columns]
+
+
+PRODUCTS = Export((
+    ('id', 'id'),
+    ('name', 'name'),
+    ('category', 'category_id'),
+    ('sku', 'sku'),
+    ('description', 'description'),
+))
+
+PRICES = Export((
+    ('id', 'id'),
+    ('product', 'product_id'),
+    ('sku', 'product__sku'),
+    ('start_date', 'start_date'),
+    ('end_date', 'end_date'),
+    ('price', 'price'),
+))
+
+HISTORY = Export((
+    ('id', 'id'),
+    ('product_name', 'product_name'),
+    ('product_sku', 'product_sku'),
+    ('start_date', 'start_date'),
+    ('end_date', 'end_date'),
+    ('price', 'price'),
+    ('action', 'action'),
+    ('change_date', 'change_date'),
+))
+
+
+def products(category_id: int | None, start_date: date | None, end_date: date | None) -> models.QuerySet:
+    """
+    Products of a category, or of all of them, last updated within the date range.
+    """
+    queryset = Product.objects.all()
+    if category_id is not None:
+        queryset = queryset.filter(category_id=category_id)
+    if start_date is not None:
+        queryset = queryset.filter(updated__date__gte=start_date)
+    if end_date is not None:
+        queryset = queryset.filter(updated__date__lte=end_date)
+    return queryset
+
+
+def prices(category_id: int | None, start_date: date | None, end_date: date | None) -> models.QuerySet:
+    """
+    Price intervals of a category, or of all of them, that overlap the date range.
+    """
+    queryset = ProductPrice.objects.all()
+    if category_id is not None:
+        queryset = queryset.filter(category_id=category_id)
+    if start_date is not None or end_date is not None:
+        queryset = queryset.overlapping(start_date, end_date)
+    return queryset
+
+
+def history(category_id: int | None, start_date: date | None, end_date: date | None) -> models.QuerySet:
+    """
+    Price history recorded within the date range, for the SKUs currently in a category or for all of them.
+    """
+    queryset = ProductPriceHistory.objects.all()
+    if category_id is not None:
+        queryset = queryset.filter(product_sku__in=Product.objects.filter(category_id=category_id).values('sku'))
+    # Plain bounds on change_date, rather than on its date, let PostgreSQL skip the partitions outside the range.
+    if start_date is not None:
+        queryset = queryset.filter(change_date__gte=_day_start(start_date))
+    if end_date is not None:
+        queryset = queryset.filter(change_date__lt=_day_start(end_date + timedelta(days=1)))
+    return queryset
+
+
+def _day_start(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rows(export: Export, queryset: models.QuerySet) -> Iterator[tuple]:
+    """
+    Reads the export's columns in id order, `EXPORT_CHUNK_SIZE` rows at a time.
+
+    Outside a transaction PostgreSQL streams them through a server-side cursor, so memory
+    does not grow with the number of rows.
+    """
+    return queryset.order_by('id').values_list(*export.lookups).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+async def arows(export: Export, queryset: models.QuerySet) -> AsyncIterator[tuple]:
+    """
+    Like `rows`, for async code. Each chunk is read in the same thread, through the same server-side cursor.
+
+    `QuerySet.aiterator()` is not used since it starts a `values_list()` query on the event loop.
+    """
+    iterator = rows(export, queryset)
+    next_chunk = sync_to_async(lambda: list(islice(iterator, settings.EXPORT_CHUNK_SIZE)))
+    while chunk := await next_chunk():
+        for row in chunk:
+            yield row
+
+
+class _Line:
+    """
+    A file-like object that hands back what the CSV writer writes instead of storing it.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _lines(export: Export, output: str) -> tuple[list[str], Callable[[tuple], str]]:
+    """
+    Returns the header lines of an export format and the function that encodes one row as a line.
+    """
+    match output:
+        case ExportFormat.NDJSON.value:
+            encoder = DjangoJSONEncoder()
+            return [], lambda row: json.dumps(dict(zip(export.header, row)), default=encoder.default) + '\n'
+
+        case ExportFormat.CSV.value:
+            writer = csv.writer(_Line())
+            return [writer.writerow(export.header)], writer.writerow
+
+
+def encode(export: Export, rows: Iterable[tuple], output: str) -> Iterator[str]:
+    """
+    Encodes rows one line at a time as NDJSON objects, or as CSV with a header line.
+    """
+    header, line = _lines(export, output)
+    yield from header
+    for row in rows:
+        yield line(row)
+
+
+async def aencode(export: Export, rows: AsyncIterable[tuple], output: str) -> AsyncIterator[str]:
+    """
+    Like `encode`, for rows read with `arows`.
+    """
+    header, line = _lines(export, output)
+    for value in header:
+        yield value
+    async for row in rows:
+        yield line(row)
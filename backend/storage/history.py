@@ -0,0 +1,204 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterator
+
+from asgiref.local import Local
+from django.db import connection, transaction
+from django.dispatch import Signal
+
+from . import models
+from .enums import Action
+
+_state = Local()
+
+# For every SKU, the latest change known at `known_at` that made an interval cover `day` or
+# stop covering it. Walks the (product_sku, change_date, id) index backwards from `known_at`
+# and stops at the first match.
+_AS_OF = """
+    SELECT sku, change.action, change.start_date, change.end_date, change.price, change.change_date
+    FROM unnest(%(skus)s::varchar[]) WITH ORDINALITY AS request(sku, position)
+    LEFT JOIN LATERAL (
+        SELECT action, start_date, end_date, price, change_date
+        FROM {history} history
+        WHERE history.product_sku = request.sku
+            AND history.change_date <= %(known_at)s
+            AND (
+                history.start_date <= %(day)s AND (history.end_date IS NULL OR history.end_date >= %(day)s)
+                OR history.previous_start_date <= %(day)s
+                    AND (history.previous_end_date IS NULL OR history.previous_end_date >= %(day)s)
+            )
+        ORDER BY history.change_date DESC, history.id DESC
+        LIMIT 1
+    ) change ON true
+    ORDER BY request.position
+"""
+
+# Sent with the flushed `entries` and the `product_ids` whose prices they change, after their
+# history is written, inside the same transaction.
+prices_changed = Signal()
+
+
+@dataclass
+class HistoryEntry:
+    # None for an entry that stands for the same change of several products
+    product_id: int | None
+    start_date: date
+    end_date: date | None
+    price: Decimal
+    action: Action
+    # The stored `start_date`, `end_date` and `price` of an updated interval
+    previous: dict | None = None
+    category_id: int | None = None
+    # The number of intervals that had this change
+    count: int = 1
+
+
+class HistoryWriter:
+    """
+    Collects price history entries in memory and writes them with a single bulk insert.
+
+    Product names, SKUs and categories are taken from product instances that are already loaded.
+    The ones that are still missing when the entries are flushed are fetched with one query.
+    """
+
+    def __init__(self):
+        self.entries: list[HistoryEntry] = []
+        self.products: dict[int, tuple[str, str, int]] = {}
+
+    def remember_product(self, product: 'models.Product'):
+        self.products[product.pk] = (product.name, product.sku, product.category_id)
+
+    def add(self, price: 'models.ProductPrice', action: Action, previous: dict | None = None):
+        if models.ProductPrice.product.is_cached(price):
+            self.remember_product(price.product)
+        self.entries.append(HistoryEntry(price.product_id, price.start_date, price.end_date, price.price, action, previous))
+
+    def flush(self):
+        if not self.entries:
+            return
+
+        missing = {entry.product_id for entry in self.entries} - self.products.keys()
+        if missing:
+            products = models.Product.objects.filter(pk__in=missing).values_list('pk', 'name', 'sku', 'category_id')
+            self.products.update((pk, (name, sku, category_id)) for pk, name, sku, category_id in products)
+
+        for entry in self.entries:
+            entry.category_id = self.products[entry.product_id][2]
+
+        models.ProductPriceHistory.objects.bulk_create(
+            models.ProductPriceHistory(
+                product_name=self.products[entry.product_id][0],
+                product_sku=self.products[entry.product_id][1],
+                start_date=entry.start_date,
+                end_date=entry.end_date,
+                price=entry.price,
+                action=entry.action,
+                previous_start_date=entry.previous['start_date'] if entry.previous else None,
+                previous_end_date=entry.previous['end_date'] if entry.previous else None,
+                previous_price=entry.previous['price'] if entry.previous else None,
+            )
+            for entry in self.entries
+        )
+        entries, self.entries = self.entries, []
+        prices_changed.send(sender=HistoryWriter, entries=entries, product_ids={entry.product_id for entry in entries})
+
+
+def get_writer() -> HistoryWriter | None:
+    """
+    Returns the writer of the enclosing `atomic()` block, if any.
+    """
+    return getattr(_state, 'writer', None)
+
+
+@contextmanager
+def atomic(using: str | None = None) -> Iterator[HistoryWriter]:
+    """
+    Opens a transaction whose price history is written with one bulk insert.
+
+    Entries recorded inside the block are kept in memory and flushed when the outermost
+    block exits, before its transaction commits, so the history is committed or rolled back
+    together with the prices it describes. Entries recorded inside a block that raises
+    are discarded together with the writes they describe.
+    """
+    writer = get_writer()
+    outermost = writer is None
+    if outermost:
+        writer = _state.writer = HistoryWriter()
+    mark = len(writer.entries)
+
+    try:
+        # Nested blocks join the outer transaction without a savepoint, like Django's own writes.
+        with transaction.atomic(using=using, savepoint=outermost):
+            yield writer
+            if outermost:
+                writer.flush()
+    except BaseException:
+        del writer.entries[mark:]
+        raise
+    finally:
+        if outermost:
+            del _state.writer
+
+
+def record(price: 'models.ProductPrice', action: Action, previous: dict | None = None):
+    """
+    Records a history entry for a price interval.
+
+    Inside an `atomic()` block the entry is buffered, otherwise it is written right away.
+    """
+    writer = get_writer()
+    if writer is not None:
+        writer.add(price, action, previous)
+        return
+
+    writer = HistoryWriter()
+    writer.add(price, action, previous)
+    writer.flush()
+
+
+def remember_product(product: 'models.Product'):
+    """
+    Keeps the name and SKU of a product that is about to be deleted, so the history of its
+    cascade-deleted prices can be written after the product row is gone.
+    """
+    writer = get_writer()
+    if writer is not None:
+        writer.remember_product(product)
+
+
+def prices_as_of(skus: list[str], day: date, known_at: datetime) -> list[dict]:
+    """
+    Answers what price each SKU had on a day, as the history knew it at a point in time.
+
+    The interval in effect is the one of the latest change that touched the day: a creation
+    or update that covers it, or an update or deletion that stopped covering it.
+
+    Args:
+    - skus (list[str]): The SKUs to look up, answered in this order.
+    - day (date): The day the price applies to.
+    - known_at (datetime): Only changes recorded until this time are taken into account.
+
+    Returns:
+    - list[dict]: One row per SKU with `sku`, `price`, `start_date`, `end_date` and the
+      `change_date` of the change that set it. All but `sku` are None when no price applied.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _AS_OF.format(history=connection.ops.quote_name(models.ProductPriceHistory._meta.db_table)),
+            {'skus': skus, 'day': day, 'known_at': known_at},
+        )
+        rows = cursor.fetchall()
+
+    results = []
+    for sku, action, start_date, end_date, price, change_date in rows:
+        in_effect = (
+            action is not None and action != Action.DELETED
+            and start_date <= day and (end_date is None or end_date >= day)
+        )
+        if in_effect:
+            results.append({'sku': sku, 'price': price, 'start_date': start_date, 'end_date': end_date, 'change_date': change_date})
+        else:
+            results.append({'sku': sku, 'price': None, 'start_date': None, 'end_date': None, 'change_date': None})
+    return results
@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+
+ONE_DAY = timedelta(days=1)
+
+
+def overlaps(start_a: date, end_a: date | None, start_b: date, end_b: date | None) -> bool:
+    """
+    Checks whether two closed date intervals overlap. A missing end date means the interval is open-ended.
+    """
+    return (end_b is None or start_a <= end_b) and (end_a is None or start_b <= end_a)
+
+
+def subtract(start_date: date, end_date: date | None, cut_start: date, cut_end: date | None) -> list[tuple[date, date | None]]:
+    """
+    Returns what is left of an interval after cutting out an overlapping one.
+
+    The result is empty when the interval is covered, holds one trimmed interval when the cut
+    covers one of its ends, and holds two intervals when the cut falls strictly inside it.
+
+    Args:
+    - start_date (date): The start of the interval.
+    - end_date (date | None): The end of the interval, None if open-ended.
+    - cut_start (date): The start of the overlapping interval.
+    - cut_end (date | None): The end of the overlapping interval, None if open-ended.
+
+    Returns:
+    - list[tuple[date, date | None]]: The remaining intervals, in date order.
+    """
+    pieces = []
+    if start_date < cut_start:
+        pieces.append((start_date, cut_start - ONE_DAY))
+    if cut_end is not None and (end_date is None or end_date > cut_end):
+        pieces.append((cut_end + ONE_DAY, end_date))
+    return pieces
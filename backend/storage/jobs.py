@@ -0,0 +1,144 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+from typing import Callable, Iterator
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone as tz
+
+from . import history
+from .enums import JobKind, JobStatus
+from .models import Category, Job, Product, ProductPrice
+from .pricing import bulk_report, ingest_price_rows, reprice_category
+from .serializers.response import BulkProductPriceResponseSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class Progress:
+    """
+    Records how far a running job got, in the unit of its `total`.
+    """
+
+    def __init__(self, job: Job):
+        self.job = job
+
+    def start(self, total: int):
+        Job.objects.filter(pk=self.job.pk).update(total=total, done=0, heartbeat=tz.now())
+
+    def advance(self, count: int):
+        Job.objects.filter(pk=self.job.pk).update(done=F('done') + count, heartbeat=tz.now())
+
+
+def _chunks(queryset: QuerySet) -> Iterator[list[int]]:
+    """
+    Yields the ids of a queryset in ascending chunks of `JOB_CHUNK_SIZE`, reading each chunk
+    after the previous one was handled, so rows deleted by a chunk are not read again.
+    """
+    last = None
+    while True:
+        chunk = queryset.filter(pk__gt=last) if last is not None else queryset
+        ids = list(chunk.order_by('pk').values_list('pk', flat=True)[:settings.JOB_CHUNK_SIZE])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def reprice_category_job(job: Job, progress: Progress) -> dict:
+    """
+    Changes the prices of a category product chunk by product chunk, each in its own transaction.
+    """
+    category = Category.objects.get(pk=job.payload['category'])
+    price = Decimal(job.payload['price'])
+    products = Product.objects.filter(category=category)
+    progress.start(products.count())
+
+    updated = 0
+    for product_ids in _chunks(products):
+        with transaction.atomic():
+            updated += reprice_category(category, price, product_ids)
+        progress.advance(len(product_ids))
+    return {'updated': updated}
+
+
+def ingest_prices_job(job: Job, progress: Progress) -> dict:
+    """
+    Writes bulk price rows chunk by chunk, in payload order.
+
+    A row is only checked against the rows of its own chunk for being superseded: one that
+    a later chunk replaces is reported as created, and the later row reports the deletion.
+    """
+    rows = job.payload['rows']
+    progress.start(len(rows))
+
+    results, deleted, trimmed = {}, 0, 0
+    for offset in range(0, len(rows), settings.JOB_CHUNK_SIZE):
+        chunk = rows[offset:offset + settings.JOB_CHUNK_SIZE]
+        chunk_results, chunk_deleted, chunk_trimmed = ingest_price_rows(chunk, offset)
+        results.update(chunk_results)
+        deleted += chunk_deleted
+        trimmed += chunk_trimmed
+        progress.advance(len(chunk))
+    return BulkProductPriceResponseSerializer(bulk_report(results, deleted, trimmed)).data
+
+
+def delete_category_job(job: Job, progress: Progress) -> dict:
+    """
+    Deletes the products of a category chunk by chunk, then the category itself.
+    """
+    category = Category.objects.get(pk=job.payload['category'])
+    products = Product.objects.filter(category=category)
+    progress.start(products.count())
+
+    deleted_products, deleted_prices = 0, 0
+    for product_ids in _chunks(products):
+        # Collect the history of the cascade-deleted prices into one bulk insert per chunk.
+        with history.atomic():
+            _, deleted = Product.objects.filter(pk__in=product_ids).delete()
+        deleted_products += deleted.get(Product._meta.label, 0)
+        deleted_prices += deleted.get(ProductPrice._meta.label, 0)
+        progress.advance(len(product_ids))
+
+    # Products added to the category meanwhile go with it.
+    _, deleted = category.delete()
+    return {
+        'products': deleted_products + deleted.get(Product._meta.label, 0),
+        'prices': deleted_prices + deleted.get(ProductPrice._meta.label, 0),
+    }
+
+
+HANDLERS: dict[str, Callable[[Job, Progress], dict]] = {
+    JobKind.CATEGORY_PRICE: reprice_category_job,
+    JobKind.BULK_PRICES: ingest_prices_job,
+    JobKind.CATEGORY_DELETE: delete_category_job,
+}
+
+
+def run(job_id: str):
+    """
+    Runs a queued job and records its outcome.
+
+    A running job is only run again from the start once it made no progress for `JOB_LEASE`
+    seconds, since that is how a job lost with its worker comes back. A job the broker delivers
+    again while its worker is still on it is left alone. Every kind of job ends in the same state
+    when it is run twice.
+    """
+    now = tz.now()
+    lost = Q(status=JobStatus.RUNNING, heartbeat__lt=now - timedelta(seconds=settings.JOB_LEASE))
+    claimed = Job.objects.filter(Q(status=JobStatus.QUEUED) | lost, pk=job_id).update(
+        status=JobStatus.RUNNING, started=now, heartbeat=now,
+    )
+    if not claimed:
+        return
+
+    job = Job.objects.get(pk=job_id)
+    try:
+        result = HANDLERS[job.kind](job, Progress(job))
+    except Exception as e:
+        logger.exception('Job %s failed', job.pk)
+        Job.objects.filter(pk=job.pk).update(status=JobStatus.FAILED, error=str(e) or type(e).__name__, finished=tz.now())
+    else:
+        Job.objects.filter(pk=job.pk).update(status=JobStatus.SUCCEEDED, result=result, finished=tz.now())
@@ -0,0 +1,95 @@
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.utils.serializers import ValuesSerializer
+from storage import rollup
+from storage.averages import interval_average, plain_average, rollup_average
+from storage.benchmarks import endpoints, measure, scratch, seed_category, seed_products
+from storage.enums import AveragePricePeriod
+from storage.models import Category, Product
+from storage.serializers.model import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = 'Time the hot paths of the storage app on seeded data. Nothing is left in the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=['averages', 'serialization', 'endpoints'], help='The code path to benchmark.')
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10_000, 100_000],
+            help='The numbers of rows to seed, one run each.',
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='The number of timed calls per measurement.')
+        parser.add_argument(
+            '--budgets',
+            type=Path,
+            default=endpoints.BUDGETS,
+            help='The JSON file of per-endpoint budgets checked by the endpoints suite.',
+        )
+        parser.add_argument(
+            '--queries-only',
+            action='store_true',
+            help='Only check the query budgets of the endpoints suite, for machines too noisy for the latency and memory ones.',
+        )
+
+    def handle(self, *args, suite: str, sizes: list[int], repeat: int, budgets: Path, queries_only: bool, **options):
+        self.budgets = budgets
+        self.metrics = endpoints.QUERY_METRICS if queries_only else None
+        self.violations = []
+        for size in sizes:
+            with scratch():
+                getattr(self, f'benchmark_{suite}')(size, repeat)
+
+        if self.violations:
+            raise CommandError('Over budget:\n' + '\n'.join(self.violations))
+
+    def report(self, label: str, timings: dict[str, float]):
+        self.stdout.write(
+            f'{label:<52} min {timings["min"]:9.2f} ms   p50 {timings["p50"]:9.2f} ms   p95 {timings["p95"]:9.2f} ms'
+        )
+
+    def benchmark_averages(self, size: int, repeat: int):
+        """
+        Compares the plain SQL row average with the two day-weighted paths, the rollup and
+        NumPy over the intervals, for every period.
+        """
+        category = seed_category(size)
+        rollup.rebuild([category.pk])
+        start_date, end_date = date(2020, 1, 1), date(2024, 12, 31)
+
+        for period in AveragePricePeriod.values():
+            for name, average in (('plain', plain_average), ('rollup', rollup_average), ('intervals', interval_average)):
+                timings = measure(lambda: average(category, start_date, end_date, period), repeat)
+                self.report(f'averages size={size} period={period} method={name}', timings)
+
+    def benchmark_serialization(self, size: int, repeat: int):
+        """
+        Compares ProductSerializer over model instances with ValuesSerializer over values() rows.
+        """
+        seed_products(Category.objects.create(name=f'Benchmark {size}'), size)
+        queryset = Product.objects.order_by('id')
+        values_serializer = ValuesSerializer(ProductSerializer)
+
+        model = measure(lambda: ProductSerializer(queryset.all(), many=True).data, repeat)
+        self.report(f'serialization size={size} serializer=model', model)
+        values = measure(lambda: values_serializer.many(queryset.values(*values_serializer.lookups)), repeat)
+        self.report(f'serialization size={size} serializer=values', values)
+        self.stdout.write(f'serialization size={size} speedup x{model["p50"] / values["p50"]:.1f}')
+
+    def benchmark_endpoints(self, size: int, repeat: int):
+        """
+        Calls every storage endpoint on a catalog of `size` products and checks the budgets.
+        """
+        results = endpoints.run(endpoints.seed_catalog(size), repeat)
+        for name, result in results.items():
+            self.stdout.write(
+                f'endpoints size={size} {name:<24} queries {result["queries"]:3}   peak {result["peak_kib"]:9.1f} KiB   '
+                f'p50 {result["p50_ms"]:9.2f} ms   p95 {result["p95_ms"]:9.2f} ms'
+            )
+        budgets = endpoints.load_budgets(self.budgets, size)
+        self.violations += [f'size={size} {violation}' for violation in endpoints.over_budget(results, budgets, self.metrics)]
@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from storage import rollup
+
+
+class Command(BaseCommand):
+    help = (
+        'Move the daily category price rollup horizon forward to PRICE_ROLLUP_DAYS_AHEAD days after today. '
+        'Run it daily, for example from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--to',
+            type=date.fromisoformat,
+            help='Move the horizon to this day instead.',
+        )
+
+    def handle(self, *args, to=None, **options):
+        rows = rollup.extend(to or rollup.default_horizon())
+        self.stdout.write(self.style.SUCCESS(f'The rollup runs through {rollup.horizon()}. Wrote {rows} daily rollup rows.'))
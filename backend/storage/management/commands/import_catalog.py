@@ -0,0 +1,59 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from storage.catalog import CatalogImport, CatalogImportError, detect_format
+from storage.enums import ExportFormat
+
+
+class Command(BaseCommand):
+    help = (
+        'Import categories, products and prices from a CSV or NDJSON file, optionally gzipped. '
+        'Products are matched by SKU and the file wins where its price intervals overlap existing ones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path, nargs='?', help='The catalog file to import.')
+        parser.add_argument(
+            '--format',
+            choices=ExportFormat.values(),
+            help='The format of the file. Defaults to the one of its extension.',
+        )
+        parser.add_argument(
+            '--resume',
+            metavar='JOB_ID',
+            help='Resume a failed import at the phase that failed, without reading the file again.',
+        )
+
+    def handle(self, *args, path=None, format=None, resume=None, **options):
+        try:
+            if resume is not None:
+                catalog_import = CatalogImport.resume(resume)
+            elif path is None:
+                raise CommandError('Pass the file to import, or --resume.')
+            elif not path.is_file():
+                raise CommandError(f'{path} is not a file.')
+            else:
+                catalog_import = CatalogImport.start(path.resolve(), format or detect_format(path))
+        except CatalogImportError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f'Importing as job {catalog_import.job.pk}')
+        try:
+            catalog_import.run(self._report)
+        except CatalogImportError as e:
+            raise CommandError(f'The import failed: {e}')
+        except Exception as e:
+            raise CommandError(
+                f'The import failed: {e}\nFix the cause and run the command with --resume {catalog_import.job.pk}.'
+            )
+
+        counts = dict(catalog_import.job.result)
+        for error in counts.pop('errors', []):
+            self.stdout.write(self.style.WARNING(error))
+        self.stdout.write(', '.join(f'{key.replace("_", " ")}: {value}' for key, value in counts.items()))
+        self.stdout.write(self.style.SUCCESS('The catalog was imported.'))
+
+    def _report(self, phase: str, rows: int, seconds: float):
+        rate = rows / seconds if seconds else 0
+        self.stdout.write(f'{phase}: {rows} rows in {seconds:.2f}s ({rate:,.0f} rows/s)')
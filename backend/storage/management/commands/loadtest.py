@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from storage.benchmarks import endpoints, load
+from storage.enums import AveragePricePeriod
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the throughput of slow average price requests served by one sync worker and by one ASGI process. '
+        'Runs against a throwaway copy of the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000, help='The number of products to seed.')
+        parser.add_argument('--requests', type=int, default=200, help='The number of requests per mode.')
+        parser.add_argument('--concurrency', type=int, default=20, help='The number of ASGI requests in flight at once.')
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0,
+            help='Milliseconds added to every query, to stand for a database on another host.',
+        )
+        parser.add_argument(
+            '--weighted',
+            action='store_true',
+            help='Send day-weighted averages instead of plain ones.',
+        )
+
+    def handle(self, *args, products: int, requests: int, concurrency: int, latency: float, weighted: bool, **options):
+        with load.throwaway_database():
+            catalog = endpoints.seed_catalog(products)
+            path = reverse('average-price', args=[catalog.category.pk])
+            query = {'start_date': '2023-01-01', 'end_date': '2023-12-31', 'period': AveragePricePeriod.WEEK.value, 'weighted': weighted}
+            results = load.run(path, query, requests, concurrency, latency / 1000)
+
+        for mode, result in results.items():
+            self.stdout.write(
+                f'loadtest products={products} {mode:<10} {result["rps"]:8.1f} req/s   '
+                f'p50 {result["p50_ms"]:9.2f} ms   p95 {result["p95_ms"]:9.2f} ms'
+            )
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from storage import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the monthly price history partitions ahead of time and archive or drop the ones '
+        'older than the retention period. Run it at least once a month.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=settings.PRICE_HISTORY_PARTITIONS_AHEAD,
+            help='Months of partitions to create after the current one.',
+        )
+        parser.add_argument(
+            '--retain',
+            type=int,
+            default=settings.PRICE_HISTORY_RETENTION_MONTHS,
+            help='Months of partitions to keep, counting the current one. 0 keeps them all.',
+        )
+        parser.add_argument(
+            '--archive',
+            type=Path,
+            help='Write expired partitions to gzipped CSV files in this directory before dropping them.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the partitions that would be created and removed.',
+        )
+
+    def handle(self, *args, ahead, retain, archive=None, dry_run=False, **options):
+        if ahead < 0 or retain < 0:
+            raise CommandError('--ahead and --retain cannot be negative.')
+        if archive is not None and not archive.is_dir():
+            raise CommandError(f'{archive} is not a directory.')
+
+        this_month = partitions.month_start(timezone.now().date())
+        last = partitions.add_months(this_month, ahead)
+        if dry_run:
+            existing = partitions.partitions()
+            month = this_month
+            while month <= last:
+                if month not in existing:
+                    self.stdout.write(f'Would create {partitions.partition_name(month)}')
+                month = partitions.add_months(month, 1)
+        else:
+            for name in partitions.ensure_partitions(this_month, last):
+                self.stdout.write(f'Created {name}')
+
+        if retain:
+            for name in partitions.expired_partitions(partitions.add_months(this_month, 1 - retain)).values():
+                if dry_run:
+                    self.stdout.write(f'Would remove {name}')
+                    continue
+                if archive is not None:
+                    self.stdout.write(f'Archived {name} to {partitions.archive_partition(name, archive)}')
+                partitions.drop_partition(name)
+                self.stdout.write(f'Dropped {name}')
+
+        self.stdout.write(self.style.SUCCESS('Price history partitions are up to date.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from storage import rollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily category price rollup from the price intervals.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--category',
+            type=int,
+            action='append',
+            dest='categories',
+            help='Only rebuild the rollup of this category id. Can be repeated.',
+        )
+
+    def handle(self, *args, categories=None, **options):
+        rows = rollup.rebuild(categories)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} daily rollup rows.'))
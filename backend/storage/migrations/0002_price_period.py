@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:35
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.core.validators
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0001_initial'),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.BtreeGistExtension(),
+        migrations.AddField(
+            model_name='productprice',
+            name='period',
+            field=models.GeneratedField(db_persist=True, expression=models.Func(models.F('start_date'), models.F('end_date'), models.Value('[]'), function='daterange', output_field=django.contrib.postgres.fields.ranges.DateRangeField()), output_field=django.contrib.postgres.fields.ranges.DateRangeField()),
+        ),
+        migrations.AlterField(
+            model_name='productprice',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))]),
+        ),
+        migrations.AddIndex(
+            model_name='productprice',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['product', 'period'], name='storage_pro_product_7a29e0_gist'),
+        ),
+    ]
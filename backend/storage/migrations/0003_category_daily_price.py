@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0002_price_period'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryDailyPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('price_sum', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('price_count', models.IntegerField()),
+                ('price_min', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('price_max', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_prices', to='storage.category')),
+            ],
+            options={
+                'verbose_name': 'Category Daily Price',
+                'verbose_name_plural': 'Category Daily Prices',
+                'unique_together': {('category', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0003_category_daily_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productprice',
+            name='category',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='storage.category'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE storage_productprice price
+                SET category_id = product.category_id
+                FROM storage_product product
+                WHERE product.id = price.product_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='productprice',
+            name='category',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='storage.category'),
+        ),
+        migrations.AddIndex(
+            model_name='productprice',
+            index=models.Index(fields=['category', 'start_date', 'end_date'], include=('price',), name='storage_price_category_idx'),
+        ),
+    ]
@@ -0,0 +1,107 @@
+from django.db import migrations, models
+
+# The primary key of a partitioned table has to include the partition key, so it becomes
+# (id, change_date). Ids still come from one sequence and stay unique. PostgreSQL 14 has no
+# identity columns on partitioned tables, hence the plain sequence.
+PARTITION = """
+    ALTER TABLE storage_productpricehistory RENAME TO storage_productpricehistory_unpartitioned;
+    ALTER TABLE storage_productpricehistory_unpartitioned
+        RENAME CONSTRAINT storage_productpricehistory_pkey TO storage_productpricehistory_unpartitioned_pkey;
+
+    CREATE TABLE storage_productpricehistory (
+        id bigint NOT NULL,
+        product_name varchar(100) NOT NULL,
+        product_sku varchar(100) NOT NULL,
+        start_date date NOT NULL,
+        end_date date NULL,
+        price numeric(10, 2) NOT NULL,
+        action varchar(10) NOT NULL,
+        change_date timestamp with time zone NOT NULL,
+        PRIMARY KEY (id, change_date)
+    ) PARTITION BY RANGE (change_date);
+    CREATE INDEX storage_history_sku_idx ON storage_productpricehistory (product_sku, change_date);
+
+    -- Catches rows of months that have no partition yet, see the maintain_price_history command.
+    CREATE TABLE storage_productpricehistory_default PARTITION OF storage_productpricehistory DEFAULT;
+
+    DO $$
+    DECLARE
+        month timestamp;
+    BEGIN
+        FOR month IN
+            SELECT generate_series(
+                date_trunc('month', COALESCE(MIN(change_date), now()) AT TIME ZONE 'UTC'),
+                date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months',
+                interval '1 month'
+            )
+            FROM storage_productpricehistory_unpartitioned
+        LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF storage_productpricehistory FOR VALUES FROM (%L) TO (%L)',
+                'storage_productpricehistory_' || to_char(month, '"y"YYYY"m"MM'),
+                month::text || '+00',
+                (month + interval '1 month')::text || '+00'
+            );
+        END LOOP;
+    END
+    $$;
+
+    INSERT INTO storage_productpricehistory (id, product_name, product_sku, start_date, end_date, price, action, change_date)
+    SELECT id, product_name, product_sku, start_date, end_date, price, action, change_date
+    FROM storage_productpricehistory_unpartitioned;
+
+    CREATE SEQUENCE storage_productpricehistory_id_seq_new OWNED BY storage_productpricehistory.id;
+    SELECT setval('storage_productpricehistory_id_seq_new', COALESCE(MAX(id), 0) + 1, false)
+    FROM storage_productpricehistory;
+    ALTER TABLE storage_productpricehistory
+        ALTER COLUMN id SET DEFAULT nextval('storage_productpricehistory_id_seq_new');
+
+    DROP TABLE storage_productpricehistory_unpartitioned;
+    ALTER SEQUENCE storage_productpricehistory_id_seq_new RENAME TO storage_productpricehistory_id_seq;
+"""
+
+UNPARTITION = """
+    ALTER TABLE storage_productpricehistory RENAME TO storage_productpricehistory_partitioned;
+    ALTER TABLE storage_productpricehistory_partitioned
+        RENAME CONSTRAINT storage_productpricehistory_pkey TO storage_productpricehistory_partitioned_pkey;
+
+    CREATE TABLE storage_productpricehistory (
+        id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        product_name varchar(100) NOT NULL,
+        product_sku varchar(100) NOT NULL,
+        start_date date NOT NULL,
+        end_date date NULL,
+        price numeric(10, 2) NOT NULL,
+        action varchar(10) NOT NULL,
+        change_date timestamp with time zone NOT NULL
+    );
+
+    INSERT INTO storage_productpricehistory (id, product_name, product_sku, start_date, end_date, price, action, change_date)
+    SELECT id, product_name, product_sku, start_date, end_date, price, action, change_date
+    FROM storage_productpricehistory_partitioned;
+    SELECT setval(pg_get_serial_sequence('storage_productpricehistory', 'id'), COALESCE(MAX(id), 0) + 1, false)
+    FROM storage_productpricehistory;
+
+    DROP TABLE storage_productpricehistory_partitioned;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0004_price_category'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(sql=PARTITION, reverse_sql=UNPARTITION),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='productpricehistory',
+                    index=models.Index(fields=['product_sku', 'change_date'], name='storage_history_sku_idx'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0005_partition_price_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productpricehistory',
+            name='previous_start_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='productpricehistory',
+            name='previous_end_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='productpricehistory',
+            name='previous_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RemoveIndex(
+            model_name='productpricehistory',
+            name='storage_history_sku_idx',
+        ),
+        migrations.AddIndex(
+            model_name='productpricehistory',
+            index=models.Index(fields=['product_sku', 'change_date', 'id'], name='storage_history_sku_idx'),
+        ),
+    ]
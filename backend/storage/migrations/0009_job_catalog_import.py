@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0008_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('category-price', 'Category Price'), ('bulk-prices', 'Bulk Prices'), ('category-delete', 'Category Delete'), ('catalog-import', 'Catalog Import')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def start_horizon(apps, schema_editor):
+    # An empty rollup is only complete when there are no prices yet, so only then does the horizon
+    # start here. Databases with prices keep no horizon, and averages are computed from the
+    # intervals, until `rebuild_price_rollup` fills the rollup and starts the horizon. Filling it
+    # here would hold the migration's transaction for as long as the rollup takes.
+    RollupHorizon = apps.get_model('storage', 'RollupHorizon')
+    ProductPrice = apps.get_model('storage', 'ProductPrice')
+    if not ProductPrice.objects.using(schema_editor.connection.alias).exists():
+        RollupHorizon.objects.using(schema_editor.connection.alias).create(
+            id=1, day=timezone.now().date() + timedelta(days=settings.PRICE_ROLLUP_DAYS_AHEAD),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0009_job_catalog_import'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupHorizon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+            ],
+            options={
+                'verbose_name': 'Rollup Horizon',
+                'verbose_name_plural': 'Rollup Horizon',
+            },
+        ),
+        migrations.RunPython(start_horizon, reverse_code=migrations.RunPython.noop),
+    ]
@@ -1,11 +1,24 @@
+import uuid
+from datetime import date
 from decimal import Decimal
 
+from django.conf import settings
+from django.contrib.postgres.fields import DateRangeField
+from django.contrib.postgres.indexes import GinIndex, GistIndex
+from django.contrib.postgres.search import SearchVector
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models
+from django.db.backends.postgresql.psycopg_any import DateRange
+from django.db.models import F, Func, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.sql import UpdateQuery
+from django.utils import timezone as tz
 
 from main.openapi import FieldValidationError
-from .enums import Action
+from . import history
+from .enums import Action, JobKind, JobStatus
+from .intervals import ONE_DAY, subtract
 
 
 class Category(models.Model):
@@ -16,6 +29,11 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def delete(self, *args, **kwargs):
+        # Collect the history of the cascade-deleted prices into one bulk insert.
+        with history.atomic():
+            return super().delete(*args, **kwargs)
+
 
 class Product(models.Model):
     name = models.CharField(max_length=100)
@@ -29,44 +47,269 @@ class Product(models.Model):
         unique_together = ('name', 'category')
         indexes = [
             models.Index(fields=['sku', 'category', 'name']),
+            # Typo-tolerant and full-text product search, see `storage.search`
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='storage_product_name_trgm'),
+            GinIndex(fields=['sku'], opclasses=['gin_trgm_ops'], name='storage_product_sku_trgm'),
+            GinIndex(SearchVector('description', config='english'), name='storage_product_fts_idx'),
         ]
 
     def __str__(self):
         return f'{self.name} | {self.category}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def delete(self, *args, **kwargs):
+        # Collect the history of the cascade-deleted prices into one bulk insert.
+        with history.atomic():
+            return super().delete(*args, **kwargs)
+
+
+class ProductPriceQuerySet(models.QuerySet):
+    """
+    A QuerySet that records price history for bulk updates and deletes.
+    """
+    # Locks the updated intervals with their values before the update, writes the update and
+    # its history, and returns the changes grouped by category, old and new values.
+    UPDATE_WITH_HISTORY = """
+        WITH old (id, product_id, category_id, start_date, end_date, price) AS (
+            {select}
+        ), updated AS (
+            {update}
+            RETURNING {price}.id, {price}.product_id, {price}.category_id, {price}.start_date, {price}.end_date, {price}.price
+        ), written AS (
+            INSERT INTO {history} (
+                product_name, product_sku, start_date, end_date, price, action, change_date,
+                previous_start_date, previous_end_date, previous_price
+            )
+            SELECT product.name, product.sku, updated.start_date, updated.end_date, updated.price, %s, %s,
+                old.start_date, old.end_date, old.price
+            FROM updated
+            JOIN old ON old.id = updated.id
+            JOIN {product} product ON product.id = updated.product_id
+        )
+        SELECT updated.category_id, old.start_date, old.end_date, old.price, updated.start_date, updated.end_date,
+            updated.price, COUNT(*), array_agg(DISTINCT updated.product_id)
+        FROM updated
+        JOIN old ON old.id = updated.id
+        GROUP BY 1, 2, 3, 4, 5, 6, 7
+    """
+
+
+    def bulk_create(self, objs, *args, **kwargs) -> list['ProductPrice']:
+        """
+        Fills in the denormalized category of every price from its product before inserting,
+        with one query for the products that are not loaded.
+        """
+        objs = list(objs)
+        missing = {
+            price.product_id for price in objs
+            if price.category_id is None and not ProductPrice.product.is_cached(price)
+        }
+        categories = dict(Product.objects.using(self.db).filter(pk__in=missing).values_list('pk', 'category_id')) if missing else {}
+        for price in objs:
+            if price.category_id is None:
+                price.category_id = price.product.category_id if price.product_id not in missing else categories[price.product_id]
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def update(self, **kwargs) -> int:
+        """
+        Updates the intervals and, when their dates or price are set, writes their history in
+        the same statement, with no row loaded into Python. Listeners of
+        `history.prices_changed` get one entry per distinct change, see `HistoryEntry.count`.
+        """
+        if not ProductPrice.HISTORY_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        if self.query.is_sliced:
+            raise TypeError('Cannot update a query once a slice has been taken.')
+
+        with history.atomic(using=self.db) as writer:
+            # Entries recorded earlier in the transaction keep their place in the history.
+            writer.flush()
+            select, select_params = self.select_for_update(of=('self',)).values_list(
+                'pk', 'product_id', 'category_id', 'start_date', 'end_date', 'price',
+            ).order_by().query.get_compiler(self.db).as_sql()
+            update_query = ProductPrice.objects.filter(pk__in=RawSQL('SELECT id FROM old', [])).query.chain(UpdateQuery)
+            update_query.add_update_values(kwargs)
+            update, update_params = update_query.get_compiler(self.db).as_sql()
+
+            quote = connections[self.db].ops.quote_name
+            statement = self.UPDATE_WITH_HISTORY.format(
+                select=select,
+                update=update,
+                price=quote(ProductPrice._meta.db_table),
+                product=quote(Product._meta.db_table),
+                history=quote(ProductPriceHistory._meta.db_table),
+            )
+            with connections[self.db].cursor() as cursor:
+                cursor.execute(statement, (*select_params, *update_params, Action.UPDATED.value, tz.now()))
+                changes = cursor.fetchall()
+
+            entries = []
+            product_ids = set()
+            for category_id, *old, start_date, end_date, price, count, changed_products in changes:
+                previous = dict(zip(('start_date', 'end_date', 'price'), old))
+                entries.append(history.HistoryEntry(
+                    None, start_date, end_date, price, Action.UPDATED, previous, category_id, count,
+                ))
+                product_ids.update(changed_products)
+            if entries:
+                history.prices_changed.send(sender=ProductPriceQuerySet, entries=entries, product_ids=product_ids)
+        return sum(entry.count for entry in entries)
+
+    def delete(self) -> tuple[int, dict[str, int]]:
+        with history.atomic(using=self.db):
+            return super().delete()
+
+    def overlapping(self, start_date: date, end_date: date | None) -> 'ProductPriceQuerySet':
+        """
+        Filters the intervals that overlap [start_date, end_date] through the GiST index on `period`.
+        A missing end date means the interval is open-ended.
+        """
+        return self.filter(period__overlap=DateRange(start_date, end_date, '[]'))
+
+    def in_category(self, category_id: int, start_date: date, end_date: date) -> 'ProductPriceQuerySet':
+        """
+        Filters the intervals of a category that overlap [start_date, end_date] through the
+        covering (category, start_date, end_date) index, with no join to the products.
+        """
+        return self.filter(
+            models.Q(end_date__isnull=True) | models.Q(end_date__gte=start_date),
+            category_id=category_id,
+            start_date__lte=end_date,
+        )
+
+    def make_room(self, start_date: date, end_date: date | None):
+        """
+        Trims, splits or deletes the intervals that overlap [start_date, end_date], so an interval
+        with these dates can be saved without overlapping any of them.
+
+        The overlapping intervals are found with one lookup on the GiST index, then each kind of
+        change is applied with one statement, and only when some interval needs it:
+
+        - intervals that fall inside the new one are deleted,
+        - intervals that start earlier are cut to end the day before `start_date`,
+        - intervals that end later are cut to start the day after `end_date`,
+        - an interval that spans the whole new one is cut on the left and its part after
+          `end_date` is inserted as a new row.
+        """
+        with history.atomic(using=self.db) as writer:
+            overlapping = self.overlapping(start_date, end_date).select_for_update(of=('self',))
+
+            covered, heads, tails, splits = [], [], [], []
+            for price in overlapping.only('product_id', 'category_id', 'start_date', 'end_date', 'price'):
+                pieces = subtract(price.start_date, price.end_date, start_date, end_date)
+                if not pieces:
+                    covered.append(price.pk)
+                    continue
+
+                if pieces[0][0] == price.start_date:
+                    heads.append(price.pk)
+                else:
+                    tails.append(price.pk)
+                splits.extend(
+                    ProductPrice(
+                        product_id=price.product_id,
+                        category_id=price.category_id,
+                        start_date=piece_start,
+                        end_date=piece_end,
+                        price=price.price,
+                    )
+                    for piece_start, piece_end in pieces[1:]
+                )
+
+            prices = ProductPrice.objects.using(self.db)
+            if covered:
+                prices.filter(pk__in=covered).delete()
+            if heads:
+                prices.filter(pk__in=heads).update(end_date=start_date - ONE_DAY, updated=tz.now())
+            if tails:
+                prices.filter(pk__in=tails).update(start_date=end_date + ONE_DAY, updated=tz.now())
+            for split in prices.bulk_create(splits):
+                writer.add(split, Action.CREATED)
+
 
 class ProductPrice(models.Model):
+    # Fields whose changes are recorded in the price history
+    HISTORY_FIELDS = {'start_date', 'end_date', 'price'}
+
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='prices')
+    # The product's category, so category-wide queries need no join. It is filled in on save and
+    # bulk create, and moved with the product by the `post_save` signal of `Product`.
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='prices', editable=False, db_index=False)
     start_date = models.DateField()
     end_date = models.DateField(null=True, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    # The closed [start_date, end_date] interval, unbounded when end_date is missing
+    period = models.GeneratedField(
+        expression=Func(F('start_date'), F('end_date'), Value('[]'), function='daterange', output_field=DateRangeField()),
+        output_field=DateRangeField(),
+        db_persist=True,
+    )
+
+    objects = ProductPriceQuerySet.as_manager()
 
     class Meta:
         unique_together = ('product', 'start_date', 'end_date')
+        indexes = [
+            GistIndex(fields=['product', 'period']),
+            # Covers category averages and repricing, so they can run as index-only scans
+            models.Index(fields=['category', 'start_date', 'end_date'], include=['price'], name='storage_price_category_idx'),
+        ]
 
     def __str__(self):
         return f'{self.product} ({self.price}) | {self.start_date} - {self.end_date}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_stored_values(self) -> dict:
+        """
+        Returns the history fields as they are stored in the database.
+
+        The stored values are the ones the instance was loaded or last saved with, so the
+        database is only queried for instances that were built by hand with an existing pk.
+        """
+        loaded = getattr(self, '_loaded_values', {})
+        if self.HISTORY_FIELDS <= loaded.keys():
+            return {field: loaded[field] for field in self.HISTORY_FIELDS}
+        return ProductPrice.objects.values(*self.HISTORY_FIELDS).get(pk=self.pk)
+
     def clean(self):
         if self.end_date and self.start_date > self.end_date:
             raise ValidationError({'end_date': FieldValidationError.END_DATE_AFTER_START_DATE.value[1]})
 
-        overlapping_prices = ProductPrice.objects.filter(
-            product=self.product,
-            start_date__lte=self.end_date,
-            end_date__gte=self.start_date
-        ).exclude(pk=self.pk)
-
-        overlapping_prices.delete()
+        ProductPrice.objects.filter(product=self.product).exclude(pk=self.pk).make_room(self.start_date, self.end_date)
 
     def save(self, *args, **kwargs):
-        self.clean()
-        super().save(*args, **kwargs)
+        if self.category_id is None:
+            self.category_id = self.product.category_id
+        with history.atomic():
+            self.clean()
+            super().save(*args, **kwargs)
+        self._loaded_values = {field: getattr(self, field) for field in self.HISTORY_FIELDS}
+
+    def delete(self, *args, **kwargs):
+        # The history is flushed after the row is gone, so its listeners see the new state.
+        with history.atomic():
+            return super().delete(*args, **kwargs)
 
 
 class ProductPriceHistory(models.Model):
+    """
+    An append-only log of price changes.
+
+    The table is partitioned by `change_date` month, see `storage.partitions`. Its primary
+    key in the database is (id, change_date), ids are still unique.
+    """
     # Use CharFields instead of foreign keys to retain data even if the related record is deleted
     product_name = models.CharField(max_length=100)
     product_sku = models.CharField(max_length=100)
@@ -75,6 +318,10 @@ class ProductPriceHistory(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     action = models.CharField(max_length=10, choices=Action.choices)
     change_date = models.DateTimeField(auto_now_add=True)
+    # The interval before an update, so as-of queries see intervals that stopped covering a day
+    previous_start_date = models.DateField(null=True, blank=True)
+    previous_end_date = models.DateField(null=True, blank=True)
+    previous_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
     def __str__(self):
         formatted_date = self.change_date.strftime('%Y-%m-%d %H:%M:%S')
@@ -83,3 +330,67 @@ class ProductPriceHistory(models.Model):
     class Meta:
         verbose_name = 'Product Price History'
         verbose_name_plural = 'Product Price History'
+        indexes = [
+            # Serves both the history of a SKU and as-of lookups with one range scan
+            models.Index(fields=['product_sku', 'change_date', 'id'], name='storage_history_sku_idx'),
+        ]
+
+
+class CategoryDailyPrice(models.Model):
+    """
+    Daily rollup of the prices in effect in a category, kept up to date by `storage.rollup`.
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_prices')
+    day = models.DateField()
+    price_sum = models.DecimalField(max_digits=18, decimal_places=2)
+    price_count = models.IntegerField()
+    price_min = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    price_max = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+
+    class Meta:
+        unique_together = ('category', 'day')
+        verbose_name = 'Category Daily Price'
+        verbose_name_plural = 'Category Daily Prices'
+
+    def __str__(self):
+        return f'{self.category_id} | {self.day}'
+
+
+class RollupHorizon(models.Model):
+    """
+    The last day the daily rollup covers, a single row moved forward by `rollup.extend`.
+    """
+    day = models.DateField()
+
+    class Meta:
+        verbose_name = 'Rollup Horizon'
+        verbose_name_plural = 'Rollup Horizon'
+
+    def __str__(self):
+        return str(self.day)
+
+
+class Job(models.Model):
+    """
+    A heavy operation run by a background worker, see `storage.jobs`.
+
+    Its `payload` holds the arguments of the operation, so the task message only carries the id.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=20, choices=JobKind.choices)
+    status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.QUEUED)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    payload = models.JSONField(default=dict)
+    # Progress in the unit of the job: products or payload rows
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    # Moved on every bit of progress, so a running job whose worker died can be told apart
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.kind} | {self.status}'
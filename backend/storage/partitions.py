@@ -0,0 +1,133 @@
+import gzip
+import re
+from datetime import date
+from pathlib import Path
+
+from django.db import connection, transaction
+
+from .models import ProductPriceHistory
+
+TABLE = ProductPriceHistory._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+_NAME = re.compile(rf'^{TABLE}_y(\d{{4}})m(\d{{2}})$')
+
+_PARTITIONS = """
+    SELECT child.relname
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = %s
+"""
+
+# Rows that landed in the default partition because their month had no partition yet are
+# moved into the new one, since a range cannot be attached while the default holds rows in it.
+_CREATE = """
+    CREATE TABLE {partition} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+    WITH moved AS (
+        DELETE FROM {default} WHERE change_date >= %(start)s AND change_date < %(end)s RETURNING *
+    )
+    INSERT INTO {partition} SELECT * FROM moved;
+    ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES FROM (%(start)s) TO (%(end)s);
+"""
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    """
+    Returns the first day of the month `months` after the month of `month`, or before when negative.
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'{TABLE}_y{month.year:04d}m{month.month:02d}'
+
+
+def partitions() -> dict[date, str]:
+    """
+    Returns the monthly partitions of the price history table, by the first day of their month.
+    The default partition is left out.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_PARTITIONS, [TABLE])
+        names = [name for name, in cursor.fetchall()]
+
+    months = {}
+    for name in names:
+        match = _NAME.match(name)
+        if match:
+            months[date(int(match[1]), int(match[2]), 1)] = name
+    return dict(sorted(months.items()))
+
+
+def create_partition(month: date) -> str:
+    """
+    Creates the partition of a month, with the indexes of the parent table.
+
+    Args:
+    - month (date): Any day of the month.
+
+    Returns:
+    - str: The name of the new partition.
+    """
+    month = month_start(month)
+    name = partition_name(month)
+    quote = connection.ops.quote_name
+    sql = _CREATE.format(table=quote(TABLE), default=quote(DEFAULT_PARTITION), partition=quote(name))
+    # Bounds are midnight UTC, whatever the session time zone.
+    bounds = {'start': f'{month.isoformat()} 00:00:00+00', 'end': f'{add_months(month, 1).isoformat()} 00:00:00+00'}
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, bounds)
+    return name
+
+
+def ensure_partitions(first: date, last: date) -> list[str]:
+    """
+    Creates the missing partitions from the month of `first` to the month of `last`.
+
+    Returns:
+    - list[str]: The names of the partitions that were created.
+    """
+    existing = partitions()
+    created = []
+    month = month_start(first)
+    while month <= last:
+        if month not in existing:
+            created.append(create_partition(month))
+        month = add_months(month, 1)
+    return created
+
+
+def expired_partitions(before: date) -> dict[date, str]:
+    """
+    Returns the partitions whose whole month is before the month of `before`.
+    """
+    return {month: name for month, name in partitions().items() if month < month_start(before)}
+
+
+def archive_partition(name: str, directory: Path) -> Path:
+    """
+    Writes the rows of a partition to a gzipped CSV file with a header, using COPY.
+
+    Returns:
+    - Path: The written file, named after the partition.
+    """
+    path = directory / f'{name}.csv.gz'
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as file, connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY {connection.ops.quote_name(name)} TO STDOUT WITH (FORMAT csv, HEADER)', file)
+    return path
+
+
+def drop_partition(name: str):
+    """
+    Detaches a partition from the price history table and drops it.
+    """
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(name)}')
+        cursor.execute(f'DROP TABLE {quote(name)}')
@@ -0,0 +1,233 @@
+import bisect
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from typing import Iterable
+
+from django.conf import settings
+
+from main.utils import watermark
+from .enums import Watermark
+from .models import Product, ProductPrice
+
+
+@dataclass(frozen=True)
+class _ProductPrices:
+    """
+    The price intervals of one product, sorted by start date. They never overlap.
+    """
+    product_id: int
+    sku: str
+    # The product and product prices watermarks the intervals are current for, None when
+    # they changed while being loaded
+    version: tuple[int, int] | None
+    # The `time.monotonic()` at which the intervals were loaded
+    loaded: float
+    starts: list[date]
+    ends: list[date | None]
+    prices: list[Decimal]
+
+    def find(self, day: date) -> int | None:
+        position = bisect.bisect_right(self.starts, day) - 1
+        if position >= 0 and (self.ends[position] is None or self.ends[position] >= day):
+            return position
+        return None
+
+
+class PriceIndex:
+    """
+    The price intervals of products, kept in the memory of the current process.
+
+    Products are loaded the first time they are looked up, with one query for the products
+    and one for their prices. Writes in this process drop the products they touch once they
+    commit. Writes in other processes are caught by comparing the watermarks of a product
+    with the ones it was loaded at, which takes one cache round trip per lookup and no query.
+    That needs a cache shared by the processes, so a product is also reloaded once it was
+    loaded `PRICE_INDEX_TIMEOUT` seconds ago. Expired products are dropped as often.
+
+    The index is shared by the threads of the process and by the commit callbacks that
+    invalidate it, so its dicts are only read and written under a lock. Queries and cache
+    round trips are made without it.
+    """
+
+    def __init__(self):
+        self._products: dict[int, _ProductPrices] = {}
+        self._skus: dict[str, int] = {}
+        self._pruned = time.monotonic()
+        self._lock = threading.Lock()
+
+    def invalidate(self, product_ids: Iterable[int]):
+        with self._lock:
+            for product_id in product_ids:
+                self._products.pop(product_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._products.clear()
+            self._skus.clear()
+
+    @staticmethod
+    def _keys(product_ids: Iterable[int]) -> list[tuple[str, int]]:
+        return [
+            (scope, product_id)
+            for product_id in product_ids
+            for scope in (Watermark.PRODUCT.value, Watermark.PRODUCT_PRICES.value)
+        ]
+
+    @staticmethod
+    def _versions(product_ids: Iterable[int], watermarks: dict[tuple[str, int], int]) -> dict[int, tuple[int, int]]:
+        versions = {}
+        for product_id in product_ids:
+            product = watermarks.get((Watermark.PRODUCT.value, product_id))
+            prices = watermarks.get((Watermark.PRODUCT_PRICES.value, product_id))
+            if product is not None and prices is not None:
+                versions[product_id] = (product, prices)
+        return versions
+
+    def _prune(self, now: float):
+        # Called with the lock held
+        if now - self._pruned < settings.PRICE_INDEX_TIMEOUT:
+            return
+        self._pruned = now
+        self._products = {
+            product_id: product
+            for product_id, product in self._products.items()
+            if now - product.loaded < settings.PRICE_INDEX_TIMEOUT
+        }
+        self._skus = {product.sku: product_id for product_id, product in self._products.items()}
+
+    def _load(self, product_ids: set[int]) -> dict[int, _ProductPrices]:
+        started = time.time_ns()
+        skus = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'sku'))
+        intervals = {product_id: ([], [], []) for product_id in skus}
+        rows = ProductPrice.objects.filter(product_id__in=skus).order_by('product_id', 'start_date')
+        for product_id, start_date, end_date, price in rows.values_list('product_id', 'start_date', 'end_date', 'price'):
+            starts, ends, prices = intervals[product_id]
+            starts.append(start_date)
+            ends.append(end_date)
+            prices.append(price)
+
+        # Watermarks are only started for products that exist, at the time the read began.
+        versions = self._versions(skus, watermark.start(self._keys(skus), started))
+        now = time.monotonic()
+        loaded = {
+            product_id: _ProductPrices(
+                product_id,
+                sku,
+                versions[product_id] if max(versions[product_id]) <= started else None,
+                now,
+                *intervals[product_id],
+            )
+            for product_id, sku in skus.items()
+        }
+        with self._lock:
+            self._prune(now)
+            for product_id in product_ids:
+                self._products.pop(product_id, None)
+            self._products.update(loaded)
+            self._skus.update((product.sku, product_id) for product_id, product in loaded.items())
+        return loaded
+
+    def _products_for(self, product_ids: set[int]) -> dict[int, _ProductPrices]:
+        now = time.monotonic()
+        with self._lock:
+            cached = {
+                product_id: product
+                for product_id in product_ids
+                if (product := self._products.get(product_id)) is not None
+                and product.version is not None
+                and now - product.loaded < settings.PRICE_INDEX_TIMEOUT
+            }
+        versions = self._versions(cached, watermark.get_many(self._keys(cached)))
+        products = {product_id: product for product_id, product in cached.items() if versions.get(product_id) == product.version}
+        stale = product_ids - products.keys()
+        if stale:
+            products.update(self._load(stale))
+        return products
+
+    @staticmethod
+    def _row(product: _ProductPrices, day: date) -> dict:
+        position = product.find(day)
+        if position is None:
+            return {'sku': product.sku, 'product_id': product.product_id, 'price': None, 'start_date': None, 'end_date': None}
+        return {
+            'sku': product.sku,
+            'product_id': product.product_id,
+            'price': product.prices[position],
+            'start_date': product.starts[position],
+            'end_date': product.ends[position],
+        }
+
+    def by_product_ids(self, product_ids: list[int], day: date) -> list[dict]:
+        """
+        Returns the price interval in effect on a day for every product id, in the given order.
+
+        Args:
+        - product_ids (list[int]): The products to look up.
+        - day (date): The day the prices apply to.
+
+        Returns:
+        - list[dict]: One row per product id with `sku`, `product_id`, `price`, `start_date` and
+          `end_date`. The interval fields are None when no price applies, and `sku` is None too
+          when there is no such product.
+        """
+        products = self._products_for(set(product_ids))
+        return [
+            self._row(products[product_id], day) if product_id in products else {**_MISSING, 'product_id': product_id}
+            for product_id in product_ids
+        ]
+
+    def by_skus(self, skus: list[str], day: date) -> list[dict]:
+        """
+        Returns the price interval in effect on a day for every SKU, in the given order.
+
+        Like `by_product_ids`, with `product_id` set to None for unknown SKUs. SKUs that are not
+        in the index yet are resolved with one more query.
+        """
+        products = self._products_for_skus(set(skus))
+        renamed = {sku for sku, product in products.items() if product.sku != sku}
+        if renamed:
+            # Another product may have taken the SKU since it was resolved.
+            with self._lock:
+                for sku in renamed:
+                    self._skus.pop(sku, None)
+            for sku in renamed:
+                del products[sku]
+            products.update(self._products_for_skus(renamed))
+
+        return [
+            self._row(products[sku], day) if sku in products and products[sku].sku == sku else {**_MISSING, 'sku': sku}
+            for sku in skus
+        ]
+
+    def _products_for_skus(self, skus: set[str]) -> dict[str, _ProductPrices]:
+        with self._lock:
+            product_ids = {sku: product_id for sku in skus if (product_id := self._skus.get(sku)) is not None}
+        unknown = skus - product_ids.keys()
+        if unknown:
+            resolved = dict(Product.objects.filter(sku__in=unknown).values_list('sku', 'pk'))
+            with self._lock:
+                self._skus.update(resolved)
+            product_ids.update(resolved)
+
+        products = self._products_for(set(product_ids.values()))
+        found = {}
+        deleted = []
+        for sku, product_id in product_ids.items():
+            if product_id in products:
+                found[sku] = products[product_id]
+            else:
+                deleted.append(sku)
+        if deleted:
+            # The products were deleted.
+            with self._lock:
+                for sku in deleted:
+                    self._skus.pop(sku, None)
+        return found
+
+
+_MISSING = {'sku': None, 'product_id': None, 'price': None, 'start_date': None, 'end_date': None}
+
+index = PriceIndex()
@@ -0,0 +1,166 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.utils import timezone as tz
+
+from main.openapi import FieldValidationError
+from . import history
+from .enums import Action, BulkRowStatus
+from .intervals import overlaps, subtract
+from .models import Category, Product, ProductPrice
+from .serializers.request import BulkProductPriceRequestSerializer
+
+
+def reprice_category(category: Category, price: Decimal, product_ids: list[int] | None = None) -> int:
+    """
+    Set a new price on every price interval of the products in a category.
+
+    The change and its history are written by a single statement that loads no row into
+    Python (see `ProductPriceQuerySet.update`), so the number of queries does not depend on
+    the size of the category.
+
+    Args:
+    - category (Category): The category whose prices are changed.
+    - price (Decimal): The new price.
+    - product_ids (list[int] | None): Only change the prices of these products of the category.
+
+    Returns:
+    - int: The number of price intervals that were changed.
+    """
+    prices = ProductPrice.objects.filter(category=category).exclude(price=price)
+    if product_ids is not None:
+        prices = prices.filter(product_id__in=product_ids)
+    return prices.update(price=price, updated=tz.now())
+
+
+def ingest_price_rows(data: list, offset: int = 0) -> tuple[dict[int, dict], int, int]:
+    """
+    Validates the rows of a bulk price payload and writes the valid ones with `ingest_prices`.
+
+    Args:
+    - data (list): Rows as parsed from the payload.
+    - offset (int): The position of the first row in the whole payload.
+
+    Returns:
+    - tuple[dict[int, dict], int, int]: Like `ingest_prices`, with the outcome of invalid rows as well.
+    """
+    rows = {}
+    results = {}
+    for index, row in enumerate(data, offset):
+        serializer = BulkProductPriceRequestSerializer(data=row)
+        if serializer.is_valid():
+            rows[index] = serializer.validated_data
+        else:
+            results[index] = {'status': BulkRowStatus.INVALID.value, 'errors': serializer.errors}
+
+    ingested, deleted, trimmed = ingest_prices(rows) if rows else ({}, 0, 0)
+    results.update(ingested)
+    return results, deleted, trimmed
+
+
+def bulk_report(results: dict[int, dict], deleted: int, trimmed: int) -> dict:
+    """
+    Returns the body of a bulk price response: the count of rows per status, the counts of
+    deleted and trimmed intervals and the outcome of every row in payload order.
+    """
+    rows = [{'row': index, **results[index]} for index in sorted(results)]
+    counts = {row_status: 0 for row_status in BulkRowStatus.values()}
+    for row in rows:
+        counts[row['status']] += 1
+    return {**counts, 'deleted': deleted, 'trimmed': trimmed, 'rows': rows}
+
+
+def ingest_prices(rows: dict[int, dict]) -> tuple[dict[int, dict], int, int]:
+    """
+    Write price intervals for many products in one transaction.
+
+    Rows are applied in payload order with the same outcome as saving them one by one:
+    a new interval trims, splits or replaces the intervals of the same product that it
+    overlaps (see `ProductPriceQuerySet.make_room`), whether they already exist or come
+    earlier in the payload. Overlaps are resolved in memory, so the database only sees one
+    bulk delete, one bulk update and one bulk insert, and the history of all of them is
+    written with one more bulk insert.
+
+    Args:
+    - rows (dict[int, dict]): Validated rows keyed by their position in the payload.
+      Each row holds `sku`, `start_date`, `end_date` and `price`.
+
+    Returns:
+    - tuple[dict[int, dict], int, int]: The outcome of every row keyed by its position, the
+      number of existing price intervals that were deleted and the number that were trimmed.
+    """
+    results = {}
+    skus = {row['sku'] for row in rows.values()}
+    products = {product.sku: product for product in Product.objects.filter(sku__in=skus).only('id', 'name', 'sku', 'category_id')}
+
+    with history.atomic() as writer:
+        # Every live interval of a product as [start_date, end_date, price, pk, index], where pk is set
+        # for existing rows and index for payload rows. Pieces split off existing rows have neither.
+        intervals = defaultdict(list)
+        existing = ProductPrice.objects.select_for_update().filter(product__in=products.values())
+        for pk, product_id, start_date, end_date, price in existing.values_list('pk', 'product_id', 'start_date', 'end_date', 'price'):
+            intervals[product_id].append([start_date, end_date, price, pk, None])
+
+        stale_ids = []
+        trimmed = {}
+        for index, row in rows.items():
+            product = products.get(row['sku'])
+            if product is None:
+                errors = {'sku': [FieldValidationError.PRODUCT_NOT_FOUND.value[1]]}
+                results[index] = {'status': BulkRowStatus.INVALID.value, 'errors': errors}
+                continue
+
+            kept = []
+            for interval in intervals[product.pk]:
+                start_date, end_date, price, pk, source = interval
+                if not overlaps(start_date, end_date, row['start_date'], row['end_date']):
+                    kept.append(interval)
+                    continue
+
+                pieces = subtract(start_date, end_date, row['start_date'], row['end_date'])
+                if not pieces:
+                    if pk is not None:
+                        stale_ids.append(pk)
+                        trimmed.pop(pk, None)
+                    elif source is not None:
+                        results[source] = {'status': BulkRowStatus.SUPERSEDED.value}
+                    continue
+
+                (head_start, head_end), *rest = pieces
+                kept.append([head_start, head_end, price, pk, source])
+                if pk is not None:
+                    trimmed[pk] = (head_start, head_end)
+                kept.extend([piece_start, piece_end, price, None, None] for piece_start, piece_end in rest)
+
+            kept.append([row['start_date'], row['end_date'], row['price'], None, index])
+            intervals[product.pk] = kept
+
+        if stale_ids:
+            ProductPrice.objects.filter(pk__in=stale_ids).delete()
+
+        if trimmed:
+            now = tz.now()
+            ProductPrice.objects.bulk_update(
+                [
+                    ProductPrice(pk=pk, start_date=start_date, end_date=end_date, updated=now)
+                    for pk, (start_date, end_date) in trimmed.items()
+                ],
+                ['start_date', 'end_date', 'updated'],
+            )
+
+        products_by_id = {product.pk: product for product in products.values()}
+        new = [
+            (index, ProductPrice(product=products_by_id[product_id], start_date=start_date, end_date=end_date, price=price))
+            for product_id, product_intervals in intervals.items()
+            for start_date, end_date, price, pk, index in product_intervals
+            if pk is None
+        ]
+        created = ProductPrice.objects.bulk_create(price for _, price in new)
+        for price in created:
+            writer.add(price, Action.CREATED)
+
+    for (index, _), price in zip(new, created):
+        if index is not None:
+            results[index] = {'status': BulkRowStatus.CREATED.value, 'id': price.pk}
+
+    return results, len(stale_ids), len(trimmed)
@@ -0,0 +1,172 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Subquery
+
+from main.openapi import FieldValidationError
+from main.utils import watermark
+from . import caching, rollup
+from .enums import BulkProductRowStatus, Watermark
+from .models import Category, Product, ProductPrice
+from .price_index import index as price_index
+from .serializers.request import BulkProductRequestSerializer
+
+UPSERT_FIELDS = ['name', 'category', 'description', 'updated']
+
+
+def _invalid(field: str, error: FieldValidationError) -> dict:
+    return {'status': BulkProductRowStatus.INVALID.value, 'errors': {field: [error.value[1]]}}
+
+
+def upsert_product_rows(data: list) -> dict[int, dict]:
+    """
+    Creates or updates many products by SKU.
+
+    Rows are validated first and their category names are resolved to ids with one query. When
+    the payload has several valid rows for a SKU, the last one wins and the others are superseded.
+    The remaining rows are written in batches of `PRODUCT_BULK_BATCH_SIZE`, see `upsert_products`.
+
+    Args:
+    - data (list): Rows as parsed from the payload.
+
+    Returns:
+    - dict[int, dict]: The outcome of every row keyed by its position in the payload.
+    """
+    rows = {}
+    results = {}
+    for index, row in enumerate(data):
+        serializer = BulkProductRequestSerializer(data=row)
+        if serializer.is_valid():
+            rows[index] = serializer.validated_data
+        else:
+            results[index] = {'status': BulkProductRowStatus.INVALID.value, 'errors': serializer.errors}
+
+    categories = dict(Category.objects.filter(name__in={row['category'] for row in rows.values()}).values_list('name', 'pk'))
+    last = {}
+    for index, row in rows.items():
+        if row['category'] not in categories:
+            results[index] = _invalid('category', FieldValidationError.CATEGORY_NOT_FOUND)
+            continue
+        if row['sku'] in last:
+            results[last[row['sku']]] = {'status': BulkProductRowStatus.SUPERSEDED.value}
+        last[row['sku']] = index
+
+    winners = sorted(last.values())
+    for start in range(0, len(winners), settings.PRODUCT_BULK_BATCH_SIZE):
+        batch = winners[start:start + settings.PRODUCT_BULK_BATCH_SIZE]
+        results.update(upsert_products({
+            index: {**rows[index], 'category_id': categories[rows[index]['category']]} for index in batch
+        }))
+    return results
+
+
+def upsert_products(rows: dict[int, dict]) -> dict[int, dict]:
+    """
+    Creates or updates products by SKU in one transaction, with one `INSERT ... ON CONFLICT (sku) DO UPDATE`.
+
+    A name can only be taken by one product of a category. A row loses the name to the product
+    that has it, unless that product is renamed or moved by the same batch, and to the earlier
+    rows of the batch. Rows that match their product are not written. A product moved to
+    another category takes its prices along, like a product saved through the API.
+
+    Existing products are written before new ones. Renames between existing products that
+    only work in a certain order, like two products swapping names, conflict in the database.
+    The whole batch is then rejected and can be sent again in two parts.
+
+    Args:
+    - rows (dict[int, dict]): Validated rows with distinct SKUs, keyed by their position in the
+      payload. Each row holds `sku`, `name`, `category_id` and optionally `description`.
+
+    Returns:
+    - dict[int, dict]: The outcome of every row keyed by its position.
+    """
+    results = {}
+    by_sku = {row['sku']: row for row in rows.values()}
+    try:
+        with transaction.atomic():
+            products, existing, moves = _plan_upserts(rows, by_sku, results)
+            if not products:
+                return results
+
+            # Updates go first, so the names they free are free for the new products.
+            Product.objects.bulk_create(
+                sorted(products.values(), key=lambda product: product.sku not in existing),
+                update_conflicts=True, unique_fields=['sku'], update_fields=UPSERT_FIELDS,
+            )
+            if moves:
+                category = Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('category_id'))
+                ProductPrice.objects.filter(product_id__in=moves).update(category_id=category)
+                rollup.move_products(moves)
+    except IntegrityError:
+        conflict = _invalid('non_field_errors', FieldValidationError.BATCH_CONFLICT)
+        results.update((index, conflict) for index in products)
+        return results
+
+    product_ids = [product.pk for product in products.values()]
+    watermark.touch(Watermark.PRODUCT.value, product_ids)
+    transaction.on_commit(lambda: price_index.invalidate(product_ids))
+    if moves:
+        caching.invalidate_categories({category_id for move in moves.values() for category_id in move})
+
+    for index, product in products.items():
+        row_status = BulkProductRowStatus.UPDATED if product.sku in existing else BulkProductRowStatus.CREATED
+        results[index] = {'status': row_status.value, 'id': product.pk}
+    return results
+
+
+def _plan_upserts(rows: dict[int, dict], by_sku: dict[str, dict], results: dict[int, dict]) -> tuple[dict, dict, dict]:
+    """
+    Decides what `upsert_products` writes, recording the rows it does not write in `results`.
+
+    The existing products are locked, so a concurrent write cannot move one of them between
+    this read and the upsert, and the rollup moves what the category really held.
+
+    Returns:
+    - tuple[dict, dict, dict]: The products to write keyed by row position, the existing
+      products keyed by SKU, and the `(old, new)` categories of the moved product ids.
+    """
+    existing = {
+        sku: (pk, name, category_id, description)
+        for sku, pk, name, category_id, description in Product.objects.filter(sku__in=by_sku)
+        .order_by('pk').select_for_update().values_list('sku', 'pk', 'name', 'category_id', 'description')
+    }
+    holders = Product.objects.filter(
+        category_id__in={row['category_id'] for row in rows.values()}, name__in={row['name'] for row in rows.values()},
+    )
+    claimed = {}
+    for category_id, name, sku in holders.values_list('category_id', 'name', 'sku'):
+        row = by_sku.get(sku)
+        if row is None or (row['category_id'], row['name']) == (category_id, name):
+            claimed[category_id, name] = sku
+
+    products = {}
+    for index, row in rows.items():
+        owner = claimed.setdefault((row['category_id'], row['name']), row['sku'])
+        if owner != row['sku']:
+            results[index] = _invalid('name', FieldValidationError.PRODUCT_NAME_TAKEN)
+            continue
+
+        current = existing.get(row['sku'])
+        description = row.get('description', current[3] if current else '')
+        if current is not None and current[1:] == (row['name'], row['category_id'], description):
+            results[index] = {'status': BulkProductRowStatus.UNCHANGED.value, 'id': current[0]}
+            continue
+        products[index] = Product(sku=row['sku'], name=row['name'], category_id=row['category_id'], description=description)
+
+    moves = {
+        existing[product.sku][0]: (existing[product.sku][2], product.category_id)
+        for product in products.values()
+        if product.sku in existing and existing[product.sku][2] != product.category_id
+    }
+    return products, existing, moves
+
+
+def bulk_product_report(results: dict[int, dict]) -> dict:
+    """
+    Returns the body of a bulk product response: the count of rows per status and the outcome
+    of every row in payload order.
+    """
+    rows = [{'row': index, **results[index]} for index in sorted(results)]
+    counts = {row_status: 0 for row_status in BulkProductRowStatus.values()}
+    for row in rows:
+        counts[row['status']] += 1
+    return {**counts, 'rows': rows}
@@ -0,0 +1,269 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Iterable
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .enums import Action
+from .history import HistoryEntry
+from .models import Category, CategoryDailyPrice, ProductPrice, RollupHorizon
+
+# A change is `(category_id, start_date, end_date, price, sign)`, where sign is the number of
+# such intervals that start counting towards the rollup, negative when they stop.
+Change = tuple[int, date, date | None, Decimal, int]
+
+_CHANGES = """
+    -- Extending the horizon waits for the writes that hold this lock, and the writes after it see the new horizon.
+    horizon AS (
+        SELECT day AS last_day FROM {horizon} WHERE id = 1 FOR SHARE
+    ),
+    changes AS (
+        -- Identical intervals, like the same price set on many products, are expanded into days once.
+        SELECT category_id, start_date, end_date, price, SUM(sign) AS sign
+        FROM unnest(%(category)s::bigint[], %(start)s::date[], %(end)s::date[], %(price)s::numeric[], %(sign)s::integer[])
+            AS change(category_id, start_date, end_date, price, sign)
+        GROUP BY category_id, start_date, end_date, price
+        HAVING SUM(sign) <> 0
+    ),
+    day_changes AS (
+        -- Changes that cancel each other out, like the unchanged part of a trimmed interval, are dropped.
+        SELECT change.category_id, day::date AS day, change.price, SUM(change.sign) AS sign
+        FROM changes change
+        JOIN {category} category ON category.id = change.category_id
+        CROSS JOIN horizon
+        CROSS JOIN LATERAL generate_series(change.start_date, LEAST(change.end_date, horizon.last_day), interval '1 day') AS day
+        GROUP BY change.category_id, day, change.price
+        HAVING SUM(change.sign) <> 0
+    )
+"""
+
+_APPLY = """
+    WITH {changes}
+    INSERT INTO {rollup} AS rollup (category_id, day, price_sum, price_count, price_min, price_max)
+    SELECT
+        category_id,
+        day,
+        SUM(sign * price),
+        SUM(sign),
+        MIN(price) FILTER (WHERE sign > 0),
+        MAX(price) FILTER (WHERE sign > 0)
+    FROM day_changes
+    GROUP BY category_id, day
+    ON CONFLICT (category_id, day) DO UPDATE SET
+        price_sum = rollup.price_sum + EXCLUDED.price_sum,
+        price_count = rollup.price_count + EXCLUDED.price_count,
+        price_min = LEAST(rollup.price_min, EXCLUDED.price_min),
+        price_max = GREATEST(rollup.price_max, EXCLUDED.price_max)
+"""
+
+# A removed price can only move the min or max of the days where it was the min or max.
+# Those days are recomputed from the prices that overlap them, each expanded into days once.
+_REFRESH_EXTREMES = """
+    WITH {changes},
+    removed AS (
+        SELECT category_id, day, MIN(price) AS price_min, MAX(price) AS price_max
+        FROM day_changes
+        WHERE sign < 0
+        GROUP BY category_id, day
+    ),
+    stale AS (
+        SELECT rollup.id, rollup.category_id, rollup.day
+        FROM {rollup} rollup
+        JOIN removed ON removed.category_id = rollup.category_id AND removed.day = rollup.day
+        WHERE rollup.price_count > 0 AND (removed.price_min <= rollup.price_min OR removed.price_max >= rollup.price_max)
+    ),
+    bounds AS (
+        SELECT category_id, MIN(day) AS first_day, MAX(day) AS last_day
+        FROM stale
+        GROUP BY category_id
+    ),
+    extremes AS (
+        SELECT bounds.category_id, day::date AS day, MIN(price.price) AS price_min, MAX(price.price) AS price_max
+        FROM bounds
+        JOIN {price} price ON price.category_id = bounds.category_id
+            AND price.start_date <= bounds.last_day
+            AND (price.end_date IS NULL OR price.end_date >= bounds.first_day)
+        CROSS JOIN LATERAL generate_series(
+            GREATEST(price.start_date, bounds.first_day), LEAST(price.end_date, bounds.last_day), interval '1 day'
+        ) AS day
+        GROUP BY bounds.category_id, day
+    )
+    UPDATE {rollup} rollup
+    SET price_min = extremes.price_min, price_max = extremes.price_max
+    FROM stale
+    JOIN extremes ON extremes.category_id = stale.category_id AND extremes.day = stale.day
+    WHERE rollup.id = stale.id
+"""
+
+_DELETE_EMPTY = """
+    DELETE FROM {rollup}
+    WHERE category_id = ANY(%(categories)s::bigint[]) AND price_count <= 0
+"""
+
+_LOCK_HORIZON = """
+    SELECT day FROM {horizon} WHERE id = 1 FOR UPDATE
+"""
+
+_SET_HORIZON = """
+    INSERT INTO {horizon} (id, day) VALUES (1, %(horizon)s)
+    ON CONFLICT (id) DO UPDATE SET day = EXCLUDED.day
+"""
+
+# Rolls up the days from `first_day`, or from the start of every price when it is null, through the horizon.
+_FILL = """
+    INSERT INTO {rollup} (category_id, day, price_sum, price_count, price_min, price_max)
+    SELECT price.category_id, day::date, SUM(price.price), COUNT(*), MIN(price.price), MAX(price.price)
+    FROM {price} price
+    CROSS JOIN LATERAL generate_series(
+        GREATEST(price.start_date, %(first_day)s), LEAST(price.end_date, %(horizon)s), interval '1 day'
+    ) AS day
+    WHERE (%(categories)s::bigint[] IS NULL OR price.category_id = ANY(%(categories)s::bigint[]))
+        AND (%(first_day)s::date IS NULL OR price.end_date IS NULL OR price.end_date >= %(first_day)s)
+    GROUP BY price.category_id, day
+"""
+
+
+def _sql(template: str) -> str:
+    tables = {
+        'rollup': CategoryDailyPrice._meta.db_table,
+        'category': Category._meta.db_table,
+        'price': ProductPrice._meta.db_table,
+        'horizon': RollupHorizon._meta.db_table,
+    }
+    return template.format(changes=_CHANGES.format(**tables).strip(), **tables)
+
+
+def apply_changes(changes: Iterable[Change]):
+    """
+    Adds and removes price intervals from the daily rollup.
+
+    Sums and counts are adjusted in place, one statement for all the days the intervals
+    cover. The min and max of a day are recomputed from the prices only when a removed
+    price was that day's min or max. Intervals count up to the rollup horizon, see `extend`.
+
+    Args:
+    - changes (Iterable[Change]): The intervals to add (positive sign) and remove (negative sign).
+    """
+    changes = list(changes)
+    if not changes:
+        return
+
+    category, start, end, price, sign = (list(column) for column in zip(*changes))
+    params = {
+        'category': category,
+        'start': start,
+        'end': end,
+        'price': price,
+        'sign': sign,
+        'categories': sorted(set(category)),
+    }
+    # Price writes call this from inside their own transaction, which needs no extra savepoint.
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        cursor.execute(_sql(_APPLY), params)
+        if -1 in sign:
+            cursor.execute(_sql(_REFRESH_EXTREMES), params)
+            cursor.execute(_sql(_DELETE_EMPTY), params)
+
+
+def changes_from_history(entries: Iterable[HistoryEntry]) -> Iterable[Change]:
+    """
+    Turns flushed history entries into rollup changes.
+    """
+    for entry in entries:
+        if entry.action == Action.UPDATED and entry.previous is not None:
+            previous = entry.previous
+            yield entry.category_id, previous['start_date'], previous['end_date'], previous['price'], -entry.count
+        sign = -1 if entry.action == Action.DELETED else 1
+        yield entry.category_id, entry.start_date, entry.end_date, entry.price, sign * entry.count
+
+
+def move_products(moves: dict[int, tuple[int, int]]):
+    """
+    Moves the prices of products from one category's rollup to another's, with one query for the prices.
+
+    Args:
+    - moves (dict[int, tuple[int, int]]): The old and new category id of every moved product, by product id.
+    """
+    prices = ProductPrice.objects.filter(product_id__in=moves).values_list('product_id', 'start_date', 'end_date', 'price')
+    apply_changes(
+        change
+        for product_id, start_date, end_date, price in prices
+        for change in (
+            (moves[product_id][0], start_date, end_date, price, -1),
+            (moves[product_id][1], start_date, end_date, price, 1),
+        )
+    )
+
+
+def default_horizon() -> date:
+    """
+    Returns the day `PRICE_ROLLUP_DAYS_AHEAD` days after today.
+    """
+    return timezone.now().date() + timedelta(days=settings.PRICE_ROLLUP_DAYS_AHEAD)
+
+
+def horizon() -> date | None:
+    """
+    Returns the last day the rollup covers, None before it was ever filled.
+    """
+    return RollupHorizon.objects.values_list('day', flat=True).first()
+
+
+async def ahorizon() -> date | None:
+    """
+    The async variant of `horizon`.
+    """
+    return await RollupHorizon.objects.values_list('day', flat=True).afirst()
+
+
+def rebuild(category_ids: list[int] | None = None) -> int:
+    """
+    Recomputes the daily rollup from the prices, for the given categories or for all of them.
+
+    The rollup runs through the current horizon, or through `default_horizon` when there is none yet.
+
+    Returns:
+    - int: The number of rollup rows written.
+    """
+    rollup = CategoryDailyPrice.objects.all()
+    if category_ids is not None:
+        rollup = rollup.filter(category_id__in=category_ids)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(_sql(_LOCK_HORIZON))
+        row = cursor.fetchone()
+        if row is None:
+            row = (default_horizon(),)
+            cursor.execute(_sql(_SET_HORIZON), {'horizon': row[0]})
+        rollup.delete()
+        cursor.execute(_sql(_FILL), {'categories': category_ids, 'first_day': None, 'horizon': row[0]})
+        return cursor.rowcount
+
+
+def extend(day: date) -> int:
+    """
+    Moves the rollup horizon forward to `day`, rolling up the days between the old and the new one.
+
+    Price writes roll their intervals up through the horizon, and averages over ranges that end
+    after it are computed from the intervals instead. The horizon never moves back.
+
+    Args:
+    - day (date): The new last day of the rollup.
+
+    Returns:
+    - int: The number of rollup rows written.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(_sql(_LOCK_HORIZON))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute(_sql(_SET_HORIZON), {'horizon': day})
+            return rebuild()
+        if day <= row[0]:
+            return 0
+        cursor.execute(_sql(_FILL), {'categories': None, 'first_day': row[0] + timedelta(days=1), 'horizon': day})
+        rows = cursor.rowcount
+        cursor.execute(_sql(_SET_HORIZON), {'horizon': day})
+        return rows
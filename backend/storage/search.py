@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity, TrigramWordSimilarity
+from django.db.models import QuerySet
+from django.db.models.functions import Greatest
+
+from .models import Product
+
+# Must match the expression of the `storage_product_fts_idx` index for the index to be used
+DESCRIPTION_VECTOR = SearchVector('description', config='english')
+
+
+def _candidates(query: str, description: SearchQuery, category_id: int | None, size: int) -> QuerySet:
+    """
+    Returns the ids of at most `size` products per way of matching a search, unordered.
+
+    Each part is read from its own index and stops after `size` rows, so its cost does not
+    grow with the number of matching products. SKUs that start with the query are read in
+    SKU order, so an exact SKU always makes it.
+    """
+    products = Product.objects.all()
+    if category_id is not None:
+        products = products.filter(category_id=category_id)
+
+    parts = [
+        products.filter(name__trigram_word_similar=query),
+        products.filter(sku__trigram_similar=query),
+        products.annotate(search=DESCRIPTION_VECTOR).filter(search=description),
+    ]
+    candidates = products.filter(sku__startswith=query).order_by('sku').values('pk')[:size]
+    return candidates.union(*(part.order_by().values('pk')[:size] for part in parts))
+
+
+def search_products(query: str, category_id: int | None = None, limit: int = 20) -> QuerySet:
+    """
+    Returns the products matching a search, best matches first.
+
+    A product matches when its name contains a word similar to the query, when its SKU is
+    similar to the query or starts with it, or when its description matches the query as a
+    web search. Similarity uses the `pg_trgm.similarity_threshold` and
+    `pg_trgm.word_similarity_threshold` settings of the database.
+
+    Only the first `PRODUCT_SEARCH_CANDIDATES` matches of each kind are ranked, which keeps
+    the cost flat when a query matches a large part of the catalog. Such queries match most
+    of their candidates equally well, while precise ones have few candidates.
+
+    Args:
+    - query (str): The text to search for.
+    - category_id (int | None): Only search the products of this category.
+    - limit (int): The maximum number of products to return.
+
+    Returns:
+    - QuerySet: `values()` rows with the product fields and a `rank` between 0 and 1.
+    """
+    description = SearchQuery(query, config='english', search_type='websearch')
+    candidates = _candidates(query, description, category_id, settings.PRODUCT_SEARCH_CANDIDATES)
+    rank = Greatest(
+        TrigramWordSimilarity(query, 'name'),
+        TrigramSimilarity('sku', query),
+        SearchRank(DESCRIPTION_VECTOR, description),
+    )
+    return (
+        Product.objects.filter(pk__in=candidates)
+        .annotate(rank=rank)
+        .order_by('-rank', 'pk')
+        .values('id', 'name', 'category', 'sku', 'description', 'rank')[:limit]
+    )
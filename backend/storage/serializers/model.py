@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from storage.models import Category, Product, ProductPrice
+from storage.models import Category, Job, Product, ProductPrice, ProductPriceHistory
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -20,3 +20,27 @@ class ProductPriceSerializer(serializers.ModelSerializer):
         model = ProductPrice
         fields = ['id', 'product', 'start_date', 'end_date', 'price']
         read_only_fields = ['id', 'product']
+
+
+class ProductPriceHistorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductPriceHistory
+        fields = [
+            'id',
+            'product_name',
+            'product_sku',
+            'action',
+            'start_date',
+            'end_date',
+            'price',
+            'previous_start_date',
+            'previous_end_date',
+            'previous_price',
+            'change_date',
+        ]
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'total', 'done', 'result', 'error', 'created', 'started', 'finished']
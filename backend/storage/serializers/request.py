@@ -1,15 +1,18 @@
 from decimal import Decimal
 
 from rest_framework import serializers
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
-from storage.enums import AveragePricePeriod
+from main.openapi import FieldValidationError
+from storage.enums import AveragePricePeriod, ExportFormat
 
 
 class AveragePriceRequestSerializer(serializers.Serializer):
     start_date = serializers.DateField(input_formats=['%Y-%m-%d'])
     end_date = serializers.DateField(input_formats=['%Y-%m-%d'])
     period = serializers.ChoiceField(choices=AveragePricePeriod.values(), default=AveragePricePeriod.WHOLE.value)
+    weighted = serializers.BooleanField(default=False)
 
     def validate(self, data: dict):
         if data['start_date'] > data['end_date']:
@@ -17,5 +20,63 @@ class AveragePriceRequestSerializer(serializers.Serializer):
         return data
 
 
+class BackgroundRequestSerializer(serializers.Serializer):
+    background = serializers.BooleanField(default=False)
+
+
 class CategoryPriceRequestSerializer(serializers.Serializer):
     price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+
+
+class BulkProductPriceRequestSerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=100)
+    start_date = serializers.DateField(input_formats=['%Y-%m-%d'])
+    end_date = serializers.DateField(input_formats=['%Y-%m-%d'], required=False, allow_null=True, default=None)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+
+    def validate(self, data: dict):
+        if data['end_date'] and data['start_date'] > data['end_date']:
+            raise ValidationError({'end_date': FieldValidationError.END_DATE_AFTER_START_DATE.value[1]})
+        return data
+
+
+class BulkProductRequestSerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=100)
+    name = serializers.CharField(max_length=100)
+    category = serializers.CharField(max_length=100, help_text='The name of the category.')
+    description = serializers.CharField(required=False, allow_blank=True, help_text='Kept as it is when not provided.')
+
+
+class ExportRequestSerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=ExportFormat.values(), default=ExportFormat.NDJSON.value)
+    category = serializers.IntegerField(required=False, default=None)
+    start_date = serializers.DateField(input_formats=['%Y-%m-%d'], required=False, default=None)
+    end_date = serializers.DateField(input_formats=['%Y-%m-%d'], required=False, default=None)
+
+    def validate(self, data: dict):
+        if data['start_date'] and data['end_date'] and data['start_date'] > data['end_date']:
+            raise ValidationError({'end_date': FieldValidationError.END_DATE_AFTER_START_DATE.value[1]})
+        return data
+
+
+class PriceAsOfRequestSerializer(serializers.Serializer):
+    sku = serializers.ListField(child=serializers.CharField(max_length=100), min_length=1, max_length=1000)
+    date = serializers.DateField(input_formats=['%Y-%m-%d'], default=timezone.localdate)
+    known_at = serializers.DateTimeField(required=False, default=None)
+
+
+class PriceLookupRequestSerializer(serializers.Serializer):
+    skus = serializers.ListField(child=serializers.CharField(max_length=100), required=False, max_length=1000)
+    product_ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=1000)
+    date = serializers.DateField(input_formats=['%Y-%m-%d'], default=timezone.localdate)
+
+    def validate(self, data: dict):
+        if ('skus' in data) == ('product_ids' in data):
+            raise ValidationError({'non_field_errors': ['Pass either skus or product_ids.']})
+        return data
+
+
+class ProductSearchRequestSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100)
+    category = serializers.IntegerField(required=False, default=None)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
@@ -1,5 +1,8 @@
 from rest_framework import serializers
 
+from storage.enums import BulkProductRowStatus, BulkRowStatus
+from storage.serializers.model import ProductSerializer
+
 
 class AveragePriceResponseSerializer(serializers.Serializer):
     average_price = serializers.FloatField(required=True, help_text='The average price for the category over the specified date range.')
@@ -13,3 +16,62 @@ class WeeklyAveragePriceResponseSerializer(serializers.Serializer):
 class MonthlyAveragePriceResponseSerializer(serializers.Serializer):
     month = serializers.IntegerField(required=True, help_text='The month number.')
     avg_price = serializers.FloatField(required=True, help_text='The average price for the month.')
+
+
+class CategoryPriceResponseSerializer(serializers.Serializer):
+    updated = serializers.IntegerField(required=True, help_text='The number of price intervals that were changed.')
+
+
+class BulkProductPriceRowResponseSerializer(serializers.Serializer):
+    row = serializers.IntegerField(required=True, help_text='The position of the row in the payload, starting at 0.')
+    status = serializers.ChoiceField(choices=BulkRowStatus.values(), required=True, help_text='The outcome of the row.')
+    id = serializers.IntegerField(required=False, allow_null=True, help_text='The id of the created price interval.')
+    errors = serializers.DictField(required=False, help_text='The validation errors of an invalid row.')
+
+
+class BulkProductPriceResponseSerializer(serializers.Serializer):
+    created = serializers.IntegerField(required=True, help_text='The number of price intervals that were created.')
+    superseded = serializers.IntegerField(required=True, help_text='The number of rows replaced by a later row of the same payload.')
+    invalid = serializers.IntegerField(required=True, help_text='The number of rows that were rejected.')
+    deleted = serializers.IntegerField(required=True, help_text='The number of existing price intervals that were replaced.')
+    trimmed = serializers.IntegerField(required=True, help_text='The number of existing price intervals that were shortened or split.')
+    rows = BulkProductPriceRowResponseSerializer(many=True, help_text='The outcome of every row, in payload order.')
+
+
+class BulkProductRowResponseSerializer(serializers.Serializer):
+    row = serializers.IntegerField(required=True, help_text='The position of the row in the payload, starting at 0.')
+    status = serializers.ChoiceField(choices=BulkProductRowStatus.values(), required=True, help_text='The outcome of the row.')
+    id = serializers.IntegerField(required=False, allow_null=True, help_text='The id of the created or updated product.')
+    errors = serializers.DictField(required=False, help_text='The validation errors of an invalid row.')
+
+
+class BulkProductResponseSerializer(serializers.Serializer):
+    created = serializers.IntegerField(required=True, help_text='The number of products that were created.')
+    updated = serializers.IntegerField(required=True, help_text='The number of existing products that were updated.')
+    unchanged = serializers.IntegerField(required=True, help_text='The number of existing products that already matched their row.')
+    superseded = serializers.IntegerField(required=True, help_text='The number of rows replaced by a later row for the same SKU.')
+    invalid = serializers.IntegerField(required=True, help_text='The number of rows that were rejected.')
+    rows = BulkProductRowResponseSerializer(many=True, help_text='The outcome of every row, in payload order.')
+
+
+class PriceAsOfResponseSerializer(serializers.Serializer):
+    sku = serializers.CharField(required=True, help_text='The requested SKU.')
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True, help_text='The price on the date, null when none applied.')
+    start_date = serializers.DateField(allow_null=True, help_text='The start date of the price interval.')
+    end_date = serializers.DateField(allow_null=True, help_text='The end date of the price interval, null when open-ended.')
+    change_date = serializers.DateTimeField(allow_null=True, help_text='When the price interval was recorded as it was known.')
+
+
+class PriceLookupResponseSerializer(serializers.Serializer):
+    sku = serializers.CharField(allow_null=True, help_text='The SKU of the product, null when there is no such product.')
+    product_id = serializers.IntegerField(allow_null=True, help_text='The id of the product, null when there is no such product.')
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True, help_text='The price on the date, null when none applies.')
+    start_date = serializers.DateField(allow_null=True, help_text='The start date of the price interval.')
+    end_date = serializers.DateField(allow_null=True, help_text='The end date of the price interval, null when open-ended.')
+
+
+class ProductSearchResponseSerializer(ProductSerializer):
+    rank = serializers.FloatField(read_only=True, help_text='How well the product matches the search, between 0 and 1.')
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['rank']
@@ -1,36 +1,82 @@
-from django.db.models.signals import pre_save, pre_delete
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save, pre_delete
 from django.dispatch import receiver
 
-from .models import ProductPrice, ProductPriceHistory
-from .enums import Action
+from main.utils import watermark
+from . import caching, history, rollup
+from .price_index import index as price_index
+from .models import Category, Product, ProductPrice
+from .enums import Action, Watermark
 
 
 @receiver(pre_save, sender=ProductPrice)
 def create_or_update_price_history(sender, instance: ProductPrice, **kwargs):
-    action = Action.CREATED if not instance.pk else Action.UPDATED
+    if not instance.pk:
+        history.record(instance, Action.CREATED)
+        return
 
-    if instance.pk:
-        previous = ProductPrice.objects.get(pk=instance.pk)
-        if not any((previous.start_date != instance.start_date, previous.end_date != instance.end_date, previous.price != instance.price)):
-            return
+    stored = instance.get_stored_values()
+    if all(stored[field] == getattr(instance, field) for field in ProductPrice.HISTORY_FIELDS):
+        return
 
-    ProductPriceHistory.objects.create(
-        product_name=instance.product.name,
-        product_sku=instance.product.sku,
-        start_date=instance.start_date,
-        end_date=instance.end_date,
-        price=instance.price,
-        action=action
-    )
+    history.record(instance, Action.UPDATED, previous=stored)
 
 
 @receiver(pre_delete, sender=ProductPrice)
 def delete_price_history(sender, instance: ProductPrice, **kwargs):
-    ProductPriceHistory.objects.create(
-        product_name=instance.product.name,
-        product_sku=instance.product.sku,
-        start_date=instance.start_date,
-        end_date=instance.end_date,
-        price=instance.price,
-        action=Action.DELETED
-    )
+    history.record(instance, Action.DELETED)
+
+
+@receiver(pre_delete, sender=Product)
+def remember_deleted_product(sender, instance: Product, **kwargs):
+    history.remember_product(instance)
+
+
+@receiver(history.prices_changed)
+def update_daily_rollup(sender, entries: list[history.HistoryEntry], **kwargs):
+    rollup.apply_changes(rollup.changes_from_history(entries))
+
+
+@receiver(history.prices_changed)
+def invalidate_cached_averages(sender, entries: list[history.HistoryEntry], **kwargs):
+    caching.invalidate_categories(entry.category_id for entry in entries)
+
+
+@receiver(post_save, sender=Product)
+def move_product_prices(sender, instance: Product, created: bool, **kwargs):
+    loaded_category_id = getattr(instance, '_loaded_values', {}).get('category_id')
+    if not created and loaded_category_id is not None and loaded_category_id != instance.category_id:
+        with transaction.atomic():
+            ProductPrice.objects.filter(product_id=instance.pk).update(category_id=instance.category_id)
+            rollup.move_products({instance.pk: (loaded_category_id, instance.category_id)})
+        caching.invalidate_categories([loaded_category_id, instance.category_id])
+    instance._loaded_values = {**getattr(instance, '_loaded_values', {}), 'category_id': instance.category_id}
+
+
+@receiver(history.prices_changed)
+def touch_product_prices(sender, product_ids: set[int], **kwargs):
+    watermark.touch(Watermark.PRODUCT_PRICES.value, product_ids)
+
+
+@receiver(history.prices_changed)
+def invalidate_price_index(sender, product_ids: set[int], **kwargs):
+    transaction.on_commit(lambda: price_index.invalidate(product_ids))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_indexed_product(sender, instance: Product, **kwargs):
+    product_ids = [instance.pk]
+    transaction.on_commit(lambda: price_index.invalidate(product_ids))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def touch_category(sender, instance: Category, **kwargs):
+    watermark.touch(Watermark.CATEGORY.value, [instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def touch_product(sender, instance: Product, **kwargs):
+    watermark.touch(Watermark.PRODUCT.value, [instance.pk])
@@ -0,0 +1,36 @@
+from celery import shared_task
+from django.contrib.auth.models import AbstractBaseUser
+from django.db import transaction
+
+from . import jobs
+from .models import Job
+
+
+@shared_task
+def run_job(job_id: str):
+    jobs.run(job_id)
+
+
+def workers_available() -> bool:
+    """
+    Whether enqueued jobs get run, by workers through a broker or eagerly by this process.
+    """
+    return run_job.app.conf.task_always_eager or run_job.app.conf.broker_url != 'memory://'
+
+
+def enqueue(kind: str, user: AbstractBaseUser | None, payload: dict, total: int = 0) -> Job:
+    """
+    Creates a job and sends it to the workers once the current transaction commits.
+
+    Args:
+    - kind (str): A `JobKind` value.
+    - user (AbstractBaseUser | None): The user the job belongs to.
+    - payload (dict): The arguments of the job, stored with it as JSON.
+    - total (int): The size of the job, when known up front.
+
+    Returns:
+    - Job: The queued job.
+    """
+    job = Job.objects.create(kind=kind, user=user, payload=payload, total=total)
+    transaction.on_commit(lambda: run_job.delay(str(job.pk)))
+    return job
@@ -1,13 +1,45 @@
-from datetime import date
+import asyncio
+import csv
+import gzip
+import json
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
+import msgpack
+import numpy as np
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
-from django.urls import reverse
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
-from .enums import AveragePricePeriod
-from .models import Category, Product, ProductPrice
+from main.celery import app as celery_app
+from main.openapi import FieldValidationError
+from main.utils import watermark
+from main.utils.admin import EstimatedCountPaginator
+from main.utils.renderers import ORJSONRenderer
+from main.utils.serializers import ValuesSerializer
+from main.utils.throttling import SlidingWindow
+from . import caching, history, jobs, partitions, rollup, tasks
+from .averages import interval_average, iso_weeks, rollup_average, weighted_average
+from .catalog import CatalogImport
+from .enums import Action, AveragePricePeriod, JobKind, JobStatus, Watermark
+from .models import Category, CategoryDailyPrice, Job, Product, ProductPrice, ProductPriceHistory, RollupHorizon
+from .price_index import PriceIndex, index as price_index
+from .serializers.model import CategorySerializer, ProductPriceSerializer, ProductSerializer
 
 
 class CategoryViewSetTests(TestCase):
@@ -28,7 +60,7 @@ class CategoryViewSetTests(TestCase):
     def test_list_categories(self):
         response = self.client.get(reverse('category-list'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), Category.objects.count())
+        self.assertEqual(len(response.data['results']), Category.objects.count())
 
     def test_retrieve_category(self):
         response = self.client.get(reverse('category-detail', args=[self.category.id]))
@@ -49,7 +81,21 @@ class ProductViewSetTests(TestCase):
     def test_list_products(self):
         response = self.client.get(reverse('product-list'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), Product.objects.count())
+        self.assertEqual(len(response.data['results']), Product.objects.count())
+
+    def test_list_products_by_keyset(self):
+        Product.objects.bulk_create(
+            Product(name=f"Product {index}", category=self.category, sku=f"P{index}") for index in range(4)
+        )
+        ids = []
+        url = reverse('product-list') + '?page_size=2'
+        while url:
+            # One keyset query per page and no COUNT(*)
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            ids.extend(product['id'] for product in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ids, list(Product.objects.order_by('id').values_list('id', flat=True)))
 
     def test_retrieve_product(self):
         response = self.client.get(reverse('product-detail', args=[self.product.id]))
@@ -112,11 +158,45 @@ class CategoryPriceViewTests(TestCase):
             data=self.valid_payload,
             format='json'
         )
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 2)
         # Check that all products in the category have the updated price
         for product_price in ProductPrice.objects.filter(product__category=self.category):
             self.assertEqual(product_price.price, 1200)
 
+    def test_update_category_price_writes_history(self):
+        self.client.put(reverse('category-price', args=[self.category.id]), data=self.valid_payload, format='json')
+        history = ProductPriceHistory.objects.filter(action=Action.UPDATED)
+        self.assertEqual(sorted(history.values_list('product_sku', flat=True)), ['LT2000', 'SP1000'])
+        self.assertTrue(all(entry.price == 1200 for entry in history))
+        self.assertEqual(sorted(history.values_list('previous_price', flat=True)), [Decimal('1000.00'), Decimal('1500.00')])
+
+    def test_update_category_price_moves_the_rollup(self):
+        product3 = Product.objects.create(name="Tablet", category=self.category, sku="TB3000")
+        ProductPrice.objects.create(product=product3, start_date=date(2023, 1, 1), end_date=date(2023, 12, 31), price=1000)
+        rollup.rebuild()
+        with mock.patch.object(watermark, 'touch') as touch:
+            self.client.put(reverse('category-price', args=[self.category.id]), data=self.valid_payload, format='json')
+        # The two prices of 1000 on the same interval are moved as one change of two intervals.
+        day = CategoryDailyPrice.objects.get(category=self.category, day=date(2023, 6, 1))
+        self.assertEqual((day.price_sum, day.price_count, day.price_min, day.price_max), (3600, 3, 1200, 1200))
+        touch.assert_any_call(Watermark.PRODUCT_PRICES.value, {self.product1.pk, self.product2.pk, product3.pk})
+
+    def test_update_category_price_skips_unchanged(self):
+        ProductPrice.objects.filter(product=self.product1).update(price=1200)
+        response = self.client.put(reverse('category-price', args=[self.category.id]), data=self.valid_payload, format='json')
+        self.assertEqual(response.data['updated'], 1)
+
+    def test_update_category_price_query_count_is_constant(self):
+        for year in range(2000, 2020):
+            ProductPrice.objects.create(product=self.product1, start_date=date(year, 1, 1), end_date=date(year, 12, 31), price=10)
+
+        # category, savepoint, one statement that locks, updates and writes the history,
+        # rollup upsert, rollup min/max refresh, empty rollup cleanup, release savepoint
+        with self.assertNumQueries(7):
+            response = self.client.put(reverse('category-price', args=[self.category.id]), data=self.valid_payload, format='json')
+        self.assertEqual(response.data['updated'], 22)
+
 
 class AveragePriceViewTests(TestCase):
     def setUp(self):
@@ -174,3 +254,1546 @@ class AveragePriceViewTests(TestCase):
             {'start_date': '2023-01-01', 'end_date': '2023-12-31'}
         )
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class BulkProductPriceViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name="Electronics")
+        self.product1 = Product.objects.create(name="Smartphone", category=self.category, sku="SP1000")
+        self.product2 = Product.objects.create(name="Laptop", category=self.category, sku="LT2000")
+        self.existing = ProductPrice.objects.create(product=self.product1, start_date=date(2023, 1, 1), end_date=date(2023, 6, 30), price=1000)
+
+    def test_bulk_create_prices(self):
+        payload = [
+            {'sku': 'SP1000', 'start_date': '2023-07-01', 'end_date': '2023-12-31', 'price': '1100.00'},
+            {'sku': 'LT2000', 'start_date': '2023-01-01', 'end_date': None, 'price': '1500.00'},
+        ]
+        response = self.client.post(reverse('product-price-bulk'), data=payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['deleted'], 0)
+        self.assertEqual(ProductPrice.objects.count(), 3)
+        self.assertEqual(ProductPriceHistory.objects.filter(action=Action.CREATED).count(), 3)
+
+    def test_bulk_resolves_overlaps(self):
+        payload = [
+            {'sku': 'SP1000', 'start_date': '2023-03-01', 'end_date': '2023-09-30', 'price': '1100.00'},
+            {'sku': 'LT2000', 'start_date': '2023-01-01', 'end_date': '2023-12-31', 'price': '1500.00'},
+            {'sku': 'LT2000', 'start_date': '2023-06-01', 'end_date': '2023-06-30', 'price': '1400.00'},
+            {'sku': 'LT2000', 'start_date': '2023-06-01', 'end_date': '2023-06-30', 'price': '1300.00'},
+        ]
+        response = self.client.post(reverse('product-price-bulk'), data=payload, format='json')
+        self.assertEqual((response.data['deleted'], response.data['trimmed']), (0, 1))
+        self.assertEqual([row['status'] for row in response.data['rows']], ['created', 'created', 'superseded', 'created'])
+        self.assertEqual(
+            list(ProductPrice.objects.order_by('product__sku', 'start_date').values_list('product__sku', 'start_date', 'end_date', 'price')),
+            [
+                ('LT2000', date(2023, 1, 1), date(2023, 5, 31), 1500),
+                ('LT2000', date(2023, 6, 1), date(2023, 6, 30), 1300),
+                ('LT2000', date(2023, 7, 1), date(2023, 12, 31), 1500),
+                ('SP1000', date(2023, 1, 1), date(2023, 2, 28), 1000),
+                ('SP1000', date(2023, 3, 1), date(2023, 9, 30), 1100),
+            ],
+        )
+
+    def test_bulk_replaces_covered_prices(self):
+        payload = [{'sku': 'SP1000', 'start_date': '2022-01-01', 'end_date': None, 'price': '900.00'}]
+        response = self.client.post(reverse('product-price-bulk'), data=payload, format='json')
+        self.assertEqual(response.data['deleted'], 1)
+        self.assertFalse(ProductPrice.objects.filter(pk=self.existing.pk).exists())
+
+    def test_bulk_reports_invalid_rows(self):
+        payload = [
+            {'sku': 'UNKNOWN', 'start_date': '2023-01-01', 'end_date': '2023-12-31', 'price': '10.00'},
+            {'sku': 'LT2000', 'start_date': '2023-12-31', 'end_date': '2023-01-01', 'price': '10.00'},
+            {'sku': 'LT2000', 'start_date': '2023-01-01', 'price': '0'},
+            {'sku': 'LT2000', 'start_date': '2024-01-01', 'end_date': '2024-12-31', 'price': '10.00'},
+        ]
+        response = self.client.post(reverse('product-price-bulk'), data=payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['invalid'], 3)
+        self.assertEqual(response.data['created'], 1)
+        self.assertIn('sku', response.data['rows'][0]['errors'])
+        self.assertIn('end_date', response.data['rows'][1]['errors'])
+        self.assertIn('price', response.data['rows'][2]['errors'])
+
+    def test_bulk_accepts_ndjson(self):
+        body = (
+            '{"sku": "SP1000", "start_date": "2024-01-01", "end_date": "2024-12-31", "price": "900.00"}\n'
+            '\n'
+            '{"sku": "LT2000", "start_date": "2024-01-01", "end_date": "2024-12-31", "price": "1400.00"}\n'
+        )
+        response = self.client.post(reverse('product-price-bulk'), data=body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+
+    def test_bulk_rejects_malformed_ndjson(self):
+        response = self.client.post(reverse('product-price-bulk'), data='{"sku": \n', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_rejects_non_list(self):
+        response = self.client.post(reverse('product-price-bulk'), data={'sku': 'SP1000'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkProductViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+        self.electronics = Category.objects.create(name="Electronics")
+        self.phones = Category.objects.create(name="Phones")
+        self.phone = Product.objects.create(name="Smartphone", category=self.electronics, sku="SP1000", description="A phone.")
+        self.laptop = Product.objects.create(name="Laptop", category=self.electronics, sku="LT2000")
+        self.price = ProductPrice.objects.create(product=self.phone, start_date=date(2023, 1, 1), end_date=date(2023, 1, 31), price=1000)
+
+    def upsert(self, payload: list) -> dict:
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('product-bulk'), data=payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_creates_and_updates_by_sku(self):
+        body = self.upsert([
+            {'sku': 'SP1000', 'name': 'Smartphone X', 'category': 'Electronics'},
+            {'sku': 'TB3000', 'name': 'Tablet', 'category': 'Electronics', 'description': 'A tablet.'},
+            {'sku': 'LT2000', 'name': 'Laptop', 'category': 'Electronics'},
+        ])
+        tablet = Product.objects.get(sku='TB3000')
+        self.assertEqual((body['created'], body['updated'], body['unchanged']), (1, 1, 1))
+        self.assertEqual(
+            [(row['row'], row['status'], row['id']) for row in body['rows']],
+            [(0, 'updated', self.phone.pk), (1, 'created', tablet.pk), (2, 'unchanged', self.laptop.pk)],
+        )
+        self.phone.refresh_from_db()
+        # A missing description keeps the current one.
+        self.assertEqual((self.phone.name, self.phone.description), ('Smartphone X', 'A phone.'))
+        self.assertEqual((tablet.category, tablet.description), (self.electronics, 'A tablet.'))
+
+    def test_queries_do_not_grow_with_rows(self):
+        rows = [{'sku': f'NEW{index}', 'name': f'New {index}', 'category': 'Phones'} for index in range(50)]
+        with CaptureQueriesContext(connection) as queries:
+            self.upsert(rows)
+        with CaptureQueriesContext(connection) as more_queries:
+            self.upsert(rows * 2 + [{'sku': f'NEW{index}', 'name': f'Renamed {index}', 'category': 'Phones'} for index in range(100)])
+        self.assertEqual(len(queries), len(more_queries))
+        self.assertEqual(Product.objects.filter(category=self.phones).count(), 100)
+
+    @override_settings(PRODUCT_BULK_BATCH_SIZE=2)
+    def test_batches(self):
+        body = self.upsert([{'sku': f'NEW{index}', 'name': f'New {index}', 'category': 'Phones'} for index in range(5)])
+        self.assertEqual(body['created'], 5)
+        self.assertEqual(sorted(row['id'] for row in body['rows']), sorted(Product.objects.filter(category=self.phones).values_list('pk', flat=True)))
+
+    def test_moved_product_takes_its_prices(self):
+        rollup.rebuild()
+        self.upsert([{'sku': 'SP1000', 'name': 'Smartphone', 'category': 'Phones'}])
+        self.price.refresh_from_db()
+        self.assertEqual(self.price.category, self.phones)
+        self.assertEqual(
+            list(CategoryDailyPrice.objects.filter(day=date(2023, 1, 15)).values_list('category', 'price_count')),
+            [(self.phones.pk, 1)],
+        )
+
+    def test_existing_products_are_read_locked(self):
+        # A concurrent move between the read and the upsert would move the rollup from the wrong category.
+        with CaptureQueriesContext(connection) as queries:
+            self.upsert([{'sku': 'SP1000', 'name': 'Smartphone', 'category': 'Phones'}])
+        locked = [query['sql'] for query in queries if query['sql'].endswith('FOR UPDATE')]
+        self.assertEqual(len(locked), 1)
+        self.assertIn('"sku" IN', locked[0])
+
+    def test_reports_invalid_rows(self):
+        body = self.upsert([
+            {'sku': 'SP1000', 'name': 'Old name', 'category': 'Electronics'},
+            {'sku': 'TB3000', 'category': 'Electronics'},
+            {'sku': 'TB3000', 'name': 'Tablet', 'category': 'Unknown'},
+            {'sku': 'TB3000', 'name': 'Laptop', 'category': 'Electronics'},
+            {'sku': 'SP1000', 'name': 'Smartphone', 'category': 'Electronics'},
+            {'sku': 'WT4000', 'name': 'Watch', 'category': 'Electronics'},
+            {'sku': 'WT5000', 'name': 'Watch', 'category': 'Electronics'},
+        ])
+        self.assertEqual([row['status'] for row in body['rows']], [
+            'superseded', 'invalid', 'invalid', 'invalid', 'unchanged', 'created', 'invalid',
+        ])
+        self.assertIn('name', body['rows'][1]['errors'])
+        self.assertEqual(body['rows'][2]['errors'], {'category': [FieldValidationError.CATEGORY_NOT_FOUND.value[1]]})
+        self.assertEqual(body['rows'][3]['errors'], {'name': [FieldValidationError.PRODUCT_NAME_TAKEN.value[1]]})
+        self.assertEqual(body['rows'][6]['errors'], {'name': [FieldValidationError.PRODUCT_NAME_TAKEN.value[1]]})
+
+    def test_name_freed_by_the_batch(self):
+        body = self.upsert([
+            {'sku': 'TB3000', 'name': 'Smartphone', 'category': 'Electronics'},
+            {'sku': 'SP1000', 'name': 'Smartphone', 'category': 'Phones'},
+        ])
+        self.assertEqual([row['status'] for row in body['rows']], ['created', 'updated'])
+
+    def test_conflicting_renames_reject_the_batch(self):
+        body = self.upsert([
+            {'sku': 'SP1000', 'name': 'Laptop', 'category': 'Electronics'},
+            {'sku': 'LT2000', 'name': 'Smartphone', 'category': 'Electronics'},
+        ])
+        self.assertEqual(body['invalid'], 2)
+        self.assertEqual(body['rows'][0]['errors'], {'non_field_errors': [FieldValidationError.BATCH_CONFLICT.value[1]]})
+        self.assertEqual(Product.objects.get(sku='SP1000').name, 'Smartphone')
+
+    def test_accepts_ndjson(self):
+        body = '{"sku": "TB3000", "name": "Tablet", "category": "Phones"}\n'
+        response = self.client.post(reverse('product-bulk'), data=body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+
+    def test_rejects_non_list(self):
+        response = self.client.post(reverse('product-bulk'), data={'sku': 'SP1000'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PriceHistoryTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Smartphone", category=self.category, sku="SP1000")
+        self.price = ProductPrice.objects.create(product=self.product, start_date=date(2023, 1, 1), end_date=date(2023, 12, 31), price=1000)
+
+    def test_update_does_not_refetch_price(self):
+        price = ProductPrice.objects.select_related('product').get(pk=self.price.pk)
+        price.price = 1100
+        # savepoint, overlap lookup, update, history insert,
+        # rollup upsert, rollup min/max refresh, empty rollup cleanup, release savepoint
+        with self.assertNumQueries(8):
+            price.save()
+        self.assertTrue(ProductPriceHistory.objects.filter(action=Action.UPDATED, price=1100).exists())
+
+    def test_unchanged_save_is_not_recorded(self):
+        price = ProductPrice.objects.get(pk=self.price.pk)
+        price.save()
+        self.assertFalse(ProductPriceHistory.objects.filter(action=Action.UPDATED).exists())
+
+    def test_queryset_update_is_recorded(self):
+        ProductPrice.objects.filter(product=self.product).update(price=1200)
+        entry = ProductPriceHistory.objects.get(action=Action.UPDATED)
+        self.assertEqual((entry.product_sku, entry.price), ('SP1000', 1200))
+
+    def test_queryset_delete_is_recorded_in_one_insert(self):
+        for year in range(2000, 2010):
+            ProductPrice.objects.create(product=self.product, start_date=date(year, 1, 1), end_date=date(year, 12, 31), price=10)
+
+        with self.assertNumQueries(9):
+            ProductPrice.objects.filter(product=self.product).delete()
+        self.assertEqual(ProductPriceHistory.objects.filter(action=Action.DELETED, product_sku='SP1000').count(), 11)
+
+    def test_cascade_delete_is_recorded(self):
+        self.category.delete()
+        entry = ProductPriceHistory.objects.get(action=Action.DELETED)
+        self.assertEqual((entry.product_name, entry.product_sku), ('Smartphone', 'SP1000'))
+
+    def test_rolled_back_block_discards_entries(self):
+        with history.atomic():
+            try:
+                with transaction.atomic(), history.atomic():
+                    ProductPrice.objects.filter(pk=self.price.pk).update(price=1300)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            ProductPrice.objects.filter(pk=self.price.pk).update(price=1400)
+
+        self.assertEqual(list(ProductPriceHistory.objects.filter(action=Action.UPDATED).values_list('price', flat=True)), [1400])
+
+    def test_entries_are_buffered_until_block_exits(self):
+        with transaction.atomic():
+            with history.atomic():
+                ProductPrice.objects.create(product=self.product, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), price=10)
+                self.assertEqual(ProductPriceHistory.objects.filter(start_date=date(2024, 1, 1)).count(), 0)
+            self.assertEqual(ProductPriceHistory.objects.filter(start_date=date(2024, 1, 1)).count(), 1)
+
+
+class PriceIntervalTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Smartphone", category=self.category, sku="SP1000")
+
+    def intervals(self):
+        return list(ProductPrice.objects.filter(product=self.product).order_by('start_date').values_list('start_date', 'end_date', 'price'))
+
+    def test_split_spanning_interval(self):
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 1, 1), end_date=date(2023, 12, 31), price=1000)
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 6, 1), end_date=date(2023, 6, 30), price=800)
+        self.assertEqual(self.intervals(), [
+            (date(2023, 1, 1), date(2023, 5, 31), 1000),
+            (date(2023, 6, 1), date(2023, 6, 30), 800),
+            (date(2023, 7, 1), date(2023, 12, 31), 1000),
+        ])
+        actions = sorted(ProductPriceHistory.objects.values_list('action', flat=True))
+        self.assertEqual(actions, [Action.CREATED, Action.CREATED, Action.CREATED, Action.UPDATED])
+
+    def test_trim_both_sides(self):
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 1, 1), end_date=date(2023, 3, 31), price=1000)
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 4, 1), end_date=None, price=1100)
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 3, 1), end_date=date(2023, 4, 30), price=900)
+        self.assertEqual(self.intervals(), [
+            (date(2023, 1, 1), date(2023, 2, 28), 1000),
+            (date(2023, 3, 1), date(2023, 4, 30), 900),
+            (date(2023, 5, 1), None, 1100),
+        ])
+
+    def test_open_ended_price_replaces_later_intervals(self):
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 1, 1), end_date=date(2023, 6, 30), price=1000)
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 7, 1), end_date=date(2023, 12, 31), price=1100)
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 5, 1), end_date=None, price=1200)
+        self.assertEqual(self.intervals(), [
+            (date(2023, 1, 1), date(2023, 4, 30), 1000),
+            (date(2023, 5, 1), None, 1200),
+        ])
+
+    def test_moving_an_interval_ignores_itself(self):
+        price = ProductPrice.objects.create(product=self.product, start_date=date(2023, 1, 1), end_date=date(2023, 6, 30), price=1000)
+        price.end_date = date(2023, 7, 31)
+        price.save()
+        self.assertEqual(self.intervals(), [(date(2023, 1, 1), date(2023, 7, 31), 1000)])
+
+    def test_no_overlap_takes_one_lookup(self):
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 1, 1), end_date=date(2023, 6, 30), price=1000)
+        # savepoint, overlap lookup, insert, history insert, rollup upsert, release savepoint
+        with self.assertNumQueries(6):
+            ProductPrice.objects.create(product=self.product, start_date=date(2024, 1, 1), end_date=None, price=1000)
+
+
+class DailyPriceRollupTests(TestCase):
+    def setUp(self):
+        RollupHorizon.objects.update(day=date(2024, 12, 31))
+        self.category = Category.objects.create(name="Electronics")
+        self.product1 = Product.objects.create(name="Smartphone", category=self.category, sku="SP1000")
+        self.product2 = Product.objects.create(name="Laptop", category=self.category, sku="LT2000")
+        ProductPrice.objects.create(product=self.product1, start_date=date(2023, 1, 1), end_date=date(2023, 12, 31), price=1000)
+        ProductPrice.objects.create(product=self.product2, start_date=date(2023, 6, 1), end_date=None, price=1500)
+
+    def snapshot(self):
+        return list(
+            CategoryDailyPrice.objects.order_by('category_id', 'day')
+            .values_list('category_id', 'day', 'price_sum', 'price_count', 'price_min', 'price_max')
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        rollup.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_created_prices_are_rolled_up(self):
+        day = CategoryDailyPrice.objects.get(category=self.category, day=date(2023, 6, 1))
+        self.assertEqual((day.price_sum, day.price_count, day.price_min, day.price_max), (2500, 2, 1000, 1500))
+        # Open-ended prices count up to the horizon
+        self.assertEqual(CategoryDailyPrice.objects.latest('day').day, date(2024, 12, 31))
+        self.assertMatchesRebuild()
+
+    def test_split_and_update_match_rebuild(self):
+        ProductPrice.objects.create(product=self.product1, start_date=date(2023, 3, 1), end_date=date(2023, 3, 31), price=500)
+        ProductPrice.objects.filter(product=self.product2).update(price=2000)
+        self.assertMatchesRebuild()
+
+    def test_deleting_the_max_refreshes_it(self):
+        ProductPrice.objects.filter(product=self.product2).delete()
+        day = CategoryDailyPrice.objects.get(category=self.category, day=date(2023, 6, 1))
+        self.assertEqual((day.price_count, day.price_min, day.price_max), (1, 1000, 1000))
+        self.assertFalse(CategoryDailyPrice.objects.filter(day__gt=date(2023, 12, 31)).exists())
+        self.assertMatchesRebuild()
+
+    def test_moving_a_product_moves_its_prices(self):
+        other = Category.objects.create(name="Computers")
+        product = Product.objects.get(pk=self.product2.pk)
+        product.category = other
+        product.save()
+        self.assertEqual(CategoryDailyPrice.objects.get(category=other, day=date(2023, 6, 1)).price_sum, 1500)
+        self.assertEqual(CategoryDailyPrice.objects.get(category=self.category, day=date(2023, 6, 1)).price_count, 1)
+        self.assertEqual(list(ProductPrice.objects.filter(product=product).values_list('category_id', flat=True)), [other.pk])
+        self.assertMatchesRebuild()
+
+    def test_prices_carry_their_product_category(self):
+        ProductPrice.objects.bulk_create([
+            ProductPrice(product_id=self.product1.pk, start_date=date(2025, 1, 1), end_date=None, price=100),
+            ProductPrice(product=self.product2, start_date=date(2025, 1, 1), end_date=None, price=200),
+        ])
+        # Splitting an interval copies its category to the new piece
+        ProductPrice.objects.create(product=self.product1, start_date=date(2023, 3, 1), end_date=date(2023, 3, 31), price=500)
+        self.assertEqual(set(ProductPrice.objects.values_list('category_id', flat=True)), {self.category.pk})
+        self.assertEqual(ProductPrice.objects.filter(category=self.category).count(), 6)
+
+    def test_rebuild_command(self):
+        CategoryDailyPrice.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_price_rollup', '--category', str(self.category.pk), stdout=out)
+        self.assertIn('731 daily rollup rows', out.getvalue())
+        self.assertEqual(CategoryDailyPrice.objects.count(), 731)
+
+    def test_extending_the_horizon_matches_rebuild(self):
+        out = StringIO()
+        call_command('extend_price_rollup', '--to', '2025-03-31', stdout=out)
+        self.assertIn('runs through 2025-03-31. Wrote 90 daily rollup rows', out.getvalue())
+        self.assertEqual(CategoryDailyPrice.objects.latest('day').day, date(2025, 3, 31))
+        # Writes after the move roll up through the new horizon
+        ProductPrice.objects.create(product=self.product1, start_date=date(2025, 2, 1), end_date=None, price=500)
+        self.assertEqual(CategoryDailyPrice.objects.get(category=self.category, day=date(2025, 3, 31)).price_count, 2)
+        self.assertMatchesRebuild()
+        # The horizon never moves back
+        self.assertEqual(rollup.extend(date(2024, 1, 1)), 0)
+        self.assertEqual(rollup.horizon(), date(2025, 3, 31))
+
+    def test_ranges_past_the_horizon_are_averaged_from_the_intervals(self):
+        for period in AveragePricePeriod.values():
+            with self.subTest(period=period):
+                self.assertEqual(
+                    weighted_average(self.category, date(2024, 6, 1), date(2026, 1, 31), period),
+                    interval_average(self.category, date(2024, 6, 1), date(2026, 1, 31), period),
+                )
+
+
+class TimeWeightedAverageTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name="Electronics")
+        self.product1 = Product.objects.create(name="Smartphone", category=self.category, sku="SP1000")
+        self.product2 = Product.objects.create(name="Laptop", category=self.category, sku="LT2000")
+        ProductPrice.objects.create(product=self.product1, start_date=date(2023, 1, 1), end_date=date(2023, 12, 31), price=1000)
+        # A one-day promo weighs one day, not as much as a year-long price
+        ProductPrice.objects.create(product=self.product1, start_date=date(2023, 3, 1), end_date=date(2023, 3, 1), price=100)
+        ProductPrice.objects.create(product=self.product2, start_date=date(2023, 2, 15), end_date=None, price=1500)
+
+    def test_whole_range_is_day_weighted(self):
+        response = self.client.get(
+            reverse('average-price', args=[self.category.id]),
+            {'start_date': '2023-01-01', 'end_date': '2023-12-31', 'weighted': 'true'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = (364 * 1000 + 100 + 320 * 1500) / (365 + 320)
+        self.assertAlmostEqual(response.data['average_price'], expected, places=2)
+
+    def test_rows_count_once_by_default(self):
+        response = self.client.get(
+            reverse('average-price', args=[self.category.id]),
+            {'start_date': '2023-01-01', 'end_date': '2023-12-31'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The promo splits the year-long price in two rows
+        self.assertAlmostEqual(response.data['average_price'], (1000 + 100 + 1000 + 1500) / 4, places=2)
+
+    def test_plain_periods_follow_the_start_date(self):
+        response = self.client.get(
+            reverse('average-price', args=[self.category.id]),
+            {'start_date': '2023-01-01', 'end_date': '2023-12-31', 'period': AveragePricePeriod.MONTH.value}
+        )
+        self.assertEqual([(row['month'], row['avg_price']) for row in response.data], [(1, 1000), (2, 1500), (3, 550)])
+
+    def test_periods_match_the_rollup(self):
+        for period in (AveragePricePeriod.WEEK.value, AveragePricePeriod.MONTH.value):
+            with self.subTest(period=period):
+                exact = interval_average(self.category, date(2022, 12, 1), date(2024, 2, 10), period)
+                rolled_up = rollup_average(self.category, date(2022, 12, 1), date(2024, 2, 10), period)
+                key = 'week' if period == AveragePricePeriod.WEEK.value else 'month'
+                self.assertEqual([row[key] for row in exact], [row[key] for row in rolled_up])
+                for row, expected in zip(exact, rolled_up):
+                    self.assertAlmostEqual(row['avg_price'], float(expected['avg_price']), places=6)
+
+    def test_no_prices(self):
+        response = self.client.get(
+            reverse('average-price', args=[self.category.id]),
+            {'start_date': '2020-01-01', 'end_date': '2020-12-31', 'weighted': 'true'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class IsoWeekTests(SimpleTestCase):
+    def test_matches_isocalendar(self):
+        days = [date(2019, 12, 1) + timedelta(days=offset) for offset in range(6 * 366)]
+        weeks = iso_weeks(np.array(days, dtype='datetime64[D]'))
+        self.assertEqual(weeks.tolist(), [day.isocalendar().week for day in days])
+
+
+class AveragePriceCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Smartphone", category=self.category, sku="SP1000")
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 1, 1), end_date=date(2023, 12, 31), price=1000)
+        self.url = reverse('average-price', args=[self.category.id])
+        self.params = {'start_date': '2023-01-01', 'end_date': '2023-12-31'}
+
+    def test_second_request_is_a_hit(self):
+        first = self.client.get(self.url, self.params)
+        with self.assertNumQueries(1):  # category
+            second = self.client.get(self.url, self.params)
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(caching.average_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_other_periods_are_cached_separately(self):
+        self.client.get(self.url, self.params)
+        response = self.client.get(self.url, {**self.params, 'period': AveragePricePeriod.MONTH.value})
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_price_write_invalidates_the_category(self):
+        other = Category.objects.create(name="Computers")
+        other_url = reverse('average-price', args=[other.id])
+        Product.objects.create(name="Laptop", category=other, sku="LT2000")
+        self.client.get(self.url, self.params)
+        self.client.get(other_url, self.params)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductPrice.objects.create(product=self.product, start_date=date(2023, 7, 1), end_date=None, price=2000)
+
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        # The new price cuts the old one short
+        self.assertAlmostEqual(response.data['average_price'], (1000 + 2000) / 2, places=2)
+        self.assertEqual(self.client.get(other_url, self.params)['X-Cache'], 'HIT')
+
+    def test_version_bump_waits_for_commit(self):
+        self.client.get(self.url, self.params)
+        with self.captureOnCommitCallbacks() as callbacks:
+            ProductPrice.objects.filter(product=self.product).update(price=1500)
+            self.assertEqual(self.client.get(self.url, self.params)['X-Cache'], 'HIT')
+        self.assertTrue(callbacks)
+
+
+class WatermarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name="Electronics")
+        self.product1 = Product.objects.create(name="Smartphone", category=self.category, sku="SP1000")
+        self.product2 = Product.objects.create(name="Laptop", category=self.category, sku="LT2000")
+        ProductPrice.objects.create(product=self.product1, start_date=date(2023, 1, 1), end_date=date(2023, 12, 31), price=1000)
+
+    def test_unchanged_list_is_not_modified_without_queries(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_write_moves_the_model_and_object_watermarks(self):
+        list_etag = self.client.get(reverse('product-list'))['ETag']
+        etag1 = self.client.get(reverse('product-detail', args=[self.product1.id]))['ETag']
+        etag2 = self.client.get(reverse('product-detail', args=[self.product2.id]))['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product1.name = "Phone"
+            self.product1.save()
+
+        response = self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('product-detail', args=[self.product1.id]), HTTP_IF_NONE_MATCH=etag1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('product-detail', args=[self.product2.id]), HTTP_IF_NONE_MATCH=etag2)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_unknown_objects_leave_no_watermark(self):
+        response = self.client.get(reverse('product-detail', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIsNone(cache.get(f'watermark:{Watermark.PRODUCT.value}:0'))
+
+    def test_etag_depends_on_the_format(self):
+        url = reverse('product-detail', args=[self.product1.id])
+        json_response = self.client.get(url)
+        msgpack_response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertNotEqual(json_response['ETag'], msgpack_response['ETag'])
+        self.assertIn('Accept', json_response['Vary'])
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=json_response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=msgpack_response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_product_prices_are_conditional(self):
+        url = reverse('product-price', args=[self.product1.id])
+        response = self.client.get(url)
+        self.assertEqual([price['price'] for price in response.data], ['1000.00'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductPrice.objects.create(product=self.product1, start_date=date(2024, 1, 1), end_date=None, price=1100)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, status.HTTP_200_OK)
+
+    def test_average_is_conditional_per_category(self):
+        params = {'start_date': '2023-01-01', 'end_date': '2023-12-31'}
+        url = reverse('average-price', args=[self.category.id])
+        # The first average starts the category watermark while it runs, so only later ones carry it.
+        self.client.get(url, params)
+        etag = self.client.get(url, params)['ETag']
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductPrice.objects.filter(product=self.product1).update(price=1200)
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertAlmostEqual(response.data['average_price'], 1200, places=2)
+
+
+class ExportViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name="Electronics")
+        other = Category.objects.create(name="Computers")
+        self.product1 = Product.objects.create(name="Smartphone", category=self.category, sku="SP1000")
+        self.product2 = Product.objects.create(name="Laptop", category=other, sku="LT2000")
+        ProductPrice.objects.create(product=self.product1, start_date=date(2023, 1, 1), end_date=date(2023, 6, 30), price=1000)
+        ProductPrice.objects.create(product=self.product1, start_date=date(2023, 7, 1), end_date=None, price=1100)
+        ProductPrice.objects.create(product=self.product2, start_date=date(2023, 1, 1), end_date=None, price=1500)
+
+    def lines(self, response) -> list[str]:
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_products_ndjson(self):
+        response = self.client.get(reverse('export-products'), {'category': self.category.id})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.lines(response)]
+        self.assertEqual(rows, [{
+            'id': self.product1.id,
+            'name': 'Smartphone',
+            'category': self.category.id,
+            'sku': 'SP1000',
+            'description': '',
+        }])
+
+    def test_prices_csv_in_date_range(self):
+        response = self.client.get(
+            reverse('export-prices'),
+            {'output': 'csv', 'category': self.category.id, 'start_date': '2023-08-01', 'end_date': '2023-08-31'},
+        )
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(self.lines(response)))
+        self.assertEqual(rows[0], ['id', 'product', 'sku', 'start_date', 'end_date', 'price'])
+        self.assertEqual([row[2:] for row in rows[1:]], [['SP1000', '2023-07-01', '', '1100.00']])
+
+    def test_history_of_category(self):
+        response = self.client.get(reverse('export-history'), {'category': self.category.id})
+        rows = [json.loads(line) for line in self.lines(response)]
+        self.assertEqual([(row['product_sku'], row['price'], row['action']) for row in rows], [
+            ('SP1000', '1000.00', Action.CREATED),
+            ('SP1000', '1100.00', Action.CREATED),
+        ])
+
+    async def test_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        with override_settings(EXPORT_CHUNK_SIZE=1):
+            response = await self.async_client.get(reverse('export-prices'), {'output': 'csv'})
+            self.assertTrue(response.is_async)
+            lines = b''.join([line async for line in response.streaming_content]).decode().splitlines()
+        self.assertEqual([row[2] for row in csv.reader(lines[1:])], ['SP1000', 'SP1000', 'LT2000'])
+
+    def test_invalid_range(self):
+        response = self.client.get(reverse('export-prices'), {'start_date': '2023-08-01', 'end_date': '2023-07-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ValuesSerializerTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Smartphone", category=self.category, sku="SP1000", description="A phone")
+        Product.objects.create(name="Laptop", category=self.category, sku="LT2000")
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 1, 1), end_date=None, price=1000)
+
+    def test_matches_model_serializers(self):
+        for serializer_class, queryset in (
+            (CategorySerializer, Category.objects.order_by('id')),
+            (ProductSerializer, Product.objects.order_by('id')),
+            (ProductPriceSerializer, ProductPrice.objects.order_by('id')),
+        ):
+            with self.subTest(serializer=serializer_class.__name__):
+                values_serializer = ValuesSerializer(serializer_class)
+                self.assertEqual(
+                    values_serializer.many(queryset.values(*values_serializer.lookups)),
+                    serializer_class(queryset, many=True).data,
+                )
+
+    def test_list_and_retrieve_match_model_serializer(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.data['results'], ProductSerializer(Product.objects.order_by('id'), many=True).data)
+        response = self.client.get(reverse('product-detail', args=[self.product.id]))
+        self.assertEqual(response.data, ProductSerializer(self.product).data)
+
+    def test_retrieve_missing(self):
+        response = self.client.get(reverse('product-detail', args=['missing']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CodecTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Smartphone", category=self.category, sku="SP1000")
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 1, 1), end_date=None, price=1000)
+
+    def test_orjson_matches_drf_json(self):
+        data = {
+            'price': Decimal('12.50'),
+            'day': date(2023, 1, 2),
+            'changed': datetime(2023, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc),
+            'rows': [{'id': 1, 'name': 'Ünïcode'}],
+            'weeks': np.array([1, 2]),
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_msgpack_response(self):
+        response = self.client.get(reverse('product-price', args=[self.product.id]), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        rows = msgpack.unpackb(response.content)
+        self.assertEqual([(row['start_date'], row['end_date'], row['price']) for row in rows], [('2023-01-01', None, '1000.00')])
+
+    def test_msgpack_bulk_request(self):
+        payload = [{'sku': 'SP1000', 'start_date': '2024-01-01', 'end_date': None, 'price': '900.00'}]
+        response = self.client.post(
+            reverse('product-price-bulk'),
+            data=msgpack.packb(payload),
+            content_type='application/msgpack',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+
+    def test_malformed_msgpack(self):
+        response = self.client.post(reverse('product-price-bulk'), data=b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_msgpack_map_with_unhashable_keys(self):
+        # A map keyed by an array, then one keyed by a map
+        for body in (msgpack.packb([{(1, 2): 'price'}]), b'\x91\x81\x81\xa1a\xa1b\xa1x'):
+            with self.subTest(body=body):
+                response = self.client.post(reverse('product-price-bulk'), data=body, content_type='application/msgpack')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with mock.patch.object(msgpack, 'unpackb', side_effect=TypeError("unhashable type: 'dict'")):
+            response = self.client.post(reverse('product-price-bulk'), data=b'\x90', content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class EndpointBenchmarkTests(TestCase):
+    def test_query_budgets_hold(self):
+        stdout = StringIO()
+        call_command('benchmark', 'endpoints', '--sizes', '20', '--repeat', '1', stdout=stdout)
+        self.assertIn('category-price', stdout.getvalue())
+        self.assertFalse(Product.objects.exists())
+
+    def test_over_budget_fails(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as budgets:
+            json.dump({'*': {'category-list': {'queries': 0}}}, budgets)
+            budgets.flush()
+            with self.assertRaisesMessage(CommandError, 'size=20 category-list: queries 1.0 > 0'):
+                call_command('benchmark', 'endpoints', '--sizes', '20', '--repeat', '1', '--budgets', budgets.name, stdout=StringIO())
+
+    def test_latency_over_budget_fails_unless_skipped(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as budgets:
+            json.dump({'20': {'category-list': {'p95_ms': 0, 'peak_kib': 0}}}, budgets)
+            budgets.flush()
+            args = ('benchmark', 'endpoints', '--sizes', '20', '--repeat', '1', '--budgets', budgets.name)
+            with self.assertRaisesMessage(CommandError, 'size=20 category-list: p95_ms'):
+                call_command(*args, stdout=StringIO())
+            call_command(*args, '--queries-only', stdout=StringIO())
+
+
+@override_settings(REQUEST_METRICS=True)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name="Electronics")
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('category-detail', args=[self.category.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^sql;dur=[\d.]+;desc="1 queries", serialization;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+
+    async def test_server_timing_of_async_views(self):
+        # Async views run their queries in another thread than the middleware.
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('category-detail', args=[self.category.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(response['Server-Timing'], r'^sql;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertNotRegex(response['Server-Timing'], r'^sql;dur=0\.0+;')
+
+    def test_metrics_staff_only(self):
+        self.client.get(reverse('category-list'))
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_sql_queries histogram', body)
+        self.assertIn('http_request_sql_queries_bucket{view="category-list",le="1"}', body)
+        self.assertIn('http_request_duration_seconds_count{view="category-list"}', body)
+
+    @override_settings(REQUEST_METRICS=False)
+    def test_disabled(self):
+        response = APIClient().get(reverse('category-list'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Smartphone", category=self.category, sku="SP1000")
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 1, 1), end_date=date(2023, 12, 31), price=1000)
+
+    def test_read_views_are_coroutines(self):
+        for url in (
+            reverse('category-list'),
+            reverse('product-detail', args=[self.product.id]),
+            reverse('average-price', args=[self.category.id]),
+        ):
+            with self.subTest(url=url):
+                self.assertTrue(iscoroutinefunction(resolve(url).func))
+
+    async def test_async_reads(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(
+            reverse('average-price', args=[self.category.id]),
+            {'start_date': '2023-01-01', 'end_date': '2023-12-31', 'period': AveragePricePeriod.MONTH.value, 'weighted': 'true'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['month'] for row in response.json()], list(range(1, 13)))
+
+        response = await self.async_client.get(reverse('product-list'))
+        self.assertEqual([row['sku'] for row in response.json()['results']], ['SP1000'])
+
+        response = await self.async_client.get(reverse('category-detail', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_watermarks_are_read_off_the_event_loop(self):
+        await self.async_client.aforce_login(self.user)
+
+        def get_many(keys):
+            with self.assertRaises(RuntimeError):
+                asyncio.get_running_loop()
+            return {key: 1 for key in keys}
+
+        with mock.patch('main.utils.watermark.get_many', side_effect=get_many) as watermark_get_many:
+            response = await self.async_client.get(reverse('product-detail', args=[self.product.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        watermark_get_many.assert_called_once()
+
+    async def test_async_reads_require_authentication(self):
+        response = await self.async_client.get(reverse('product-detail', args=[self.product.id]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(THROTTLE_RATES={'read': '2/min', 'write': '60/min', 'bulk': '1/min'})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+    def test_scopes_are_limited_separately(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get(reverse('category-list')).status_code, status.HTTP_200_OK)
+
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        response = self.client.post(reverse('category-list'), {'name': 'Books'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(reverse('product-price-bulk'), [], format='json')
+        self.assertNotEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.client.post(reverse('product-price-bulk'), [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_previous_window_fades_out(self):
+        window = SlidingWindow()
+        with mock.patch('main.utils.throttling.time.time', return_value=60.0):
+            self.assertEqual([window.hit('client', 4, 60)[0] for _ in range(5)], [True] * 4 + [False])
+
+        # Ten seconds into the next window, five sixths of the previous count still apply.
+        with mock.patch('main.utils.throttling.time.time', return_value=130.0):
+            allowed, wait = window.hit('client', 4, 60)
+            self.assertTrue(allowed)
+            allowed, wait = window.hit('client', 4, 60)
+            self.assertFalse(allowed)
+            self.assertAlmostEqual(wait, 5.0)
+
+
+class PriceHistoryPartitionTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Smartphone", category=category, sku="SP1000")
+
+    def record(self, change_date: datetime) -> ProductPriceHistory:
+        entry = ProductPriceHistory.objects.create(
+            product_name='Smartphone', product_sku='SP1000', start_date=date(2023, 1, 1), price=1000, action=Action.CREATED,
+        )
+        ProductPriceHistory.objects.filter(pk=entry.pk).update(change_date=change_date)
+        return entry
+
+    def partition_of(self, pk: int) -> str:
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text FROM {partitions.TABLE} WHERE id = %s', [pk])
+            return cursor.fetchone()[0]
+
+    def test_add_months(self):
+        self.assertEqual(partitions.add_months(date(2024, 11, 1), 3), date(2025, 2, 1))
+        self.assertEqual(partitions.add_months(date(2024, 1, 1), -1), date(2023, 12, 1))
+
+    def test_current_months_are_partitioned(self):
+        this_month = partitions.month_start(timezone.now().date())
+        months = partitions.partitions()
+        for offset in range(4):
+            self.assertIn(partitions.add_months(this_month, offset), months)
+
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 1, 1), price=1000)
+        entry = ProductPriceHistory.objects.get(product_sku='SP1000')
+        self.assertEqual(self.partition_of(entry.pk), partitions.partition_name(this_month))
+
+    def test_rows_move_from_the_default_partition(self):
+        entry = self.record(datetime(2040, 5, 10, tzinfo=dt_timezone.utc))
+
+        partitions.ensure_partitions(date(2040, 4, 1), date(2040, 6, 1))
+
+        self.assertEqual(list(partitions.partitions())[-3:], [date(2040, 4, 1), date(2040, 5, 1), date(2040, 6, 1)])
+        self.assertEqual(self.partition_of(entry.pk), 'storage_productpricehistory_y2040m05')
+
+    def test_command_archives_and_drops_expired_partitions(self):
+        old = self.record(datetime(2001, 3, 10, tzinfo=dt_timezone.utc))
+        partitions.create_partition(date(2001, 3, 1))
+        kept = self.record(timezone.now())
+
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('maintain_price_history', retain=12, archive=Path(directory), stdout=StringIO())
+
+            with gzip.open(Path(directory) / 'storage_productpricehistory_y2001m03.csv.gz', 'rt') as file:
+                rows = list(csv.DictReader(file))
+        self.assertEqual([int(row['id']) for row in rows], [old.pk])
+        self.assertNotIn(date(2001, 3, 1), partitions.partitions())
+        self.assertEqual(list(ProductPriceHistory.objects.values_list('pk', flat=True)), [kept.pk])
+
+
+class PriceHistoryApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+        category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Smartphone", category=category, sku="SP1000")
+        Product.objects.create(name="Tablet", category=category, sku="TB1000")
+
+        self.known = []
+        price = ProductPrice.objects.create(product=self.product, start_date=date(2023, 1, 1), end_date=date(2023, 12, 31), price=1000)
+        self.known.append(timezone.now())
+        price.end_date = date(2023, 5, 31)
+        price.save()
+        self.known.append(timezone.now())
+        june = ProductPrice.objects.create(product=self.product, start_date=date(2023, 6, 1), end_date=date(2023, 6, 30), price=1500)
+        self.known.append(timezone.now())
+        june.delete()
+        self.known.append(timezone.now())
+
+    def price_as_of(self, day: date, known_at: datetime):
+        return history.prices_as_of(['SP1000'], day, known_at)[0]['price']
+
+    def test_prices_as_they_were_known(self):
+        self.assertEqual([self.price_as_of(date(2023, 6, 15), known_at) for known_at in self.known], [1000, None, 1500, None])
+        # The interval stopped covering July when it was shortened.
+        self.assertEqual([self.price_as_of(date(2023, 7, 15), known_at) for known_at in self.known], [1000, None, None, None])
+        self.assertEqual([self.price_as_of(date(2023, 3, 1), known_at) for known_at in self.known], [1000] * 4)
+
+    def test_as_of_many_skus(self):
+        response = self.client.get(reverse('price-as-of'), {
+            'sku': ['UNKNOWN', 'SP1000', 'TB1000'],
+            'date': '2023-06-15',
+            'known_at': self.known[2].isoformat(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(row['sku'], row['price']) for row in response.json()], [('UNKNOWN', None), ('SP1000', '1500.00'), ('TB1000', None)])
+        self.assertEqual(response.json()[1]['end_date'], '2023-06-30')
+
+    def test_as_of_requires_a_sku(self):
+        response = self.client.get(reverse('price-as-of'), {'date': '2023-06-15'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_history_is_paginated_newest_first(self):
+        response = self.client.get(reverse('price-history', args=['SP1000']), {'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['action'] for row in response.json()['results']], [Action.DELETED, Action.CREATED, Action.UPDATED])
+        self.assertEqual(response.json()['results'][2]['previous_end_date'], '2023-12-31')
+
+        response = self.client.get(response.json()['next'])
+        self.assertEqual([row['action'] for row in response.json()['results']], [Action.CREATED])
+        self.assertIsNone(response.json()['next'])
+
+
+class PriceLookupTests(TestCase):
+    def setUp(self):
+        price_index.clear()
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+        category = Category.objects.create(name="Electronics")
+        self.phone = Product.objects.create(name="Smartphone", category=category, sku="SP1000")
+        self.tablet = Product.objects.create(name="Tablet", category=category, sku="TB1000")
+        self.price = ProductPrice.objects.create(product=self.phone, start_date=date(2023, 1, 1), end_date=date(2023, 6, 30), price=1000)
+        ProductPrice.objects.create(product=self.phone, start_date=date(2023, 7, 1), price=1100)
+        ProductPrice.objects.create(product=self.tablet, start_date=date(2023, 3, 1), end_date=date(2023, 3, 31), price=500)
+
+    def prices(self, rows: list[dict]) -> list:
+        return [row['price'] for row in rows]
+
+    def test_lookup_by_sku(self):
+        response = self.client.post(reverse('price-lookup'), {'skus': ['TB1000', 'UNKNOWN', 'SP1000'], 'date': '2023-08-01'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row['sku'], row['product_id'], row['price']) for row in response.json()],
+            [('TB1000', self.tablet.pk, None), ('UNKNOWN', None, None), ('SP1000', self.phone.pk, '1100.00')],
+        )
+
+    def test_lookup_by_product_id(self):
+        response = self.client.post(reverse('price-lookup'), {'product_ids': [self.phone.pk, self.tablet.pk], 'date': '2023-03-15'}, format='json')
+        self.assertEqual([(row['sku'], row['price'], row['end_date']) for row in response.json()], [
+            ('SP1000', '1000.00', '2023-06-30'),
+            ('TB1000', '500.00', '2023-03-31'),
+        ])
+
+    def test_lookup_takes_skus_or_product_ids(self):
+        response = self.client.post(reverse('price-lookup'), {'skus': ['SP1000'], 'product_ids': [self.phone.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_warm_lookup_runs_no_query(self):
+        price_index.by_skus(['SP1000', 'TB1000'], date(2023, 3, 15))
+        with self.assertNumQueries(0):
+            rows = price_index.by_skus(['SP1000', 'TB1000'], date(2023, 7, 15))
+        self.assertEqual(self.prices(rows), [1100, None])
+
+    def test_writes_invalidate_the_product(self):
+        other_process = PriceIndex()
+        for index in (price_index, other_process):
+            self.assertEqual(self.prices(index.by_skus(['SP1000'], date(2023, 3, 15))), [1000])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.price.price = 900
+            self.price.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tablet.sku = 'TB2000'
+            self.tablet.save()
+
+        for index in (price_index, other_process):
+            with self.subTest(index=index):
+                self.assertEqual(self.prices(index.by_skus(['SP1000'], date(2023, 3, 15))), [900])
+                self.assertEqual([row['product_id'] for row in index.by_skus(['TB1000', 'TB2000'], date(2023, 3, 15))], [None, self.tablet.pk])
+
+    def test_unknown_products_start_no_watermark(self):
+        cache.clear()
+        price_index.by_product_ids([self.phone.pk, 0, -1], date(2023, 3, 15))
+        price_index.by_skus(['UNKNOWN'], date(2023, 3, 15))
+        keys = [f'watermark:{scope}:{ident}' for scope, ident in PriceIndex._keys([0, -1])]
+        self.assertEqual(cache.get_many(keys), {})
+        self.assertIsNotNone(cache.get(f'watermark:{Watermark.PRODUCT_PRICES.value}:{self.phone.pk}'))
+
+    def test_products_expire_without_a_shared_cache(self):
+        self.assertEqual(self.prices(price_index.by_skus(['SP1000'], date(2023, 3, 15))), [1000])
+        # A write in another process, whose watermarks this process does not see
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {ProductPrice._meta.db_table} SET price = 900 WHERE id = %s', [self.price.pk])
+        self.assertEqual(self.prices(price_index.by_skus(['SP1000'], date(2023, 3, 15))), [1000])
+
+        later = time.monotonic() + settings.PRICE_INDEX_TIMEOUT
+        with mock.patch('storage.price_index.time.monotonic', return_value=later):
+            self.assertEqual(self.prices(price_index.by_skus(['SP1000'], date(2023, 3, 15))), [900])
+
+    def test_products_written_while_loading_are_reloaded(self):
+        with mock.patch('storage.price_index.watermark.start', side_effect=lambda keys, value: {key: value + 1 for key in keys}):
+            price_index.by_skus(['SP1000'], date(2023, 3, 15))
+        self.assertIsNone(price_index._products[self.phone.pk].version)
+        with self.assertNumQueries(2):
+            price_index.by_skus(['SP1000'], date(2023, 3, 15))
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+        self.phones = Category.objects.create(name="Phones")
+        audio = Category.objects.create(name="Audio")
+        self.phone = Product.objects.create(name="Smartphone X200", category=self.phones, sku="SP1000", description="A phone with a large screen.")
+        self.headphones = Product.objects.create(name="Studio Headphones", category=audio, sku="HP2000", description="Wireless headphones with noise cancelling.")
+        self.speaker = Product.objects.create(name="Speaker", category=audio, sku="SK3000", description="Waterproof speaker for travelling.")
+
+    def search(self, **params) -> list:
+        response = self.client.get(reverse('product-search'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_name_tolerates_typos(self):
+        results = self.search(q='smartphne')
+        self.assertEqual([row['id'] for row in results], [self.phone.pk])
+        self.assertEqual(set(results[0]), {'id', 'name', 'category', 'sku', 'description', 'rank'})
+
+    def test_sku(self):
+        self.assertEqual([row['sku'] for row in self.search(q='SP1000')], ['SP1000'])
+        self.assertEqual([row['sku'] for row in self.search(q='HP200')], ['HP2000'])
+
+    def test_description_full_text(self):
+        self.assertEqual([row['id'] for row in self.search(q='cancelled noise')], [self.headphones.pk])
+        self.assertEqual(self.search(q='waterproof -travel'), [])
+
+    def test_best_match_first(self):
+        Product.objects.create(name="Headphone Stand", category=self.phones, sku="ST4000", description="Holds headphones.")
+        results = self.search(q='studio headphones')
+        self.assertEqual(results[0]['id'], self.headphones.pk)
+        self.assertEqual(results, sorted(results, key=lambda row: -row['rank']))
+
+    def test_category_filter_and_limit(self):
+        self.assertEqual(self.search(q='headphones', category=self.phones.pk), [])
+        Product.objects.bulk_create(
+            Product(name=f"Speaker {number}", category=self.phones, sku=f"SK{number}") for number in range(5)
+        )
+        self.assertEqual(len(self.search(q='speaker', limit=3)), 3)
+
+    def test_validation(self):
+        self.assertEqual(self.client.get(reverse('product-search')).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('product-search'), {'q': 'phone', 'limit': 500}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_is_not_a_product_id(self):
+        self.assertEqual(resolve(reverse('product-search')).url_name, 'product-search')
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        # Jobs run in the test process, in eager mode. The app reads its settings under the
+        # CELERY_ namespace, so that is the name to change.
+        self.addCleanup(setattr, celery_app.conf, 'CELERY_TASK_ALWAYS_EAGER', celery_app.conf.task_always_eager)
+        celery_app.conf.CELERY_TASK_ALWAYS_EAGER = True
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+
+        self.category = Category.objects.create(name="Electronics")
+        self.products = [
+            Product.objects.create(name=f"Product {index}", category=self.category, sku=f"PR{index}")
+            for index in range(3)
+        ]
+        for product in self.products:
+            ProductPrice.objects.create(product=product, start_date=date(2023, 1, 1), end_date=date(2023, 12, 31), price=100)
+
+    def start(self, method: str, url: str, data=None) -> dict:
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(f'{url}?background=true', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()['status'], JobStatus.QUEUED)
+        self.assertTrue(response['Location'].endswith(reverse('job-detail', args=[response.json()['id']])))
+
+        job = self.client.get(response['Location'])
+        self.assertEqual(job.status_code, status.HTTP_200_OK)
+        return job.json()
+
+    @override_settings(JOB_CHUNK_SIZE=2)
+    def test_category_price_job(self):
+        job = self.start('put', reverse('category-price', args=[self.category.pk]), {'price': '120.00'})
+        self.assertEqual(job['status'], JobStatus.SUCCEEDED)
+        self.assertEqual((job['done'], job['total'], job['result']), (3, 3, {'updated': 3}))
+        self.assertEqual(set(ProductPrice.objects.values_list('price', flat=True)), {Decimal('120.00')})
+        self.assertEqual(ProductPriceHistory.objects.filter(action=Action.UPDATED).count(), 3)
+
+    @override_settings(JOB_CHUNK_SIZE=2)
+    def test_bulk_prices_job(self):
+        rows = [
+            {'sku': 'PR0', 'start_date': '2024-01-01', 'end_date': None, 'price': '10.00'},
+            {'sku': 'UNKNOWN', 'start_date': '2024-01-01', 'end_date': None, 'price': '10.00'},
+            {'sku': 'PR1', 'start_date': '2023-06-01', 'end_date': None, 'price': '20.00'},
+        ]
+        job = self.start('post', reverse('product-price-bulk'), rows)
+        self.assertEqual(job['status'], JobStatus.SUCCEEDED)
+        self.assertEqual((job['done'], job['total']), (3, 3))
+        self.assertEqual((job['result']['created'], job['result']['invalid'], job['result']['trimmed']), (2, 1, 1))
+        self.assertEqual([row['row'] for row in job['result']['rows']], [0, 1, 2])
+
+    @override_settings(JOB_CHUNK_SIZE=2)
+    def test_category_delete_job(self):
+        job = self.start('delete', reverse('category-detail', args=[self.category.pk]))
+        self.assertEqual(job['status'], JobStatus.SUCCEEDED)
+        self.assertEqual(job['result'], {'products': 3, 'prices': 3})
+        self.assertFalse(Category.objects.exists())
+        self.assertEqual(ProductPriceHistory.objects.filter(action=Action.DELETED).count(), 3)
+
+    def test_failed_job(self):
+        job = tasks.enqueue(JobKind.CATEGORY_PRICE, self.user, {'category': 0, 'price': '1.00'})
+        with self.assertLogs('storage.jobs', 'ERROR'):
+            jobs.run(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertIn('does not exist', job.error)
+
+        # A finished job is not run again.
+        jobs.run(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+
+    def test_running_jobs_are_only_run_again_once_their_lease_ran_out(self):
+        job = tasks.enqueue(JobKind.CATEGORY_PRICE, self.user, {'category': self.category.pk, 'price': '120.00'})
+        Job.objects.filter(pk=job.pk).update(status=JobStatus.RUNNING, heartbeat=timezone.now())
+        # A delivery of a job its worker is still on
+        jobs.run(job.pk)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, JobStatus.RUNNING)
+
+        Job.objects.filter(pk=job.pk).update(heartbeat=timezone.now() - timedelta(seconds=settings.JOB_LEASE + 1))
+        jobs.run(job.pk)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, JobStatus.SUCCEEDED)
+
+    def test_without_a_broker_background_runs_in_the_request(self):
+        celery_app.conf.CELERY_TASK_ALWAYS_EAGER = False
+        response = self.client.put(f"{reverse('category-price', args=[self.category.pk])}?background=true", {'price': '120.00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Job.objects.exists())
+
+    def test_without_background_runs_in_the_request(self):
+        response = self.client.put(reverse('category-price', args=[self.category.pk]), {'price': '120.00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Job.objects.exists())
+
+    def test_jobs_of_other_users_are_hidden(self):
+        job = tasks.enqueue(JobKind.CATEGORY_DELETE, None, {'category': self.category.pk})
+        self.assertEqual(self.client.get(reverse('job-detail', args=[job.pk])).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CatalogImportTests(TestCase):
+    HEADER = 'category,sku,name,description,start_date,end_date,price\n'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Smartphone", category=self.category, sku="SP1000", description="A phone.")
+        ProductPrice.objects.create(product=self.product, start_date=date(2023, 1, 1), end_date=date(2023, 12, 31), price=1000)
+        ProductPriceHistory.objects.all().delete()
+
+    def write(self, name: str, content: str) -> Path:
+        path = self.directory / name
+        with (gzip.open(path, 'wt') if name.endswith('.gz') else path.open('w')) as file:
+            file.write(content)
+        return path
+
+    def load(self, path: Path, *args) -> tuple[Job, str]:
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_catalog', str(path), *args, stdout=out)
+        return Job.objects.filter(kind=JobKind.CATALOG_IMPORT).latest('created'), out.getvalue()
+
+    def intervals(self, sku: str) -> list[tuple]:
+        return list(
+            ProductPrice.objects.filter(product__sku=sku).order_by('start_date')
+            .values_list('start_date', 'end_date', 'price', 'category__name')
+        )
+
+    def staging_exists(self, job: Job) -> bool:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s)', [CatalogImport(job).staging])
+            return cursor.fetchone()[0] is not None
+
+    def test_csv(self):
+        path = self.write('catalog.csv', self.HEADER + (
+            'Audio,HP2000,Headphones,"Wireless, with noise cancelling",2024-01-01,,199.99\n'
+            'Audio,HP2000,Headphones,,2023-01-01,2023-12-31,249.00\n'
+            'Audio,SK3000,Speaker,,,,\n'
+            'Electronics,SP1000,Smartphone X,,,,\n'
+        ))
+        job, out = self.load(path)
+
+        self.assertEqual(job.status, JobStatus.SUCCEEDED)
+        self.assertEqual((job.done, job.total, job.result['rows']), (6, 6, 4))
+        self.assertEqual(job.payload['phases'], list(CatalogImport.PHASES))
+        self.assertIn('rows/s', out)
+        self.assertFalse(self.staging_exists(job))
+        self.assertEqual(
+            {key: job.result[key] for key in ('categories_created', 'products_created', 'products_updated', 'prices_created')},
+            {'categories_created': 1, 'products_created': 2, 'products_updated': 1, 'prices_created': 2},
+        )
+
+        headphones = Product.objects.get(sku='HP2000')
+        self.assertEqual((headphones.category.name, headphones.description), ('Audio', 'Wireless, with noise cancelling'))
+        self.assertEqual(Product.objects.get(sku='SK3000').description, '')
+        # A missing description keeps the current one.
+        self.assertEqual(Product.objects.values_list('name', 'description').get(sku='SP1000'), ('Smartphone X', 'A phone.'))
+        self.assertEqual(self.intervals('HP2000'), [
+            (date(2023, 1, 1), date(2023, 12, 31), Decimal('249.00'), 'Audio'),
+            (date(2024, 1, 1), None, Decimal('199.99'), 'Audio'),
+        ])
+        self.assertEqual(ProductPriceHistory.objects.filter(product_sku='HP2000', action=Action.CREATED).count(), 2)
+        self.assertEqual(
+            CategoryDailyPrice.objects.get(category=headphones.category, day=date(2023, 6, 1)).price_sum, Decimal('249.00'),
+        )
+
+    def test_ndjson_overlaps(self):
+        rows = [
+            {'category': 'Electronics', 'sku': 'SP1000', 'name': 'Smartphone', 'start_date': '2023-06-01', 'end_date': '2023-06-30', 'price': 800},
+            {'category': 'Electronics', 'sku': 'SP1000', 'name': 'Smartphone', 'start_date': '2023-06-15', 'end_date': '2023-07-15', 'price': '900.50'},
+            {'category': 'Electronics', 'sku': 'SP1000', 'name': 'Smartphone', 'start_date': '2023-06-01', 'end_date': '2023-06-10', 'price': 700},
+        ]
+        job, _ = self.load(self.write('catalog.ndjson.gz', '\n'.join(json.dumps(row) for row in rows) + '\n\n'))
+
+        self.assertEqual(job.status, JobStatus.SUCCEEDED)
+        self.assertEqual(job.result['rows'], 3)
+        # Later lines win where they overlap earlier lines, and the file wins over the table.
+        self.assertEqual(self.intervals('SP1000'), [
+            (date(2023, 1, 1), date(2023, 5, 31), Decimal('1000.00'), 'Electronics'),
+            (date(2023, 6, 1), date(2023, 6, 10), Decimal('700.00'), 'Electronics'),
+            (date(2023, 6, 11), date(2023, 6, 14), Decimal('800.00'), 'Electronics'),
+            (date(2023, 6, 15), date(2023, 7, 15), Decimal('900.50'), 'Electronics'),
+            (date(2023, 7, 16), date(2023, 12, 31), Decimal('1000.00'), 'Electronics'),
+        ])
+        self.assertEqual((job.result['prices_trimmed'], job.result['prices_created']), (1, 4))
+
+        updated = ProductPriceHistory.objects.get(action=Action.UPDATED)
+        self.assertEqual(
+            (updated.start_date, updated.end_date, updated.previous_start_date, updated.previous_end_date),
+            (date(2023, 1, 1), date(2023, 5, 31), date(2023, 1, 1), date(2023, 12, 31)),
+        )
+        self.assertEqual(ProductPriceHistory.objects.filter(action=Action.CREATED).count(), 4)
+
+    def test_covered_and_unchanged_intervals(self):
+        path = self.write('catalog.csv', self.HEADER + (
+            'Electronics,SP1000,Smartphone,,2022-01-01,2023-12-31,900\n'
+            'Electronics,SP1000,Smartphone,,2024-01-01,2024-12-31,950\n'
+        ))
+        job, _ = self.load(path)
+        self.assertEqual((job.result['prices_deleted'], job.result['prices_created']), (1, 2))
+        self.assertEqual(ProductPriceHistory.objects.filter(action=Action.DELETED).count(), 1)
+
+        # Importing the same file again changes nothing.
+        ProductPriceHistory.objects.all().delete()
+        with mock.patch.object(rollup, 'rebuild') as rebuild:
+            job, _ = self.load(path)
+        rebuild.assert_not_called()
+        self.assertEqual(
+            {key: job.result[key] for key in ('prices_created', 'prices_deleted', 'prices_trimmed', 'prices_unchanged', 'products_updated')},
+            {'prices_created': 0, 'prices_deleted': 0, 'prices_trimmed': 0, 'prices_unchanged': 2, 'products_updated': 0},
+        )
+        self.assertFalse(ProductPriceHistory.objects.exists())
+        self.assertEqual(len(self.intervals('SP1000')), 2)
+
+    def test_moved_product_takes_its_prices(self):
+        job, _ = self.load(self.write('catalog.csv', self.HEADER + 'Phones,SP1000,Smartphone,,,,\n'))
+        self.assertEqual(job.result['prices_moved'], 1)
+        self.assertEqual(self.intervals('SP1000')[0][3], 'Phones')
+        self.assertFalse(CategoryDailyPrice.objects.filter(category=self.category).exists())
+        self.assertTrue(CategoryDailyPrice.objects.filter(category__name='Phones').exists())
+
+    def test_invalid_rows_are_skipped(self):
+        Product.objects.create(name="Tablet", category=self.category, sku="TB1000")
+        path = self.write('catalog.csv', self.HEADER + (
+            'Electronics,,Nameless,,,,\n'
+            'Electronics,PR1,Priceless,,2024-01-01,,\n'
+            'Electronics,PR2,Backwards,,2024-01-01,2023-01-01,10\n'
+            'Electronics,PR3,Free,,2024-01-01,,0\n'
+            'Electronics,PR4,Tablet,,,,\n'
+            'Electronics,PR5,Watch,,,,\n'
+            'Electronics,PR6,Watch,,,,\n'
+        ))
+        job, out = self.load(path)
+
+        self.assertEqual(job.status, JobStatus.SUCCEEDED)
+        self.assertEqual(job.result['invalid'], 6)
+        # The header is line 1.
+        self.assertEqual(job.result['errors'], [
+            f'Line 2: sku: {FieldValidationError.REQUIRED.value[1]}',
+            f'Line 3: price: {FieldValidationError.REQUIRED.value[1]}',
+            f'Line 4: end_date: {FieldValidationError.END_DATE_AFTER_START_DATE.value[1]}',
+            'Line 5: price: Ensure this value is greater than or equal to 0.01.',
+            f'Line 6: name: {FieldValidationError.PRODUCT_NAME_TAKEN.value[1]}',
+            f'Line 8: name: {FieldValidationError.PRODUCT_NAME_TAKEN.value[1]}',
+        ])
+        self.assertIn(f'Line 8: name: {FieldValidationError.PRODUCT_NAME_TAKEN.value[1]}', out)
+        self.assertEqual(set(Product.objects.values_list('sku', flat=True)), {'SP1000', 'TB1000', 'PR5'})
+
+    def test_unreadable_values_only_skip_their_row(self):
+        path = self.write('catalog.csv', self.HEADER + (
+            'Electronics,PR1,"A\nmultiline, description",,,,\n'
+            '\n'
+            'Electronics,PR2,Undated,,someday,,10\n'
+            'Electronics,PR3,Impossible,,2024-02-30,,10\n'
+            'Electronics,PR4,Priceless,,2024-01-01,,free\n'
+            'Electronics,PR5,Unpriceable,,2024-01-01,,NaN\n'
+            'Electronics,PR6,Expensive,,2024-01-01,,100000000\n'
+            f'Electronics,PR7,{"N" * 101},,,,\n'
+            'Electronics,PR8,Short\n'
+            'Electronics,PR9,Valid,,2024-01-01,,10\n'
+        ))
+        job, _ = self.load(path)
+
+        self.assertEqual(job.status, JobStatus.SUCCEEDED)
+        invalid_date = str(FieldValidationError.INVALID_DATE.value[1]).format(format='YYYY-MM-DD')
+        # Lines count the line breaks of quoted values and the blank lines.
+        self.assertEqual(job.result['errors'], [
+            f'Line 5: start_date: {invalid_date}',
+            f'Line 6: start_date: {invalid_date}',
+            f'Line 7: price: {FieldValidationError.INVALID_NUMBER.value[1]}',
+            f'Line 8: price: {FieldValidationError.INVALID_NUMBER.value[1]}',
+            'Line 9: price: Ensure that there are no more than 8 digits before the decimal point.',
+            'Line 10: name: Ensure this field has no more than 100 characters.',
+            'Line 11: Expected 7 values, found 3.',
+        ])
+        self.assertEqual(set(Product.objects.values_list('sku', flat=True)), {'SP1000', 'PR1', 'PR9'})
+        self.assertEqual(self.intervals('PR9'), [(date(2024, 1, 1), None, Decimal('10.00'), 'Electronics')])
+
+        job, _ = self.load(self.write('catalog.ndjson', (
+            '{"category": "Electronics", "sku": "PR10", "name": "Earbuds", "start_date": "2024-01-01", "price": 10.5}\n'
+            '\n'
+            '{"category": "Electronics", "sku": "PR11", "name": "Unfinished"\n'
+            '["Electronics", "PR12"]\n'
+            '{"category": "Electronics", "sku": "PR13", "name": "Undated", "start_date": 20240101, "price": 10}\n'
+        )))
+        self.assertEqual(job.result['errors'], [
+            'Line 3: Not a JSON object.',
+            'Line 4: Not a JSON object.',
+            f'Line 5: start_date: {invalid_date}',
+        ])
+        self.assertEqual(self.intervals('PR10'), [(date(2024, 1, 1), None, Decimal('10.50'), 'Electronics')])
+
+    def test_invalid_files(self):
+        with self.assertRaisesMessage(CommandError, 'must name columns'):
+            call_command('import_catalog', str(self.write('catalog.csv', 'sku,colour\nSP1000,red\n')), stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, 'Cannot tell the format'):
+            call_command('import_catalog', str(self.write('catalog.txt', '')), stdout=StringIO())
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {JobStatus.FAILED})
+
+    def test_resume(self):
+        path = self.write('catalog.csv', self.HEADER + 'Electronics,SP1000,Smartphone,,2024-01-01,,900\n')
+        with mock.patch.object(CatalogImport, '_prices', side_effect=RuntimeError('Connection lost')):
+            with self.assertRaisesMessage(CommandError, '--resume'):
+                call_command('import_catalog', str(path), stdout=StringIO())
+
+        job = Job.objects.get(kind=JobKind.CATALOG_IMPORT)
+        self.assertEqual((job.status, job.error), (JobStatus.FAILED, 'Connection lost'))
+        self.assertEqual(job.payload['phases'], ['load', 'validate', 'categories', 'products'])
+        self.assertTrue(self.staging_exists(job))
+
+        # The file is not read again.
+        path.unlink()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_catalog', resume=str(job.pk), stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.SUCCEEDED)
+        self.assertEqual(len(self.intervals('SP1000')), 2)
+        self.assertFalse(self.staging_exists(job))
+
+        with self.assertRaisesMessage(CommandError, 'already complete'):
+            call_command('import_catalog', resume=str(job.pk), stdout=StringIO())
+
+    def test_resume_fails_when_staged_rows_are_lost(self):
+        path = self.write('catalog.csv', self.HEADER + 'Electronics,SP1000,Smartphone,,2024-01-01,,900\n')
+        with mock.patch.object(CatalogImport, '_prices', side_effect=RuntimeError('Connection lost')):
+            with self.assertRaisesMessage(CommandError, '--resume'):
+                call_command('import_catalog', str(path), stdout=StringIO())
+        job = Job.objects.get(kind=JobKind.CATALOG_IMPORT)
+
+        # The database empties unlogged tables when it restarts after a crash.
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {connection.ops.quote_name(CatalogImport(job).staging)}')
+        with self.assertRaisesMessage(CommandError, 'Import the file again'):
+            call_command('import_catalog', resume=str(job.pk), stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertEqual(len(self.intervals('SP1000')), 1)
+
+
+class AdminScalingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", password="testpassword")
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(name="Electronics")
+
+    def add_products(self, count: int):
+        start = Product.objects.count()
+        for index in range(start, start + count):
+            product = Product.objects.create(name=f"Product {index}", category=self.category, sku=f"SKU{index}")
+            ProductPrice.objects.create(product=product, start_date=date(2023, 1, 1), price=10)
+
+    def changelist_queries(self, name: str) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:storage_{name}_changelist'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for name in ('product', 'productprice'):
+            with self.subTest(name=name):
+                self.add_products(2)
+                few = self.changelist_queries(name)
+                self.add_products(10)
+                self.assertEqual(self.changelist_queries(name), few)
+
+    def test_foreign_keys_use_autocomplete(self):
+        self.add_products(3)
+        response = self.client.get(reverse('admin:storage_productprice_add'))
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, 'SKU1')
+
+    def test_search_by_sku(self):
+        self.add_products(3)
+        response = self.client.get(reverse('admin:storage_productprice_changelist'), {'q': 'SKU1'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1)
+    def test_whole_table_count_is_estimated(self):
+        self.add_products(5)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE storage_product')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(EstimatedCountPaginator(Product.objects.order_by('id'), 10).count, 5)
+        self.assertIn('pg_class', queries[0]['sql'])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(EstimatedCountPaginator(Product.objects.filter(sku='SKU1').order_by('id'), 10).count, 1)
+        self.assertIn('COUNT(*)', queries[0]['sql'])
@@ -8,8 +8,19 @@ router.register(r'categories', views.CategoryViewSet)
 router.register(r'products', views.ProductViewSet)
 
 urlpatterns = [
+    # Before the router, whose product detail route would take `search` for an id
+    path('products/search/', views.ProductSearchView.as_view(), name='product-search'),
+    path('products/bulk/', views.BulkProductView.as_view(), name='product-bulk'),
     path('', include(router.urls)),
     path('products/<int:product_id>/price/', views.ProductPriceView.as_view(), name='product-price'),
+    path('products/price/bulk/', views.BulkProductPriceView.as_view(), name='product-price-bulk'),
+    path('products/price/history/<str:sku>/', views.ProductPriceHistoryView.as_view(), name='price-history'),
+    path('products/price/lookup/', views.PriceLookupView.as_view(), name='price-lookup'),
+    path('products/price/as-of/', views.PriceAsOfView.as_view(), name='price-as-of'),
     path('categories/<int:category_id>/price/', views.CategoryPriceView.as_view(), name='category-price'),
     path('categories/<int:category_id>/price/average/', views.AveragePriceView.as_view(), name='average-price'),
+    path('jobs/<uuid:job_id>/', views.JobView.as_view(), name='job-detail'),
+    path('export/products/', views.ProductExportView.as_view(), name='export-products'),
+    path('export/prices/', views.ProductPriceExportView.as_view(), name='export-prices'),
+    path('export/history/', views.ProductPriceHistoryExportView.as_view(), name='export-history'),
 ]
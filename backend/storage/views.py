@@ -1,68 +1,227 @@
 from collections import defaultdict
-from datetime import timedelta
+from datetime import date, timedelta
 from functools import partial
+from typing import Callable
 
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction, IntegrityError
-from django.db.models import Avg
-from django.db.models.functions import ExtractWeek, ExtractMonth
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.decorators import method_decorator
-from django.views.decorators.http import last_modified
 from drf_spectacular.utils import OpenApiParameter, OpenApiTypes, OpenApiResponse, PolymorphicProxySerializer, extend_schema
 from drf_standardized_errors.openapi_validation_errors import extend_validation_errors
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from rest_framework.response import Response
 from rest_framework.request import Request
+from rest_framework.settings import api_settings
 from rest_framework import status
 
-from main.utils.view import AuthenticatedRestView, AuthenticatedModelViewSet, get_last_modified
+from main.utils.pagination import KeysetPagination
+from main.utils.parsers import NDJSONParser
+from main.utils.serializers import ValuesSerializer
+from main.utils.view import (
+    AsyncAPIViewMixin,
+    AuthenticatedRestView,
+    AuthenticatedModelViewSet,
+    ValuesReadMixin,
+    aget_object_or_404,
+    watermark_condition,
+)
 from main.openapi import FieldValidationError
-from .enums import AveragePricePeriod
-from .models import Category, Product, ProductPrice
-from .serializers.model import CategorySerializer, ProductSerializer, ProductPriceSerializer
-from .serializers.request import AveragePriceRequestSerializer, CategoryPriceRequestSerializer
+from . import export, history, tasks
+from .averages import aplain_average, aweighted_average
+from .caching import acached_average
+from .enums import AveragePricePeriod, ExportFormat, JobKind, Watermark
+from .models import Category, Job, Product, ProductPrice, ProductPriceHistory
+from .price_index import index as price_index
+from .pricing import bulk_report, ingest_price_rows, reprice_category
+from .products import bulk_product_report, upsert_product_rows
+from .search import search_products
+from .serializers.model import (
+    CategorySerializer,
+    JobSerializer,
+    ProductSerializer,
+    ProductPriceHistorySerializer,
+    ProductPriceSerializer,
+)
+from .serializers.request import (
+    AveragePriceRequestSerializer,
+    BackgroundRequestSerializer,
+    BulkProductPriceRequestSerializer,
+    BulkProductRequestSerializer,
+    CategoryPriceRequestSerializer,
+    ExportRequestSerializer,
+    PriceAsOfRequestSerializer,
+    PriceLookupRequestSerializer,
+    ProductSearchRequestSerializer,
+)
 from .serializers.response import (
     AveragePriceResponseSerializer,
+    BulkProductPriceResponseSerializer,
+    BulkProductResponseSerializer,
+    CategoryPriceResponseSerializer,
+    PriceAsOfResponseSerializer,
+    PriceLookupResponseSerializer,
+    ProductSearchResponseSerializer,
     WeeklyAveragePriceResponseSerializer,
     MonthlyAveragePriceResponseSerializer,
 )
 
 
+BACKGROUND_PARAMETER = OpenApiParameter(
+    name='background',
+    location=OpenApiParameter.QUERY,
+    type=OpenApiTypes.BOOL,
+    required=False,
+    description='Run the operation as a background job and answer 202 with the job. False if not provided. '
+                'Ignored when no job broker is configured, the operation then runs in the request.',
+)
+
+JOB_ACCEPTED = OpenApiResponse(
+    response=JobSerializer,
+    description='The operation was queued as a background job. Its status is at the Location URL.',
+)
+
+
+def in_background(request: Request) -> bool:
+    serializer = BackgroundRequestSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['background'] and tasks.workers_available()
+
+
+def job_accepted(request: Request, job: Job) -> Response:
+    # Eager jobs, and fast workers, may be done by now.
+    job.refresh_from_db()
+    location = request.build_absolute_uri(reverse('job-detail', args=[job.pk]))
+    return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED, headers={'Location': location})
+
+
 @extend_schema(tags=['Categoriy'])
-class CategoryViewSet(AuthenticatedModelViewSet):
+class CategoryViewSet(ValuesReadMixin, AuthenticatedModelViewSet):
     """
     The ModelViewSet automatically provides `list`, `create`, `retrieve`,
     `update` and `destroy` actions for categories.
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    values_serializer = ValuesSerializer(CategorySerializer)
+
+    @method_decorator(watermark_condition(Watermark.CATEGORY.value))
+    async def list(self, request, *args, **kwargs):
+        return await super().list(request, *args, **kwargs)
 
-    @method_decorator(last_modified(partial(get_last_modified, model=Category)))
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+    @method_decorator(watermark_condition(Watermark.CATEGORY.value, lookup='pk'))
+    async def retrieve(self, request, *args, **kwargs):
+        return await super().retrieve(request, *args, **kwargs)
 
-    @method_decorator(last_modified(partial(get_last_modified, model=Category)))
-    def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+    @extend_schema(parameters=[BACKGROUND_PARAMETER], responses={204: None, 202: JOB_ACCEPTED})
+    def destroy(self, request, *args, **kwargs):
+        if not in_background(request):
+            return super().destroy(request, *args, **kwargs)
+
+        category = self.get_object()
+        job = tasks.enqueue(JobKind.CATEGORY_DELETE, request.user, {'category': category.pk})
+        return job_accepted(request, job)
 
 
 @extend_schema(tags=['Product'])
-class ProductViewSet(AuthenticatedModelViewSet):
+class ProductViewSet(ValuesReadMixin, AuthenticatedModelViewSet):
     """
     The ModelViewSet automatically provides `list`, `create`, `retrieve`,
     `update` and `destroy` actions for products.
     """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    values_serializer = ValuesSerializer(ProductSerializer)
+
+    @method_decorator(watermark_condition(Watermark.PRODUCT.value))
+    async def list(self, request, *args, **kwargs):
+        return await super().list(request, *args, **kwargs)
 
-    @method_decorator(last_modified(partial(get_last_modified, model=Product)))
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+    @method_decorator(watermark_condition(Watermark.PRODUCT.value, lookup='pk'))
+    async def retrieve(self, request, *args, **kwargs):
+        return await super().retrieve(request, *args, **kwargs)
 
-    @method_decorator(last_modified(partial(get_last_modified, model=Product)))
-    def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+
+@extend_schema(tags=['Product'])
+class ProductSearchView(AsyncAPIViewMixin, AuthenticatedRestView):
+    throttle_scope = 'read'
+    values_serializer = ValuesSerializer(ProductSearchResponseSerializer)
+
+    @extend_schema(
+        operation_id='searchProducts',
+        summary='Search Products',
+        description=(
+            'Search products by name and SKU, tolerating typos, and by the words of their description. '
+            'The best matches come first.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='q',
+                location=OpenApiParameter.QUERY,
+                type=OpenApiTypes.STR,
+                required=True,
+                description='The text to search for.',
+            ),
+            OpenApiParameter(
+                name='category',
+                location=OpenApiParameter.QUERY,
+                type=OpenApiTypes.INT,
+                required=False,
+                description='Only search the products of this category.',
+            ),
+            OpenApiParameter(
+                name='limit',
+                location=OpenApiParameter.QUERY,
+                type=OpenApiTypes.INT,
+                required=False,
+                description='The maximum number of products to return, up to 100. 20 if not provided.',
+            ),
+        ],
+        responses={
+            200: ProductSearchResponseSerializer(many=True),
+        },
+    )
+    async def get(self, request: Request):
+        serializer = ProductSearchRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        products = search_products(
+            serializer.validated_data['q'],
+            serializer.validated_data['category'],
+            serializer.validated_data['limit'],
+        )
+        return Response(self.values_serializer.many([row async for row in products]), status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=['Product'])
+class BulkProductView(AuthenticatedRestView):
+    throttle_scope = 'bulk'
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, NDJSONParser]
+
+    @extend_schema(
+        operation_id='upsertProductsBulk',
+        summary='Create Or Update Products In Bulk',
+        description=(
+            'Create or update many products at once, matched by SKU. The body is a JSON array or an NDJSON '
+            'stream of rows that name their category. Rows are written in batches, each in one transaction, '
+            'and every row gets its own outcome and product id in the response.'
+        ),
+        request=BulkProductRequestSerializer(many=True),
+        responses={
+            200: BulkProductResponseSerializer,
+        },
+    )
+    def post(self, request: Request):
+        if not isinstance(request.data, list):
+            raise DRFValidationError({'non_field_errors': ['Expected a list of product rows.']})
+
+        response_serializer = BulkProductResponseSerializer(bulk_product_report(upsert_product_rows(request.data)))
+        return Response(response_serializer.data, status=status.HTTP_200_OK)
 
 
 @extend_schema(tags=['Price'])
@@ -78,6 +237,22 @@ class ProductViewSet(AuthenticatedModelViewSet):
 )
 class ProductPriceView(AuthenticatedRestView):
 
+    @extend_schema(
+        operation_id='listProductPrices',
+        summary='List Product Prices',
+        description='Get the price intervals of a specific product, in date order.',
+        responses={
+            200: ProductPriceSerializer(many=True),
+            304: OpenApiResponse(description='The prices did not change since the copy the client holds.'),
+        },
+    )
+    @method_decorator(watermark_condition(Watermark.PRODUCT_PRICES.value, lookup='product_id'))
+    def get(self, request: Request, product_id: int):
+        product = get_object_or_404(Product, pk=product_id)
+        prices = ProductPrice.objects.filter(product=product).order_by('start_date')
+        serializer = ProductPriceSerializer(prices, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     @extend_schema(
         operation_id='addProductPrice',
         summary='Add Product Price',
@@ -107,6 +282,39 @@ class ProductPriceView(AuthenticatedRestView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+@extend_schema(tags=['Price'])
+class BulkProductPriceView(AuthenticatedRestView):
+    throttle_scope = 'bulk'
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, NDJSONParser]
+
+    @extend_schema(
+        operation_id='addProductPricesBulk',
+        summary='Add Product Prices In Bulk',
+        description=(
+            'Set prices for many products at once. The body is a JSON array or an NDJSON stream of rows '
+            'identified by product SKU. Rows are applied in order within one transaction, and every row '
+            'gets its own outcome in the response.'
+        ),
+        request=BulkProductPriceRequestSerializer(many=True),
+        parameters=[BACKGROUND_PARAMETER],
+        responses={
+            200: BulkProductPriceResponseSerializer,
+            202: JOB_ACCEPTED,
+        },
+    )
+    def post(self, request: Request):
+        if not isinstance(request.data, list):
+            raise DRFValidationError({'non_field_errors': ['Expected a list of price rows.']})
+
+        if in_background(request):
+            job = tasks.enqueue(JobKind.BULK_PRICES, request.user, {'rows': request.data}, total=len(request.data))
+            return job_accepted(request, job)
+
+        results, deleted, trimmed = ingest_price_rows(request.data)
+        response_serializer = BulkProductPriceResponseSerializer(bulk_report(results, deleted, trimmed))
+        return Response(response_serializer.data, status=status.HTTP_200_OK)
+
+
 @extend_schema(tags=['Price'])
 class CategoryPriceView(AuthenticatedRestView):
 
@@ -115,8 +323,10 @@ class CategoryPriceView(AuthenticatedRestView):
         summary='Change Category Price',
         description='Change the price for all products in a specific category.',
         request=CategoryPriceRequestSerializer,
+        parameters=[BACKGROUND_PARAMETER],
         responses={
-            204: OpenApiResponse(description='The price for all products in the category has been changed.'),
+            200: CategoryPriceResponseSerializer,
+            202: JOB_ACCEPTED,
         },
     )
     def put(self, request: Request, category_id: int):
@@ -124,17 +334,17 @@ class CategoryPriceView(AuthenticatedRestView):
         serializer.is_valid(raise_exception=True)
 
         category = get_object_or_404(Category, pk=category_id)
-        product_prices = ProductPrice.objects.filter(product__category=category)
-
-        for product_price in product_prices:
-            product_price.price = serializer.validated_data['price']
-            product_price.save()
+        if in_background(request):
+            payload = {'category': category.pk, 'price': str(serializer.validated_data['price'])}
+            return job_accepted(request, tasks.enqueue(JobKind.CATEGORY_PRICE, request.user, payload))
+        updated = reprice_category(category, serializer.validated_data['price'])
 
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        response_serializer = CategoryPriceResponseSerializer({'updated': updated})
+        return Response(response_serializer.data, status=status.HTTP_200_OK)
 
 
 @extend_schema(tags=['Price'])
-class AveragePriceView(AuthenticatedRestView):
+class AveragePriceView(AsyncAPIViewMixin, AuthenticatedRestView):
 
     @extend_schema(
         operation_id='getCategoryAveragePrice',
@@ -163,6 +373,14 @@ class AveragePriceView(AuthenticatedRestView):
                 enum=AveragePricePeriod.values(),
                 description='The period to calculate the average price over. Calculate the whole specified date range if not provided.',
             ),
+            OpenApiParameter(
+                name='weighted',
+                location=OpenApiParameter.QUERY,
+                type=OpenApiTypes.BOOL,
+                required=False,
+                description='Weigh every price by the number of days it is in effect in the range, and count it in every week '
+                            'or month it is in effect. By default every price row counts once, in the week or month it starts in.',
+            ),
         ],
         responses={
             200: PolymorphicProxySerializer(
@@ -175,10 +393,12 @@ class AveragePriceView(AuthenticatedRestView):
                 resource_type_field_name='period',
             ),
             204: OpenApiResponse(description='No products found for the specified date range.'),
+            304: OpenApiResponse(description='The prices of the category did not change since the copy the client holds.'),
         },
     )
-    def get(self, request: Request, category_id: int):
-        category = get_object_or_404(Category, pk=category_id)
+    @method_decorator(watermark_condition(Watermark.CATEGORY_PRICES.value, lookup='category_id'))
+    async def get(self, request: Request, category_id: int):
+        category = await aget_object_or_404(Category.objects.all(), pk=category_id)
 
         serializer = AveragePriceRequestSerializer(data=request.query_params)
         serializer.is_valid(raise_exception=True)
@@ -186,31 +406,273 @@ class AveragePriceView(AuthenticatedRestView):
         start_date = serializer.validated_data['start_date']
         end_date = serializer.validated_data['end_date']
         period = serializer.validated_data['period']
+        weighted = serializer.validated_data['weighted']
 
-        prices = ProductPrice.objects.filter(
-            product__category=category,
-            start_date__lte=end_date,
-            end_date__gte=start_date
-        )
+        compute = partial(aweighted_average if weighted else aplain_average, category, start_date, end_date, period)
+        average, hit = await acached_average(category.pk, start_date, end_date, period, weighted, compute)
+        headers = {'X-Cache': 'HIT' if hit else 'MISS'}
 
-        if not prices.exists():
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        if average is None:
+            return Response(status=status.HTTP_204_NO_CONTENT, headers=headers)
 
         match period:
             case AveragePricePeriod.WHOLE.value:
-                average_price = prices.aggregate(avg_price=Avg('price'))['avg_price']
-                response_serializer = AveragePriceResponseSerializer({"average_price": round(average_price, 2)})
+                response_serializer = AveragePriceResponseSerializer(average)
 
             case AveragePricePeriod.WEEK.value:
-                weekly_avg_prices = prices.annotate(
-                    week=ExtractWeek('start_date')
-                ).values('week').annotate(avg_price=Avg('price')).order_by('week')
-                response_serializer = WeeklyAveragePriceResponseSerializer(weekly_avg_prices, many=True)
+                response_serializer = WeeklyAveragePriceResponseSerializer(average, many=True)
 
             case AveragePricePeriod.MONTH.value:
-                monthly_avg_prices = prices.annotate(
-                    month=ExtractMonth('start_date')
-                ).values('month').annotate(avg_price=Avg('price')).order_by('month')
-                response_serializer = MonthlyAveragePriceResponseSerializer(monthly_avg_prices, many=True)
+                response_serializer = MonthlyAveragePriceResponseSerializer(average, many=True)
 
+        return Response(response_serializer.data, status=status.HTTP_200_OK, headers=headers)
+
+
+class PriceHistoryPagination(KeysetPagination):
+    """
+    Pages through the history of a SKU newest first, along the (product_sku, change_date, id) index.
+    """
+    ordering = ('-change_date', '-id')
+
+
+@extend_schema(tags=['Price'])
+class ProductPriceHistoryView(AuthenticatedRestView):
+
+    @extend_schema(
+        operation_id='listProductPriceHistory',
+        summary='List Product Price History',
+        description=(
+            'Get the recorded changes to the price intervals of a SKU, newest first. '
+            'The history is kept after the product is deleted.'
+        ),
+        responses={
+            200: ProductPriceHistorySerializer(many=True),
+        },
+    )
+    def get(self, request: Request, sku: str):
+        paginator = PriceHistoryPagination()
+        changes = paginator.paginate_queryset(ProductPriceHistory.objects.filter(product_sku=sku), request, view=self)
+        serializer = ProductPriceHistorySerializer(changes, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+@extend_schema(tags=['Price'])
+class PriceAsOfView(AuthenticatedRestView):
+
+    @extend_schema(
+        operation_id='getPricesAsOf',
+        summary='Get Prices As Of',
+        description=(
+            'Get the price each SKU had on a date, as it was recorded at a point in time. '
+            'Later corrections to the prices of that date are ignored.'
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='sku',
+                location=OpenApiParameter.QUERY,
+                type=OpenApiTypes.STR,
+                many=True,
+                required=True,
+                description='The SKUs to look up. Repeat the parameter for several SKUs, up to 1000.',
+            ),
+            OpenApiParameter(
+                name='date',
+                location=OpenApiParameter.QUERY,
+                type=OpenApiTypes.DATE,
+                required=False,
+                description='The date the prices apply to. Today if not provided.',
+            ),
+            OpenApiParameter(
+                name='known_at',
+                location=OpenApiParameter.QUERY,
+                type=OpenApiTypes.DATETIME,
+                required=False,
+                description='Only take into account the changes recorded until this time. Now if not provided.',
+            ),
+        ],
+        responses={
+            200: PriceAsOfResponseSerializer(many=True),
+        },
+    )
+    def get(self, request: Request):
+        serializer = PriceAsOfRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        prices = history.prices_as_of(
+            serializer.validated_data['sku'],
+            serializer.validated_data['date'],
+            serializer.validated_data['known_at'] or timezone.now(),
+        )
+        response_serializer = PriceAsOfResponseSerializer(prices, many=True)
         return Response(response_serializer.data, status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=['Price'])
+class PriceLookupView(AuthenticatedRestView):
+    throttle_scope = 'read'
+    values_serializer = ValuesSerializer(PriceLookupResponseSerializer)
+
+    @extend_schema(
+        operation_id='lookupPrices',
+        summary='Look Up Prices',
+        description=(
+            'Get the price of many products on a date, by SKU or by product id, up to 1000 at once. '
+            'Answers come from price intervals kept in memory, so a repeated lookup runs no query.'
+        ),
+        request=PriceLookupRequestSerializer,
+        responses={
+            200: PriceLookupResponseSerializer(many=True),
+        },
+    )
+    def post(self, request: Request):
+        serializer = PriceLookupRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        day = serializer.validated_data['date']
+        if 'skus' in serializer.validated_data:
+            prices = price_index.by_skus(serializer.validated_data['skus'], day)
+        else:
+            prices = price_index.by_product_ids(serializer.validated_data['product_ids'], day)
+
+        return Response(self.values_serializer.many(prices), status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=['Job'])
+class JobView(AuthenticatedRestView):
+
+    @extend_schema(
+        operation_id='getJob',
+        summary='Get Job',
+        description=(
+            'Get the status of a background job started by the current user. `done` counts the products or '
+            'rows handled so far out of `total`. `result` holds the response the operation would have given '
+            'and `error` the reason it failed.'
+        ),
+        responses={
+            200: JobSerializer,
+        },
+    )
+    def get(self, request: Request, job_id: str):
+        job = get_object_or_404(Job, pk=job_id, user=request.user)
+        return Response(JobSerializer(job).data, status=status.HTTP_200_OK)
+
+
+EXPORT_PARAMETERS = [
+    OpenApiParameter(
+        name='output',
+        location=OpenApiParameter.QUERY,
+        type=OpenApiTypes.STR,
+        required=False,
+        enum=ExportFormat.values(),
+        description='The format of the export. NDJSON if not provided.',
+    ),
+    OpenApiParameter(
+        name='category',
+        location=OpenApiParameter.QUERY,
+        type=OpenApiTypes.INT,
+        required=False,
+        description='Only export the rows of this category.',
+    ),
+    OpenApiParameter(
+        name='start_date',
+        location=OpenApiParameter.QUERY,
+        type=OpenApiTypes.DATE,
+        required=False,
+        description='The start date of the date range.',
+    ),
+    OpenApiParameter(
+        name='end_date',
+        location=OpenApiParameter.QUERY,
+        type=OpenApiTypes.DATE,
+        required=False,
+        description='The end date of the date range.',
+    ),
+]
+
+EXPORT_CONTENT_TYPES = {
+    ExportFormat.NDJSON.value: 'application/x-ndjson',
+    ExportFormat.CSV.value: 'text/csv',
+}
+
+
+class ExportView(AuthenticatedRestView):
+    """
+    Streams a table as NDJSON or CSV, one line per row, in constant memory.
+    """
+    throttle_scope = 'bulk'
+    name: str
+    table: export.Export
+    # Builds the filtered queryset from the category, start date and end date
+    select: Callable[[int | None, date | None, date | None], QuerySet]
+
+    def get(self, request: Request):
+        serializer = ExportRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        output = serializer.validated_data['output']
+        queryset = self.select(
+            serializer.validated_data['category'],
+            serializer.validated_data['start_date'],
+            serializer.validated_data['end_date'],
+        )
+        # Under ASGI, Django reads a sync iterator whole before sending it, so the rows are read asynchronously.
+        if isinstance(request._request, ASGIRequest):
+            content = export.aencode(self.table, export.arows(self.table, queryset), output)
+        else:
+            content = export.encode(self.table, export.rows(self.table, queryset), output)
+        response = StreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[output])
+        response['Content-Disposition'] = f'attachment; filename="{self.name}.{output}"'
+        return response
+
+
+@extend_schema(tags=['Export'])
+class ProductExportView(ExportView):
+    name = 'products'
+    table = export.PRODUCTS
+    select = staticmethod(export.products)
+
+    @extend_schema(
+        operation_id='exportProducts',
+        summary='Export Products',
+        description='Stream the products, optionally of one category and last updated within a date range.',
+        parameters=EXPORT_PARAMETERS,
+        responses={(200, content_type): OpenApiTypes.STR for content_type in EXPORT_CONTENT_TYPES.values()},
+    )
+    def get(self, request: Request):
+        return super().get(request)
+
+
+@extend_schema(tags=['Export'])
+class ProductPriceExportView(ExportView):
+    name = 'prices'
+    table = export.PRICES
+    select = staticmethod(export.prices)
+
+    @extend_schema(
+        operation_id='exportProductPrices',
+        summary='Export Product Prices',
+        description='Stream the price intervals, optionally of one category and overlapping a date range.',
+        parameters=EXPORT_PARAMETERS,
+        responses={(200, content_type): OpenApiTypes.STR for content_type in EXPORT_CONTENT_TYPES.values()},
+    )
+    def get(self, request: Request):
+        return super().get(request)
+
+
+@extend_schema(tags=['Export'])
+class ProductPriceHistoryExportView(ExportView):
+    name = 'history'
+    table = export.HISTORY
+    select = staticmethod(export.history)
+
+    @extend_schema(
+        operation_id='exportProductPriceHistory',
+        summary='Export Product Price History',
+        description=(
+            'Stream the price history, optionally of the SKUs currently in one category and recorded within a date range.'
+        ),
+        parameters=EXPORT_PARAMETERS,
+        responses={(200, content_type): OpenApiTypes.STR for content_type in EXPORT_CONTENT_TYPES.values()},
+    )
+    def get(self, request: Request):
+        return super().get(request)